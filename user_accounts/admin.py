@@ -1,6 +1,26 @@
 from django.contrib import admin
-from .models import Profile,Account,Transaction
+from .models import Profile,Account,Transaction,OutboundEmail,BalanceSnapshot,SettlementBatch
 # Register your models here.
+#the body of a queued email may carry an OTP, the admin shows only its delivery state
+class OutboundEmailAdmin(admin.ModelAdmin):
+    exclude = ['message']
+    list_display = ['id','subject','status','attempts','created_at','sent_at']
+    list_filter = ['status']
+
+#a settled transaction is held by its ledger entries, the admin offers no delete for it instead of failing on
+#the protected reference. pending and failed transactions can still be deleted
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ['id','transaction_type','amount','status','timestamp']
+    list_filter = ['status','transaction_type']
+
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and obj.ledger_entries.exists():
+            return False
+        return super().has_delete_permission(request, obj)
+
 admin.site.register(Profile)
 admin.site.register(Account)
-admin.site.register(Transaction)
\ No newline at end of file
+admin.site.register(Transaction,TransactionAdmin)
+admin.site.register(OutboundEmail,OutboundEmailAdmin)
+admin.site.register(BalanceSnapshot)
+admin.site.register(SettlementBatch)
\ No newline at end of file
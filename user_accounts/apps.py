@@ -6,4 +6,11 @@ class UserAccountsConfig(AppConfig):
     name = "user_accounts"
 
     def ready(self):
-        import user_accounts.signals
\ No newline at end of file
+        import user_accounts.signals
+        import user_accounts.dbmetrics
+        from django.conf import settings
+        if settings.METRICS_ENABLED:
+            from django.db.backends.signals import connection_created
+            from .metrics import instrument_serializers,install_query_recorder
+            instrument_serializers()
+            connection_created.connect(install_query_recorder, dispatch_uid='metrics_query_recorder')
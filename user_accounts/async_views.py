@@ -0,0 +1,108 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from .authentication import ClaimsJWTAuthentication,TokenProfile,aprofile_state,check_profile_state
+from .models import Profile,Account,Transaction
+from .permission import IsUser,IsAdmin
+from .serializers import UserProfileSerializer,AccountDetailedModelSerializer,AdminDashboardSerializer
+from .throttles import UserThrottle
+from .utils import aget_bank_totals
+
+def render(data, status=200, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json', headers=headers)
+
+#plain django view with async handlers running the same authentication, permission and throttle classes as the
+#DRF views. access tokens carrying the role claims authenticate through the cached profile state, older tokens and the throttle
+#counters go through sync_to_async. errors have the same status codes and bodies as DRF's
+class AsyncReadView(View):
+    authentication_class = ClaimsJWTAuthentication
+    permission_classes = []
+    throttle_classes = [UserThrottle]
+
+    async def authenticate(self, request):
+        authenticator = self.authentication_class()
+        header = authenticator.get_header(request)
+        if header is None:
+            return AnonymousUser()
+        raw_token = authenticator.get_raw_token(header)
+        if raw_token is None:
+            return AnonymousUser()
+        validated_token = authenticator.get_validated_token(raw_token)
+        if TokenProfile.has_claims(validated_token):
+            user = TokenProfile(validated_token)
+            check_profile_state(await aprofile_state(user.pk))
+            return user
+        return await sync_to_async(authenticator.get_user)(validated_token)
+
+    async def check_request(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+        for throttle in [throttle() for throttle in self.throttle_classes]:
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                raise exceptions.Throttled(throttle.wait())
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+        try:
+            request.user = await self.authenticate(request)
+            await self.check_request(request)
+            try:
+                return await handler(request, *args, **kwargs)
+            except ObjectDoesNotExist:
+                raise exceptions.NotFound()
+        except exceptions.APIException as exc:
+            headers = {}
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                headers['WWW-Authenticate'] = self.authentication_class().authenticate_header(request)
+            if getattr(exc, 'wait', None):
+                headers['Retry-After'] = str(int(exc.wait))
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail':exc.detail}
+            return render(data, status=exc.status_code, headers=headers)
+
+    async def recent_transactions(self, account):
+        recent = {}
+        for side, field in (('sender','sender_id'), ('receiver','receiver_id')):
+            latest = Transaction.objects.filter(**{field:account.pk}).order_by('-timestamp','-id')[:settings.PROFILE_RECENT_TRANSACTIONS]
+            recent[side] = [txn async for txn in latest]
+        return recent
+
+#async counterpart of UserProfileView
+class AsyncUserProfileView(AsyncReadView):
+    permission_classes = [IsUser]
+
+    async def get(self, request):
+        profile = await Profile.objects.select_related('account').aget(pk=request.user.pk)
+        context = {'request':request, 'recent_transactions':await self.recent_transactions(profile.account)}
+        return render(UserProfileSerializer(profile, context=context).data)
+
+#async counterpart of AccountProfileDetailedView
+class AsyncAccountProfileDetailedView(AsyncReadView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, pk):
+        account = await Account.objects.select_related('user').aget(pk=pk)
+        return render(AccountDetailedModelSerializer(account, context={'request':request}).data)
+
+#async counterpart of AdminDashboardView
+class AsyncAdminDashboardView(AsyncReadView):
+    permission_classes = [IsAdmin]
+
+    async def get(self, request):
+        profile = await Profile.objects.prefetch_related('groups','user_permissions').aget(pk=request.user.pk)
+        totals = await aget_bank_totals()
+        return render({
+            'current_user':AdminDashboardSerializer(profile, context={'request':request}).data,
+            'no_of_user':totals['users'],
+            'bank_balance':totals['balance'],
+        })
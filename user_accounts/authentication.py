@@ -0,0 +1,163 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from .models import Profile
+from .metrics import cache_lookup
+
+#bounded per-process LRU of recently loaded profiles. entries live for a short ttl and are dropped on
+#save/delete, every caller gets its own copy without cached relations so the account balance is never stale
+class ProfileCache:
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(pk)
+            if entry is None or entry[0] <= now:
+                self._entries.pop(pk, None)
+                profile = None
+            else:
+                self._entries.move_to_end(pk)
+                profile = entry[1]
+        cache_lookup('auth_profile', profile is not None)
+        if profile is None:
+            profile = Profile.objects.get(pk=pk)
+            with self._lock:
+                self._entries[pk] = (now + self.ttl, profile)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        clone = copy.copy(profile)
+        clone._state.fields_cache = {}
+        clone.__dict__.pop('_perm_cache', None)
+        clone.__dict__.pop('_user_perm_cache', None)
+        clone.__dict__.pop('_group_perm_cache', None)
+        return clone
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._entries.pop(pk, None)
+
+profile_cache = ProfileCache(
+    max_entries=getattr(settings, 'AUTH_PROFILE_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_PROFILE_CACHE_TTL', 30),
+)
+
+#whether the profile behind a token still exists and is active: 'active', 'inactive' or 'missing'. the state is kept
+#in the shared AUTH_CACHE_ALIAS cache for AUTH_PROFILE_CACHE_TTL seconds and deleted there on save/delete, so a
+#deactivation or deletion on one worker is seen by all of them
+def state_key(pk):
+    return f'auth_profile_state:{pk}'
+
+def profile_state(pk):
+    cache = caches[settings.AUTH_CACHE_ALIAS]
+    state = cache.get(state_key(pk))
+    cache_lookup('auth_state', state is not None)
+    if state is None:
+        active = Profile.objects.filter(pk=pk).values_list('is_active', flat=True).first()
+        state = 'missing' if active is None else 'active' if active else 'inactive'
+        cache.set(state_key(pk), state, settings.AUTH_PROFILE_CACHE_TTL)
+    return state
+
+async def aprofile_state(pk):
+    cache = caches[settings.AUTH_CACHE_ALIAS]
+    state = await cache.aget(state_key(pk))
+    cache_lookup('auth_state', state is not None)
+    if state is None:
+        active = await Profile.objects.filter(pk=pk).values_list('is_active', flat=True).afirst()
+        state = 'missing' if active is None else 'active' if active else 'inactive'
+        await cache.aset(state_key(pk), state, settings.AUTH_PROFILE_CACHE_TTL)
+    return state
+
+def forget_profile_state(pk):
+    caches[settings.AUTH_CACHE_ALIAS].delete(state_key(pk))
+
+#refuses a token whose profile was deleted or deactivated, with the errors of simplejwt's own lookup
+def check_profile_state(state):
+    if state == 'missing':
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if state == 'inactive':
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+#user built from the claims that CustomTokenObtainPairSerializer puts in the token. the permission classes and
+#throttles only read these, so they need no query, any other attribute loads the full Profile on first access.
+#the password and the permissions are read from a freshly loaded profile, a cached copy of another worker could
+#still hold the old password hash or permissions for the length of its ttl
+class TokenProfile:
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    CLAIMS = ('email','profile_type','is_staff','is_superuser')
+    FRESH = (
+        'password','check_password','set_password','has_usable_password','has_perm','has_perms','has_module_perms',
+        'get_all_permissions','get_user_permissions','get_group_permissions','groups','user_permissions',
+    )
+
+    def __init__(self, token):
+        object.__setattr__(self, '_token', token)
+        object.__setattr__(self, '_profile', None)
+        object.__setattr__(self, '_fresh_profile', None)
+        object.__setattr__(self, 'pk', int(token[api_settings.USER_ID_CLAIM]))
+        object.__setattr__(self, 'id', self.pk)
+        for claim in self.CLAIMS:
+            if claim in token:
+                object.__setattr__(self, claim, token[claim])
+
+    @classmethod
+    def has_claims(cls, token):
+        return all(claim in token for claim in cls.CLAIMS)
+
+    @property
+    def profile(self):
+        if self._profile is None:
+            try:
+                object.__setattr__(self, '_profile', profile_cache.get(self.pk))
+            except Profile.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+        return self._profile
+
+    @property
+    def fresh_profile(self):
+        if self._fresh_profile is None:
+            try:
+                object.__setattr__(self, '_fresh_profile', Profile.objects.get(pk=self.pk))
+            except Profile.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+        return self._fresh_profile
+
+    def __getattr__(self, name):
+        if name in self.FRESH:
+            return getattr(self.fresh_profile, name)
+        return getattr(self.profile, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.fresh_profile if name in self.FRESH else self.profile, name, value)
+
+    def __eq__(self, other):
+        return getattr(other, 'pk', None) == self.pk and isinstance(other, (TokenProfile, Profile))
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return f"{self.pk} - {self.email}"
+
+#JWTAuthentication that trusts the role claims of the access token instead of loading the user on every request.
+#only whether the user still exists and is active is checked, through profile_state. tokens issued before the
+#claims were added fall back to the regular database lookup
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM in validated_token and TokenProfile.has_claims(validated_token):
+            user = TokenProfile(validated_token)
+            check_profile_state(profile_state(user.pk))
+            return user
+        return super().get_user(validated_token)
@@ -0,0 +1,113 @@
+from django.db import IntegrityError,transaction as db_transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from .models import Account,Transaction,SettlementBatch
+from .jobs import lease_end
+from .onboarding import numbered_rows
+from .services import settle_transactions
+from .validators import validate_amount
+
+BATCH_TRANSACTION_TYPES = [
+    ('deposit','Deposit'),
+    ('transfer','Transfer'),
+]
+
+#one item of a batch, shaped like the body of /api/profile/transaction/. a deposit credits account_number, a
+#transfer moves the amount from account_number to receiver_account_number. the accounts are looked up per chunk
+class BatchItemSerializer(serializers.Serializer):
+    account_number = serializers.CharField(max_length=20)
+    transaction_type = serializers.ChoiceField(choices=BATCH_TRANSACTION_TYPES)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, validators=[validate_amount])
+    description = serializers.CharField(default="", allow_blank=True, max_length=100)
+    receiver_account_number = serializers.CharField(default="", allow_blank=True, max_length=20)
+    def validate(self, attrs):
+        if attrs['transaction_type'] != 'transfer':
+            return attrs
+        if not attrs['receiver_account_number']:
+            raise serializers.ValidationError({
+                "reciever_account_number":ErrorDetail("Reciever account type when the transaction type is transfer",code='invalid_reciever_account')
+            })
+        if attrs['receiver_account_number'] == attrs['account_number']:
+            raise serializers.ValidationError({
+                "reciever_account_number":ErrorDetail("You cant self transfer",code="transfer mismatch")
+            })
+        return attrs
+
+def account_numbers(item):
+    if item['transaction_type'] == 'transfer':
+        return (item['account_number'], item['receiver_account_number'])
+    return (item['account_number'],)
+
+def reject_item(batch, number, errors):
+    batch.errors.append({'item':number, 'errors':errors})
+    batch.results.append({'item':number, 'status':'rejected', 'errors':errors})
+    batch.rejected += 1
+
+#settles one chunk of validated items with settle_transactions, which locks the accounts of the whole chunk once
+#and writes the transactions, their ledger entries and the balances with one bulk statement each. the chunk, the
+#batch counters, the item results and processed commit together and renew the lease of the worker. an unknown
+#account number rejects the item, a transfer the sender can not fund is recorded as failed
+def settle_chunk(batch, chunk, processed):
+    numbers = {number for _, item in chunk for number in account_numbers(item)}
+    accounts = dict(Account.objects.filter(account_number__in=numbers).values_list('account_number','pk'))
+    transactions = []
+    outcomes = []
+    for number, item in chunk:
+        missing = [value for value in account_numbers(item) if value not in accounts]
+        if missing:
+            reject_item(batch, number, {'account_number':[f"Account number {value} doesnt exist." for value in missing]})
+            continue
+        txn = Transaction(transaction_type=item['transaction_type'], amount=item['amount'], description=item['description'], batch=batch)
+        if item['transaction_type'] == 'deposit':
+            txn.receiver_id = accounts[item['account_number']]
+        else:
+            txn.sender_id = accounts[item['account_number']]
+            txn.receiver_id = accounts[item['receiver_account_number']]
+        transactions.append(txn)
+        outcomes.append(number)
+    with db_transaction.atomic():
+        settle_transactions(transactions)
+        for number, txn in zip(outcomes, transactions):
+            batch.results.append({'item':number, 'status':txn.status, 'transaction':txn.pk})
+            if txn.status == 'success':
+                batch.settled += 1
+            else:
+                batch.failed += 1
+        batch.processed = processed
+        batch.claimed_until = lease_end()
+        batch.save(update_fields=['processed','items','settled','failed','rejected','errors','results','claimed_until'])
+
+#settles a claimed batch, run through run_job by the process_batches worker. the items are validated in one pass
+#and settled in chunks that each commit on their own, the items up to processed were settled by an earlier run
+def settle_batch(batch, chunk_size=500):
+    chunk = []
+    number = batch.processed
+    reject = lambda number, errors: reject_item(batch, number, errors)
+    for number, item in numbered_rows(batch.payload, reject):
+        if number <= batch.processed:
+            continue
+        batch.items += 1
+        serializer = BatchItemSerializer(data=item)
+        if not serializer.is_valid():
+            reject(number, serializer.errors)
+            continue
+        chunk.append((number, serializer.validated_data))
+        if len(chunk) >= chunk_size:
+            settle_chunk(batch, chunk, number)
+            chunk = []
+    settle_chunk(batch, chunk, max(number, batch.processed))
+    batch.results.sort(key=lambda result: result['item'])
+    batch.save(update_fields=['results'])
+
+#queues the items as a batch for the process_batches worker. a batch posted again with the same reference is not
+#queued twice, the earlier batch is returned with created False
+def queue_batch(items, created_by_id=None, reference=None):
+    if reference:
+        existing = SettlementBatch.objects.filter(created_by_id=created_by_id, reference=reference).first()
+        if existing is not None:
+            return existing, False
+    try:
+        with db_transaction.atomic():
+            return SettlementBatch.objects.create(created_by_id=created_by_id, reference=reference, payload=list(items)), True
+    except IntegrityError:
+        return SettlementBatch.objects.get(created_by_id=created_by_id, reference=reference), False
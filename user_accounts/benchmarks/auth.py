@@ -0,0 +1,35 @@
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from ..authentication import ClaimsJWTAuthentication
+from ..permission import IsUser,IsAdmin
+from ..serializers import CustomTokenObtainPairSerializer
+
+#authenticates the same access token repeatedly and runs the permission checks, like every request does before
+#the view body. returns the queries and the mean latency per request for the given authentication class
+def measure_authentication(authentication_class, user, requests=1000):
+    token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+    factory = APIRequestFactory()
+    permissions = [IsUser(), IsAdmin()]
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for _ in range(requests):
+            request = Request(
+                factory.get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {token}'),
+                authenticators=[authentication_class()],
+            )
+            for permission in permissions:
+                permission.has_permission(request, None)
+        elapsed = time.perf_counter() - started
+    return {
+        'authentication': authentication_class.__name__,
+        'requests': requests,
+        'queries_per_request': len(queries) / requests,
+        'microseconds_per_request': round(elapsed / requests * 1e6, 1),
+    }
+
+def compare_authentication(user, requests=1000):
+    return [measure_authentication(cls, user, requests) for cls in (JWTAuthentication, ClaimsJWTAuthentication)]
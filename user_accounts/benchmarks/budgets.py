@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import reverse,resolve
+from ..models import Profile
+from ..querybudget import QueryCounter
+from ..serializers import CustomTokenObtainPairSerializer
+from .seed import seed_bank,seed_transactions,clear_bank,BENCH_EMAIL_DOMAIN
+
+#read endpoints with the role that calls them and the url kwargs they need from the seeded data
+ENDPOINTS = [
+    ('user', 'profile', lambda data: {}),
+    ('user', 'transaction_history', lambda data: {}),
+    ('user', 'account_statement', lambda data: {}),
+    ('user', 'profile_detailed', lambda data: {'pk':data['account'].pk}),
+    ('staff', 'admin_dashboard', lambda data: {}),
+    ('staff', 'admin_dashboard_profile', lambda data: {}),
+    ('staff', 'admin_dashboard_profile_id', lambda data: {'pk':data['account'].user_id}),
+    ('staff', 'admin_dashboard_transacation', lambda data: {}),
+    ('staff', 'admin_dashboard_transaction_id', lambda data: {'pk':data['transaction'].pk}),
+]
+
+def bearer(user):
+    return f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}'
+
+#seeds a bank of the given size and counts the queries of every read endpoint against its declared query_budget
+def measure_endpoints(accounts, transactions_per_account):
+    seeded = seed_bank(accounts, staff=1)
+    try:
+        transactions = seed_transactions(seeded, accounts * transactions_per_account)
+        staff = Profile.objects.get(email__endswith=f'@{BENCH_EMAIL_DOMAIN}', profile_type='staff')
+        data = {'account':seeded[0], 'transaction':transactions[-1]}
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'testserver'
+        clients = {
+            'user':Client(HTTP_HOST=host, HTTP_AUTHORIZATION=bearer(seeded[0].user)),
+            'staff':Client(HTTP_HOST=host, HTTP_AUTHORIZATION=bearer(staff)),
+        }
+        results = []
+        for role, name, kwargs in ENDPOINTS:
+            url = reverse(name, kwargs=kwargs(data))
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                response = clients[role].get(url)
+            results.append({
+                'endpoint':name,
+                'status':response.status_code,
+                'queries':len(counter),
+                'budget':getattr(resolve(url).func.cls, 'query_budget', None),
+            })
+        return results
+    finally:
+        clear_bank()
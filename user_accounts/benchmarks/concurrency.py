@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import ssl
+import time
+from urllib.parse import urlsplit
+from ..serializers import CustomTokenObtainPairSerializer
+
+#minimal HTTP/1.1 client on asyncio streams keeping one connection alive, enough to drive the API with hundreds
+#of concurrent clients from one process without the overhead of a full client library
+class HTTPConnection:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.secure = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.secure else 80)
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=ssl.create_default_context() if self.secure else None,
+            )
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}', f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError("Connection closed by the server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while (line := await self.reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while size := int((await self.reader.readline()).split(b';')[0], 16):
+                chunks.append(await self.reader.readexactly(size + 2))
+            await self.reader.readline()
+            content = b''.join(chunk[:-2] for chunk in chunks)
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response_headers, content
+
+#nearest rank percentile of an already sorted list
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+#closed loop load: every client sends its next request as soon as the previous one answered, until the duration
+#is over. returns the throughput, the latency percentiles in milliseconds and the failed requests
+async def run_clients(base_url, requests, concurrency, duration):
+    deadline = time.perf_counter() + duration
+    latencies = []
+    errors = 0
+
+    async def client(plan):
+        nonlocal errors
+        connection = HTTPConnection(base_url)
+        try:
+            for path, headers in plan:
+                if time.perf_counter() >= deadline:
+                    return
+                started = time.perf_counter()
+                try:
+                    status, _, _ = await connection.request('GET', path, headers)
+                except (OSError, ConnectionError, asyncio.IncompleteReadError):
+                    errors += 1
+                    await connection.close()
+                    continue
+                if status >= 400:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client(itertools.cycle(requests[n % len(requests)])) for n in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'concurrency':concurrency,
+        'requests':len(latencies),
+        'errors':errors,
+        'requests_per_second':round(len(latencies) / elapsed, 1),
+        'p50_ms':round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p99_ms':round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+def bearer(user):
+    return {'Authorization':f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}'}
+
+#request plans of the async capable read endpoints, one plan per seeded user so the per-user throttle never
+#kicks in. every plan cycles through the profile, the account detail and, for the staff, the dashboard
+def read_plans(accounts, staff):
+    staff_headers = [bearer(member) for member in staff]
+    plans = []
+    for n, account in enumerate(accounts):
+        headers = bearer(account.user)
+        plan = [('/api/profile/', headers), (f'/api/profile/{account.pk}/', headers)]
+        if staff_headers:
+            plan.append(('/api/admin/dashboard/', staff_headers[n % len(staff_headers)]))
+        plans.append(plan)
+    return plans
+
+def measure_concurrency(base_url, plans, levels, duration):
+    return [asyncio.run(run_clients(base_url, plans, concurrency, duration)) for concurrency in levels]
@@ -0,0 +1,38 @@
+import time
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from ..serializers import CustomTokenObtainPairSerializer
+
+#serves the account detail endpoint repeatedly with the given CONN_MAX_AGE, closing the connection after every
+#request the way request_finished does in a real worker. the test client keeps that signal disconnected
+def measure_requests(account, conn_max_age, requests=200):
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'testserver'
+    token = CustomTokenObtainPairSerializer.get_token(account.user).access_token
+    client = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Bearer {token}')
+    url = reverse('profile_detailed', kwargs={'pk':account.pk})
+    original = connection.settings_dict['CONN_MAX_AGE']
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    connection.close()
+    try:
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url)
+            connection.close_if_unusable_or_obsolete()
+            latencies.append(time.perf_counter() - started)
+    finally:
+        connection.settings_dict['CONN_MAX_AGE'] = original
+        connection.close()
+    latencies.sort()
+    return {
+        'conn_max_age':conn_max_age,
+        'requests':requests,
+        'mean_ms':round(sum(latencies) / requests * 1000, 3),
+        'p50_ms':round(latencies[requests // 2] * 1000, 3),
+        'p99_ms':round(latencies[min(requests - 1, int(requests * 0.99))] * 1000, 3),
+    }
+
+def compare_connections(account, requests=200, conn_max_age=60):
+    return [measure_requests(account, 0, requests), measure_requests(account, conn_max_age, requests)]
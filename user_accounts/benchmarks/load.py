@@ -0,0 +1,207 @@
+import http.client
+import json
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from ..models import Profile
+from ..serializers import CustomTokenObtainPairSerializer
+from .seed import seed_bank,clear_bank,BENCH_EMAIL_DOMAIN,BENCH_PASSWORD
+
+def bearer(user):
+    return f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}'
+
+#the routes driven by the load test. every builder gets the seeded data and the running request number and returns
+#(method, url name, url kwargs, json body, auth header, client address). requests rotate over the seeded users and
+#addresses so the per-user and per-address throttles stay out of the way at moderate load
+def login_request(data, n):
+    user = data['accounts'][n % len(data['accounts'])].user
+    return 'POST', 'profile_login', {}, {'email':user.email, 'password':BENCH_PASSWORD}, None, n
+
+def profile_request(data, n):
+    account = data['accounts'][n % len(data['accounts'])]
+    return 'GET', 'profile', {}, None, data['tokens'][account.pk], n
+
+def transaction_request(data, n):
+    accounts = data['accounts']
+    sender, receiver = accounts[n % len(accounts)], accounts[(n + 1) % len(accounts)]
+    body = {
+        'account_number':sender.account_number,
+        'transaction_type':'transfer',
+        'amount':'1.00',
+        'receiver_account_number':receiver.account_number,
+        'description':'load test',
+    }
+    return 'POST', 'transaction', {}, body, data['tokens'][sender.pk], n
+
+def admin_profiles_request(data, n):
+    return 'GET', 'admin_dashboard_profile', {}, None, data['staff_tokens'][n % len(data['staff_tokens'])], n
+
+def admin_transactions_request(data, n):
+    return 'GET', 'admin_dashboard_transacation', {}, None, data['staff_tokens'][n % len(data['staff_tokens'])], n
+
+ENDPOINTS = {
+    'login':login_request,
+    'profile':profile_request,
+    'transaction':transaction_request,
+    'admin_profiles':admin_profiles_request,
+    'admin_transactions':admin_transactions_request,
+}
+
+def client_address(n):
+    return f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}'
+
+#sends the requests in process through the django test client, one client per thread
+class TestClientTransport:
+    name = 'test-client'
+
+    def __init__(self):
+        self.host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'testserver'
+
+    def open(self):
+        return Client(HTTP_HOST=self.host)
+
+    def send(self, client, method, path, body, authorization, n):
+        extra = {'REMOTE_ADDR':client_address(n)}
+        if authorization:
+            extra['HTTP_AUTHORIZATION'] = authorization
+        if method == 'GET':
+            return client.get(path, **extra).status_code
+        return client.post(path, data=json.dumps(body), content_type='application/json', **extra).status_code
+
+    def close(self, client):
+        connection.close()
+
+#sends the requests to a running server over one keep-alive connection per thread. the server sees the real
+#client address, so login requests share one address and its login throttle
+class ServerTransport:
+    name = 'server'
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+
+    def open(self):
+        return self.connection_class(self.netloc, timeout=30)
+
+    def send(self, client, method, path, body, authorization, n):
+        headers = {'Content-Type':'application/json'}
+        if authorization:
+            headers['Authorization'] = authorization
+        client.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = client.getresponse()
+        response.read()
+        return response.status
+
+    def close(self, client):
+        client.close()
+
+#nearest rank percentile of an already sorted list
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+#drives one endpoint with concurrent clients for the given seconds. successful requests make up the latency
+#percentiles and the throughput, throttled (429) and failed requests are counted apart
+def run_endpoint(transport, data, name, concurrency, duration):
+    builder = ENDPOINTS[name]
+    counter = iter(range(10 ** 12))
+    counter_lock = threading.Lock()
+    results_lock = threading.Lock()
+    latencies = []
+    outcome = {'throttled':0, 'errors':0}
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = transport.open()
+        local_latencies = []
+        local_outcome = {'throttled':0, 'errors':0}
+        try:
+            while time.perf_counter() < deadline:
+                with counter_lock:
+                    n = next(counter)
+                method, url_name, kwargs, body, authorization, address = builder(data, n)
+                started = time.perf_counter()
+                try:
+                    status = transport.send(client, method, reverse(url_name, kwargs=kwargs), body, authorization, address)
+                except Exception:
+                    local_outcome['errors'] += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                if status == 429:
+                    local_outcome['throttled'] += 1
+                elif status >= 400:
+                    local_outcome['errors'] += 1
+                else:
+                    local_latencies.append(elapsed)
+        finally:
+            transport.close(client)
+            with results_lock:
+                latencies.extend(local_latencies)
+                for key, value in local_outcome.items():
+                    outcome[key] += value
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {'endpoint':name, 'concurrency':concurrency, 'requests':len(latencies), **outcome,
+              'requests_per_second':round(len(latencies) / elapsed, 1)}
+    for label, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+        result[label] = round(percentile(latencies, fraction) * 1000, 2) if latencies else None
+    return result
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#seeds the synthetic bank, drives every endpoint in turn and returns the run with its settings, ready to be saved
+def run_load_test(endpoints, accounts=100, staff=5, concurrency=8, duration=5.0, base_url=None):
+    transport = ServerTransport(base_url) if base_url else TestClientTransport()
+    seeded = seed_bank(accounts, staff=staff)
+    try:
+        staff_members = Profile.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}', profile_type='staff')
+        data = {
+            'accounts':seeded,
+            'tokens':{account.pk:bearer(account.user) for account in seeded},
+            'staff_tokens':[bearer(member) for member in staff_members],
+        }
+        results = [run_endpoint(transport, data, name, concurrency, duration) for name in endpoints]
+    finally:
+        clear_bank()
+    return {
+        'commit':current_commit(),
+        'created_at':time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'transport':transport.name,
+        'database':connection.vendor,
+        'accounts':accounts,
+        'concurrency':concurrency,
+        'duration':duration,
+        'results':results,
+    }
+
+#relative change of the throughput and the latency percentiles against an earlier run, per endpoint
+def compare_runs(baseline, run):
+    previous = {result['endpoint']:result for result in baseline['results']}
+    changes = []
+    for result in run['results']:
+        before = previous.get(result['endpoint'])
+        if before is None:
+            continue
+        change = {'endpoint':result['endpoint']}
+        for key in ('requests_per_second', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if before.get(key) and result.get(key) is not None:
+                change[key] = round((result[key] - before[key]) / before[key] * 100, 1)
+        changes.append(change)
+    return changes
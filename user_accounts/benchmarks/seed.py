@@ -0,0 +1,68 @@
+import random
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.db.models import Q
+from ..models import Profile,Account,Transaction,LedgerEntry,LedgerCheckpoint
+from ..utils import update_bank_totals
+from ..search import index_profiles
+
+BENCH_EMAIL_DOMAIN = 'bench.village.local'
+BENCH_PASSWORD = 'Bench1234'
+
+#creates a synthetic bank of user profiles with funded accounts, the rows are bulk created so the
+#account signal is skipped and every seeded row can be found again by its email domain
+def seed_bank(accounts, balance=Decimal('1000000.00'), staff=0, batch_size=1000):
+    clear_bank()
+    password = make_password(BENCH_PASSWORD)
+    profiles = []
+    for n in range(accounts + staff):
+        is_staff = n >= accounts
+        profiles.append(Profile(
+            email=f'{"staff" if is_staff else "user"}{n}@{BENCH_EMAIL_DOMAIN}',
+            first_name='Bench',
+            last_name='Staff' if is_staff else 'User',
+            age=30,
+            phonenumber=f'+919{n:09d}',
+            profile_type='staff' if is_staff else 'user',
+            employee_id=f'BENCH{n}' if is_staff else None,
+            is_staff=is_staff,
+            password=password,
+        ))
+    Profile.objects.bulk_create(profiles, batch_size=batch_size)
+    users = Profile.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}',profile_type='user').order_by('pk')
+    accounts_created = Account.objects.bulk_create(
+        [Account(user=user, account_number=f'B{user.pk}', balance=balance) for user in users],
+        batch_size=batch_size,
+    )
+    LedgerCheckpoint.objects.bulk_create(
+        [LedgerCheckpoint(account=account, balance=balance) for account in accounts_created],
+        batch_size=batch_size,
+    )
+    update_bank_totals(balance=balance * len(accounts_created), users=len(accounts_created))
+    index_profiles(Profile.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}'), chunk_size=batch_size)
+    return list(Account.objects.filter(user__email__endswith=f'@{BENCH_EMAIL_DOMAIN}').order_by('pk'))
+
+#removes every seeded profile with its transactions and ledger, the accounts go with them through the cascade
+def clear_bank():
+    accounts = Account.objects.filter(user__email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+    transactions = Transaction.objects.filter(Q(sender__in=accounts)|Q(receiver__in=accounts))
+    LedgerEntry.objects.filter(transaction__in=transactions).purge()
+    LedgerCheckpoint.objects.filter(account__in=accounts).delete()
+    transactions.delete()
+    Profile.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+
+#adds successful transfers of 1.00 between random seeded accounts, the balances are left untouched
+def seed_transactions(accounts, count, batch_size=1000):
+    rng = random.Random(count)
+    transactions = []
+    for _ in range(count):
+        sender, receiver = rng.sample(accounts, 2)
+        transactions.append(Transaction(
+            transaction_type='transfer',
+            sender=sender,
+            receiver=receiver,
+            amount=Decimal('1.00'),
+            status='success',
+            description='benchmark',
+        ))
+    return Transaction.objects.bulk_create(transactions, batch_size=batch_size)
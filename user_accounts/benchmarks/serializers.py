@@ -0,0 +1,35 @@
+import time
+from rest_framework.renderers import JSONRenderer
+from ..fastserializers import FastTransactionListForAdminSerializer,FastUserForAdminSerializer
+from ..models import Transaction,Profile
+from ..serializers import TransactionListForAdminSerializer,UserForAdminSerializer
+
+#rows per second of fetching and serializing the same rows through the model serializer and through its .values()
+#fast path, the two renderings are compared byte for byte before anything is timed
+def compare_serializers(rows, repeat=3):
+    cases = [
+        ('transactions', Transaction.objects.order_by('id'), TransactionListForAdminSerializer, FastTransactionListForAdminSerializer),
+        ('profiles', Profile.objects.filter(profile_type='user').order_by('id'), UserForAdminSerializer, FastUserForAdminSerializer),
+    ]
+    renderer = JSONRenderer()
+    results = []
+    for name, queryset, model_serializer, fast_serializer in cases:
+        queryset = queryset[:rows]
+        slow = lambda: model_serializer(list(queryset), many=True).data
+        fast = lambda: fast_serializer(list(fast_serializer.values(queryset))).data
+        identical = renderer.render(slow()) == renderer.render(fast())
+        for label, run in (('model', slow), ('values', fast)):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                count = len(run())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results.append({
+                'rows':count,
+                'case':name,
+                'serializer':label,
+                'rows_per_second':round(count / best) if best else 0,
+                'identical':identical,
+            })
+    return results
@@ -0,0 +1,52 @@
+import random
+import threading
+import time
+from decimal import Decimal
+from django.db import connection
+from ..services import handle_transaction
+
+#runs transfers from a pool of threads and returns the throughput, in the hot scenario every
+#transfer credits the same account and in the spread scenario the pairs are picked at random
+def run_transfers(accounts, *, threads, transfers, hot=False, amount=Decimal('1.00')):
+    per_thread = transfers // threads
+    errors = []
+    hot_account = accounts[0]
+    senders = accounts[1:] if hot else accounts
+
+    def worker(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(per_thread):
+                sender = rng.choice(senders)
+                receiver = hot_account if hot else rng.choice(accounts)
+                while receiver.pk == sender.pk:
+                    receiver = rng.choice(accounts)
+                try:
+                    handle_transaction(
+                        user_account=sender,
+                        receiver_account=receiver,
+                        tran_type='transfer',
+                        amt=amount,
+                        desc='benchmark',
+                    )
+                except Exception as e:
+                    errors.append(e)
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    completed = per_thread * threads
+    return {
+        'scenario': 'hot' if hot else 'spread',
+        'threads': threads,
+        'transfers': completed,
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'transfers_per_second': round(completed / elapsed, 1) if elapsed else 0,
+    }
@@ -0,0 +1,35 @@
+import time
+import uuid
+from django.core.cache import caches
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import UserRateThrottle
+from ..throttles import UserThrottle
+
+#per-request overhead of SimpleRateThrottle against the sliding window throttle on the given cache. the rate is
+#high enough that no request is refused, so SimpleRateThrottle keeps growing its history for the whole run
+def measure_throttles(requests=10000, cache_alias='default'):
+    results = []
+    default_cache = UserRateThrottle.cache
+    UserRateThrottle.cache = caches[cache_alias]
+    try:
+        with override_settings(THROTTLE_CACHE_ALIAS=cache_alias):
+            for throttle_class in (UserRateThrottle, UserThrottle):
+                request = Request(APIRequestFactory().get('/api/profile/', REMOTE_ADDR=f'bench-{uuid.uuid4().hex}'))
+                throttle = throttle_class()
+                throttle.rate = f'{requests * 2}/hour'
+                throttle.num_requests, throttle.duration = throttle.parse_rate(throttle.rate)
+                started = time.perf_counter()
+                for _ in range(requests):
+                    throttle.allow_request(request, None)
+                elapsed = time.perf_counter() - started
+                results.append({
+                    'throttle': throttle_class.__name__,
+                    'cache': cache_alias,
+                    'requests': requests,
+                    'microseconds_per_request': round(elapsed / requests * 1e6, 1),
+                })
+    finally:
+        UserRateThrottle.cache = default_cache
+    return results
@@ -0,0 +1,44 @@
+import time
+import uuid
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken,BlacklistedToken
+from ..tokens import FilteredRefreshToken,blacklist_filter
+
+BENCH_JTI_PREFIX = 'bench'
+
+#fills the blacklist with synthetic tokens that expire tomorrow, they are found again by their jti prefix
+def seed_blacklist(tokens, batch_size=10000):
+    expires_at = timezone.now() + timedelta(days=1)
+    for start in range(0, tokens, batch_size):
+        outstanding = OutstandingToken.objects.bulk_create([
+            OutstandingToken(jti=f'{BENCH_JTI_PREFIX}{uuid.uuid4().hex}', token='', expires_at=expires_at)
+            for _ in range(min(batch_size, tokens - start))
+        ])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in outstanding])
+
+def clear_blacklist():
+    OutstandingToken.objects.filter(jti__startswith=BENCH_JTI_PREFIX).delete()
+
+#decodes and verifies valid refresh tokens of the user the way TokenRefreshView does, with and without the filter
+def measure_refresh(user, refreshes=1000):
+    tokens = [str(RefreshToken.for_user(user)) for _ in range(refreshes)]
+    #build the filter before timing, a worker pays this once per rebuild interval
+    blacklist_filter.might_contain('')
+    results = []
+    for token_class in (RefreshToken, FilteredRefreshToken):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for token in tokens:
+                token_class(token)
+            elapsed = time.perf_counter() - started
+        results.append({
+            'token_class': token_class.__name__,
+            'refreshes': refreshes,
+            'queries_per_refresh': len(queries) / refreshes,
+            'microseconds_per_refresh': round(elapsed / refreshes * 1e6, 1),
+        })
+    return results
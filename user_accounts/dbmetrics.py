@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+from django.core.signals import got_request_exception
+from django.db import connections,DatabaseError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+#per-process counters of the database connections. with persistent connections only the first request after the
+#open connection expired or failed its health check creates one. django hands a thread its connection without a
+#checkout, so without a pool there are no checkouts or waits to count
+class ConnectionMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.errors = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+connection_metrics = ConnectionMetrics()
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    connection_metrics.incr('connections_created')
+
+#sent from inside the except block of the request handler
+@receiver(got_request_exception)
+def count_error(sender, request=None, **kwargs):
+    if isinstance(sys.exc_info()[1], DatabaseError):
+        connection_metrics.incr('errors')
+
+#statistics of this worker's connections to the given database. with DB_POOL the checkouts, waits, creations and
+#errors come from the psycopg pool itself, otherwise only the creations and errors are counted from the signals
+def pool_metrics(alias='default'):
+    wrapper = connections[alias]
+    pool = getattr(wrapper, 'pool', None)
+    metrics = {
+        'pid':os.getpid(),
+        'mode':'pool' if pool is not None else 'persistent' if wrapper.settings_dict.get('CONN_MAX_AGE') else 'per-request',
+        'conn_max_age':wrapper.settings_dict.get('CONN_MAX_AGE'),
+        'health_checks':wrapper.settings_dict.get('CONN_HEALTH_CHECKS'),
+    }
+    if pool is None:
+        metrics.update({
+            'connections_created':connection_metrics.connections_created,
+            'errors':connection_metrics.errors,
+        })
+        return metrics
+    stats = pool.get_stats()
+    metrics.update({
+        'checkouts':stats.get('requests_num', 0),
+        'waits':stats.get('requests_queued', 0),
+        'wait_ms':stats.get('requests_wait_ms', 0),
+        'waiting_now':stats.get('requests_waiting', 0),
+        'connections_created':stats.get('connections_num', 0),
+        'errors':stats.get('requests_errors', 0) + stats.get('connections_errors', 0),
+        'connections_lost':stats.get('connections_lost', 0),
+        'pool_min':stats.get('pool_min'),
+        'pool_max':stats.get('pool_max'),
+        'pool_size':stats.get('pool_size'),
+        'pool_available':stats.get('pool_available'),
+    })
+    return metrics
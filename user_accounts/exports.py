@@ -0,0 +1,55 @@
+import csv
+import json
+import zlib
+
+EXPORT_COLUMNS = ['id','timestamp','transaction_type','status','amount','sender','receiver','description']
+EXPORT_LOOKUPS = ['id','timestamp','transaction_type','status','amount','sender__account_number','receiver__account_number','description']
+
+#write target of csv.writer that hands the formatted line back instead of buffering it
+class Echo:
+    def write(self, value):
+        return value
+
+#rows of the filtered transactions in id order read through a server side cursor, after_id resumes an interrupted export
+def export_rows(queryset, after_id=None, chunk_size=2000):
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    rows = queryset.order_by('id').values_list(*EXPORT_LOOKUPS)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + '\n'
+
+#joins the lines into chunks of lines_per_chunk so that the response is not written one row at a time
+def chunked(lines, lines_per_chunk=1000):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= lines_per_chunk:
+            yield ''.join(buffer).encode()
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode()
+
+#compresses the chunks into a gzip stream on the fly
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_transactions(queryset, output='csv', compress=False, after_id=None):
+    rows = export_rows(queryset, after_id=after_id)
+    lines = ndjson_lines(rows) if output == 'ndjson' else csv_lines(rows)
+    chunks = chunked(lines)
+    return gzipped(chunks) if compress else chunks
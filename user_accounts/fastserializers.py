@@ -0,0 +1,111 @@
+from decimal import Decimal
+from django.utils import timezone
+from phonenumber_field.modelfields import PhoneNumberField as PhoneNumberModelField
+from rest_framework import ISO_8601,serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from .serializers import UserForAdminSerializer,TransactionListForAdminSerializer
+from .metrics import serializer_timer
+
+#converter factories for the flat field types of the list serializers. every factory is built once per class and
+#called with the response timezone, values that need no conversion get None so the row value is used as it is
+def _identity(tz):
+    return None
+
+def _decimal(field):
+    if not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) or field.localize or field.decimal_places is None:
+        return lambda tz: field.to_representation
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+    return lambda tz: lambda value: format(value.quantize(exponent, rounding=field.rounding), 'f')
+
+def _datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if not output_format or output_format.lower() == ISO_8601:
+        return lambda tz: field.to_representation
+    def factory(tz):
+        def convert(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            return value.astimezone(tz).strftime(output_format)
+        return convert
+    return factory
+
+def _converter(field, model_field):
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return _identity
+    if isinstance(model_field, PhoneNumberModelField):
+        #.values() hands back PhoneNumber objects, the serializer field formats them
+        return lambda tz: field.to_representation
+    if isinstance(field, serializers.DecimalField):
+        return _decimal(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime(field)
+    if isinstance(field, serializers.ChoiceField):
+        return lambda tz: field.to_representation
+    if isinstance(field, (serializers.IntegerField, serializers.CharField)):
+        return _identity
+    raise TypeError(f"{type(field).__name__} {field.field_name} has no fast path")
+
+#read only serializer that mirrors a flat ModelSerializer on .values() rows. the field getters are compiled once
+#from the model serializer and the output is the same as the model serializer's, without building model instances
+class ValuesSerializer:
+    serializer_class = None
+    _compiled = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def compile(cls):
+        if cls.__dict__.get('_compiled') is None:
+            serializer = cls.serializer_class()
+            model = serializer.Meta.model
+            compiled = []
+            for name, field in serializer.fields.items():
+                if field.write_only:
+                    continue
+                model_field = model._meta.get_field(field.source)
+                compiled.append((name, field.source, _converter(field, model_field)))
+            cls._compiled = compiled
+        return cls._compiled
+
+    #the queryset as .values() rows with every column the output needs plus the given extra ones (e.g. the ordering)
+    @classmethod
+    def values(cls, queryset, extra=()):
+        columns = [source for name, source, factory in cls.compile()]
+        return queryset.values(*columns, *[column for column in extra if column not in columns])
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return self.render()
+
+    def render(self):
+        tz = timezone.get_current_timezone()
+        getters = [(name, source, factory(tz)) for name, source, factory in self.compile()]
+        data = []
+        for row in self.rows:
+            item = {}
+            for name, source, convert in getters:
+                value = row[source]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+class FastUserForAdminSerializer(ValuesSerializer):
+    serializer_class = UserForAdminSerializer
+
+class FastTransactionListForAdminSerializer(ValuesSerializer):
+    serializer_class = TransactionListForAdminSerializer
+
+#ListAPIView mixin that paginates .values() rows and renders them with fast_serializer_class
+class ValuesListMixin:
+    fast_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.fast_serializer_class.values(queryset, extra=(*(getattr(self, 'ordering_fields', None) or ()), 'id'))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer_class(page).data)
+        return Response(self.fast_serializer_class(rows).data)
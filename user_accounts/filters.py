@@ -1,24 +1,45 @@
-from .models import Profile,Transaction
+from .models import Profile,Account,Transaction
 import django_filters
-from django.db.models import Q
+from .search import normalize,phone_digits,full_phonenumber
+from .utils import is_full_account_number
 
 class TransactionFilter(django_filters.FilterSet):
     status = django_filters.ChoiceFilter(field_name='status',choices=Transaction.STATUS_CHOICE)
     transaction_type = django_filters.ChoiceFilter(field_name='transaction_type',choices=Transaction.TRANSACTION_TYPE)
+    timestamp = django_filters.IsoDateTimeFromToRangeFilter(field_name='timestamp')
+    batch = django_filters.NumberFilter(field_name='batch')
     class Meta:
         model = Transaction
-        fields = ['status','transaction_type']
+        fields = ['status','transaction_type','timestamp','batch']
 
+#searches the normalized ProfileSearch columns instead of icontains across the profile and the account, so the
+#substring matches use the trigram indexes. complete phone and account numbers go to the unique indexes directly
 class ProfileFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(method='filter_by_full_name')
-    email = django_filters.CharFilter(field_name='email',lookup_expr='icontains')
-    phonenumber = django_filters.CharFilter(field_name='phonenumber',lookup_expr='icontains')
-    account_number = django_filters.CharFilter(field_name='account__account_number',lookup_expr='icontains')
+    email = django_filters.CharFilter(method='filter_by_email')
+    phonenumber = django_filters.CharFilter(method='filter_by_phonenumber')
+    account_number = django_filters.CharFilter(method='filter_by_account_number')
     class Meta:
-        method = Profile
+        model = Profile
         fields = ['name','email','phonenumber','account_number']
 
     def filter_by_full_name(self, queryset, name, value):
-        return queryset.filter(
-            Q(first_name__icontains=value)|Q(last_name__icontains=value)
-        )
\ No newline at end of file
+        return queryset.filter(search__name__contains=normalize(value))
+
+    def filter_by_email(self, queryset, name, value):
+        return queryset.filter(search__email__contains=normalize(value))
+
+    def filter_by_phonenumber(self, queryset, name, value):
+        number = full_phonenumber(value)
+        if number is not None:
+            return queryset.filter(phonenumber=number)
+        digits = phone_digits(value)
+        return queryset.filter(search__phone__contains=digits) if digits else queryset
+
+    #a few digits of a longer account number can pass the check digit too, the unique index is only taken when an
+    #account has exactly that number and anything else is searched as a substring
+    def filter_by_account_number(self, queryset, name, value):
+        value = value.strip()
+        if is_full_account_number(value) and Account.objects.filter(account_number=value).exists():
+            return queryset.filter(account__account_number=value)
+        return queryset.filter(search__account_number__contains=normalize(value))
@@ -0,0 +1,69 @@
+import hashlib
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError,transaction as db_transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+#headers of the first response that are replayed with it
+REPLAYED_HEADERS = ('Location',)
+
+class _NotSettled(Exception):
+    def __init__(self, response):
+        self.response = response
+
+#digest of the request body, a key reused with a different body is refused instead of replayed
+def request_fingerprint(data):
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+#runs handler() at most once per user and Idempotency-Key. handler returns (response, settled) and runs in the same
+#database transaction that inserts the key row, so the response is stored exactly when the money moved and a retry
+#on any worker or after a restart gets it back. a concurrent retry waits on the unique index until the first
+#request commits. a request that did not settle (e.g. invalid input) rolls its key back so it can be corrected
+def run_once(user_id, key, data, handler):
+    fingerprint = request_fingerprint(data)
+    expired_before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    IdempotencyKey.objects.filter(user_id=user_id, key=key, created_at__lt=expired_before).delete()
+    try:
+        with db_transaction.atomic():
+            try:
+                with db_transaction.atomic():
+                    record = IdempotencyKey.objects.create(user_id=user_id, key=key, fingerprint=fingerprint)
+            except IntegrityError:
+                record = None
+            if record is not None:
+                response, settled = handler()
+                if not settled:
+                    raise _NotSettled(response)
+                record.status_code = response.status_code
+                record.response = response.data
+                record.headers = {name:response[name] for name in REPLAYED_HEADERS if response.has_header(name)}
+                record.save(update_fields=['status_code','response','headers'])
+                return response
+    except _NotSettled as e:
+        return e.response
+    stored = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+    if stored is None or stored.status_code is None:
+        return Response({'error':"Request with this Idempotency-Key is still being processed"}, status=status.HTTP_409_CONFLICT)
+    if stored.fingerprint != fingerprint:
+        return Response(
+            {'error':"Idempotency-Key was already used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(stored.response, status=stored.status_code, headers=stored.headers)
+
+#deletes the keys older than IDEMPOTENCY_KEY_TTL in batches, returns how many were deleted
+def prune_keys(batch_size=10000):
+    expired_before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    expired = IdempotencyKey.objects.filter(created_at__lt=expired_before).order_by('pk')
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,41 @@
+from datetime import timedelta
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+#how long a worker owns a claimed job without renewing, every committed chunk renews it
+JOB_LEASE = timedelta(minutes=5)
+
+def lease_end():
+    return timezone.now() + JOB_LEASE
+
+#claims the oldest queued job of the model, or a running one whose worker stopped renewing its lease. other
+#workers skip the locked row instead of waiting on it
+def claim_job(model):
+    now = timezone.now()
+    with db_transaction.atomic():
+        job = (
+            model.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='queued')|Q(status='running', claimed_until__lt=now))
+            .order_by('pk').first()
+        )
+        if job is not None:
+            job.status = 'running'
+            job.claimed_until = now + JOB_LEASE
+            job.save(update_fields=['status','claimed_until'])
+    return job
+
+#runs work(job) and records how it ended in a finally block: done, failed with the error, or queued again when the
+#worker was interrupted so the next worker resumes it. the status is written with an update, the counters of a
+#chunk that did not commit stay unsaved. returns the error of a failed job
+def run_job(job, work):
+    status, error = 'queued', ''
+    try:
+        work(job)
+        status = 'done'
+    except Exception as e:
+        status, error = 'failed', f"{type(e).__name__}: {e}"
+    finally:
+        type(job).objects.filter(pk=job.pk).update(status=status, error=error, claimed_until=None, finished_at=timezone.now() if status != 'queued' else None)
+        job.status, job.error = status, error
+    return error
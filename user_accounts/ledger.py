@@ -0,0 +1,68 @@
+from decimal import Decimal
+from django.db import transaction as db_transaction
+from django.db.models import Case,When,F,Sum,Max,Value,Subquery,OuterRef,DecimalField,BigIntegerField
+from django.db.models.functions import Coalesce
+from .models import Account,LedgerEntry,LedgerCheckpoint
+
+AMOUNT = DecimalField(max_digits=12, decimal_places=2)
+SIGNED_AMOUNT = Case(When(entry_type='credit', then=F('amount')), default=-F('amount'), output_field=AMOUNT)
+
+#the debit and credit pair of a settled transaction, the cash book (no account) is the other side of deposits and withdrawals
+def ledger_entries(txn):
+    return [
+        LedgerEntry(transaction=txn, account_id=txn.sender_id, entry_type='debit', amount=txn.amount),
+        LedgerEntry(transaction=txn, account_id=txn.receiver_id, entry_type='credit', amount=txn.amount),
+    ]
+
+#writes both entries in one insert, called inside the settlement so the ledger commits with the balances
+def record_transaction(txn):
+    LedgerEntry.objects.bulk_create(ledger_entries(txn))
+
+#balance of an account from the ledger alone, the latest checkpoint plus the entries written after it.
+#works for deleted accounts too as it never reads the Account row
+def ledger_balance(account_id):
+    checkpoint = LedgerCheckpoint.objects.filter(account_id=account_id).order_by('-id').values_list('last_entry_id','balance').first()
+    last_entry_id, balance = checkpoint or (0, Decimal(0))
+    entries = LedgerEntry.objects.filter(account_id=account_id, id__gt=last_entry_id)
+    return balance + (entries.aggregate(total=Sum(SIGNED_AMOUNT))['total'] or 0)
+
+def _entries_after_checkpoint():
+    return LedgerEntry.objects.filter(account_id=OuterRef('pk'), id__gt=OuterRef('checkpoint_entry')).order_by().values('account_id')
+
+#writes a checkpoint for every account with entries since its last one and returns the accounts whose balance
+#differs from the ledger. each chunk of accounts is locked first, a settlement in flight on one of them holds
+#its row until it commits, so every entry below the new checkpoint is already visible and none is ever skipped
+def take_checkpoints(chunk_size=1000):
+    latest = LedgerCheckpoint.objects.filter(account_id=OuterRef('pk')).order_by('-id')
+    accounts = (
+        Account.objects.order_by('pk')
+        .annotate(
+            checkpoint_entry=Coalesce(Subquery(latest.values('last_entry_id')[:1]), Value(0), output_field=BigIntegerField()),
+            checkpoint_balance=Coalesce(Subquery(latest.values('balance')[:1]), Value(Decimal(0)), output_field=AMOUNT),
+        )
+        .annotate(
+            delta=Coalesce(Subquery(_entries_after_checkpoint().annotate(total=Sum(SIGNED_AMOUNT)).values('total')), Value(Decimal(0)), output_field=AMOUNT),
+            last_entry=Subquery(_entries_after_checkpoint().annotate(last=Max('id')).values('last')),
+        )
+    )
+    last_pk = 0
+    written = 0
+    mismatches = []
+    while True:
+        with db_transaction.atomic():
+            rows = list(
+                accounts.select_for_update().filter(pk__gt=last_pk)
+                .values_list('pk','balance','checkpoint_balance','delta','last_entry')[:chunk_size]
+            )
+            if not rows:
+                return written, mismatches
+            checkpoints = []
+            for pk, balance, checkpoint_balance, delta, last_entry in rows:
+                ledger = checkpoint_balance + delta
+                if ledger != balance:
+                    mismatches.append((pk, balance, ledger))
+                if last_entry is not None:
+                    checkpoints.append(LedgerCheckpoint(account_id=pk, last_entry_id=last_entry, balance=ledger))
+            LedgerCheckpoint.objects.bulk_create(checkpoints)
+        last_pk = rows[-1][0]
+        written += len(checkpoints)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ...benchmarks.seed import seed_bank,clear_bank
+from ...benchmarks.auth import compare_authentication
+
+#compares the per-request queries and latency of simplejwt's JWTAuthentication with ClaimsJWTAuthentication
+class Command(BaseCommand):
+    help = "Measures the authentication and permission cost per request"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        accounts = seed_bank(1)
+        try:
+            for result in compare_authentication(accounts[0].user, options['requests']):
+                self.stdout.write(
+                    f"{result['authentication']:>24}: {result['queries_per_request']:.2f} queries, "
+                    f"{result['microseconds_per_request']}us per request over {result['requests']} requests"
+                )
+        finally:
+            clear_bank()
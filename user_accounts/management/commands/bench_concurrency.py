@@ -0,0 +1,37 @@
+import json
+from django.core.management.base import BaseCommand
+from ...benchmarks.seed import seed_bank,clear_bank,BENCH_EMAIL_DOMAIN
+from ...benchmarks.concurrency import read_plans,measure_concurrency
+from ...models import Profile
+
+#drives the read endpoints of a running server with 50 to 500 concurrent clients. the server must use this
+#database and SECRET_KEY. run it once against the sync deployment and once against the ASGI one with
+#ASYNC_VIEWS=True and compare the two outputs
+class Command(BaseCommand):
+    help = "Measures requests per second and p99 latency of the read endpoints at rising concurrency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 100, 250, 500])
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per concurrency level")
+        parser.add_argument('--label', default='', help="Deployment name stored with the results, e.g. sync or asgi")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        accounts = seed_bank(max(options['concurrency']), staff=10)
+        try:
+            staff = list(Profile.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}', profile_type='staff'))
+            plans = read_plans(accounts, staff)
+            results = []
+            for result in measure_concurrency(options['base_url'], plans, options['concurrency'], options['duration']):
+                result['label'] = options['label']
+                results.append(result)
+                self.stdout.write(
+                    f"{options['label']:>6} {result['concurrency']:>4} clients: {result['requests_per_second']:>8} req/s, "
+                    f"p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, {result['errors']} errors"
+                )
+        finally:
+            clear_bank()
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from ...benchmarks.seed import seed_bank,clear_bank
+from ...benchmarks.connections import compare_connections
+
+#compares the per-request latency of opening a new database connection for every request with reusing one
+class Command(BaseCommand):
+    help = "Measures the per-request latency saved by persistent database connections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--conn-max-age', type=int, default=60)
+
+    def handle(self, *args, **options):
+        accounts = seed_bank(1)
+        try:
+            fresh, reused = compare_connections(accounts[0], options['requests'], options['conn_max_age'])
+        finally:
+            clear_bank()
+        for result in (fresh, reused):
+            self.stdout.write(
+                f"CONN_MAX_AGE={result['conn_max_age']:>4}: mean {result['mean_ms']}ms, "
+                f"p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms over {result['requests']} requests"
+            )
+        self.stdout.write(f"saved {fresh['mean_ms'] - reused['mean_ms']:.3f}ms per request")
@@ -0,0 +1,50 @@
+import json
+from django.core.management.base import BaseCommand,CommandError
+from ...benchmarks.load import ENDPOINTS,run_load_test,compare_runs
+
+#load test of the real routes with concurrent clients, in process through the test client or against a running
+#server with --base-url (same database and SECRET_KEY). save runs with --output and diff them with --baseline
+class Command(BaseCommand):
+    help = "Drives the API routes with concurrent clients and reports throughput and p50/p95/p99 latency per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--accounts', type=int, default=100, help="Seeded user accounts the requests rotate over")
+        parser.add_argument('--staff', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per endpoint")
+        parser.add_argument('--base-url', help="Drive a running server instead of the in-process test client")
+        parser.add_argument('--output', help="Save the run as JSON")
+        parser.add_argument('--baseline', help="Earlier JSON run to compare against")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the baseline: {e}")
+        run = run_load_test(
+            options['endpoints'],
+            accounts=options['accounts'],
+            staff=options['staff'],
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            base_url=options['base_url'],
+        )
+        self.stdout.write(f"commit {run['commit']}, {run['transport']} on {run['database']}, {run['concurrency']} clients")
+        for result in run['results']:
+            self.stdout.write(
+                f"{result['endpoint']:>20}: {result['requests_per_second']:>8} req/s, p50 {result['p50_ms']}ms, "
+                f"p95 {result['p95_ms']}ms, p99 {result['p99_ms']}ms, {result['throttled']} throttled, {result['errors']} errors"
+            )
+        if baseline is not None:
+            self.stdout.write(f"against {baseline.get('commit')}:")
+            for change in compare_runs(baseline, run):
+                deltas = ', '.join(f"{key} {value:+}%" for key, value in change.items() if key != 'endpoint')
+                self.stdout.write(f"{change['endpoint']:>20}: {deltas}")
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(run, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved to {options['output']}"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...benchmarks.metrics import measure_recording
+
+#overhead MetricsMiddleware adds to every request, it should stay around 20us or less
+class Command(BaseCommand):
+    help = "Measures the per-request recording cost of the metrics middleware"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        result = measure_recording(options['requests'])
+        self.stdout.write(f"{result['microseconds_per_request']}us per request over {result['requests']} requests")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand,CommandError
+from ...benchmarks.seed import seed_bank,seed_transactions,clear_bank
+from ...benchmarks.serializers import compare_serializers
+
+#compares the admin list model serializers with their .values() fast path at growing row counts
+class Command(BaseCommand):
+    help = "Compares rows per second of the admin list serializers and their fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+
+    def handle(self, *args, **options):
+        largest = max(options['rows'])
+        accounts = seed_bank(largest)
+        try:
+            seed_transactions(accounts, largest)
+            different = False
+            for rows in options['rows']:
+                for result in compare_serializers(rows):
+                    different = different or not result['identical']
+                    self.stdout.write(
+                        f"{result['rows']:>6} {result['case']:>12} {result['serializer']:>6}: "
+                        f"{result['rows_per_second']} rows/s{'' if result['identical'] else ' (OUTPUT DIFFERS)'}"
+                    )
+        finally:
+            clear_bank()
+        if different:
+            raise CommandError("The fast serializers did not render the same bytes as the model serializers")
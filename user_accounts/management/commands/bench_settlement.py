@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from ...models import Account
+from ...benchmarks.seed import seed_bank,clear_bank
+from ...benchmarks.settlement import run_transfers
+
+#multi-threaded stress benchmark of handle_transaction on one hot account and across many accounts,
+#run it against postgres as sqlite serializes every writer
+class Command(BaseCommand):
+    help = "Measures transfers per second of the settlement core under concurrent load"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=2000)
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded accounts after the run")
+
+    def handle(self, *args, **options):
+        accounts = seed_bank(options['accounts'])
+        expected = Account.objects.filter(pk__in=[acc.pk for acc in accounts]).aggregate(total=Sum('balance'))['total']
+        try:
+            for hot in (True, False):
+                result = run_transfers(accounts, threads=options['threads'], transfers=options['transfers'], hot=hot)
+                self.stdout.write(
+                    f"{result['scenario']:>6}: {result['transfers']} transfers on {result['threads']} threads "
+                    f"in {result['seconds']}s -> {result['transfers_per_second']} transfers/s ({result['errors']} errors)"
+                )
+            total = Account.objects.filter(pk__in=[acc.pk for acc in accounts]).aggregate(total=Sum('balance'))['total']
+            if total != expected:
+                self.stderr.write(self.style.ERROR(f"Money was created or lost: {expected} before, {total} after"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Total balance conserved at {total}"))
+        finally:
+            if not options['keep']:
+                clear_bank()
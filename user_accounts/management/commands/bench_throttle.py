@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from ...benchmarks.throttle import measure_throttles
+
+#microbenchmark of the throttle overhead per request, SimpleRateThrottle against the sliding window counter
+class Command(BaseCommand):
+    help = "Compares the per-request overhead of SimpleRateThrottle and the sliding window throttle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--cache', default='default', help="Cache alias holding the counters")
+
+    def handle(self, *args, **options):
+        for result in measure_throttles(options['requests'], options['cache']):
+            self.stdout.write(
+                f"{result['throttle']:>16} on {result['cache']}: "
+                f"{result['microseconds_per_request']}us per request over {result['requests']} requests"
+            )
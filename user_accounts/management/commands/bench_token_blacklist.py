@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from ...benchmarks.seed import seed_bank,clear_bank
+from ...benchmarks.tokens import seed_blacklist,clear_blacklist,measure_refresh
+
+#refresh latency of the plain blacklist lookup against the bloom filtered one on a large blacklist
+class Command(BaseCommand):
+    help = "Measures refresh token verification with a large token blacklist"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=1000000, help="Number of blacklisted tokens to seed")
+        parser.add_argument('--refreshes', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        accounts = seed_bank(1)
+        try:
+            started = time.perf_counter()
+            seed_blacklist(options['tokens'])
+            self.stdout.write(f"seeded {options['tokens']} blacklisted tokens in {time.perf_counter() - started:.1f}s")
+            for result in measure_refresh(accounts[0].user, options['refreshes']):
+                self.stdout.write(
+                    f"{result['token_class']:>22}: {result['queries_per_refresh']:.2f} queries, "
+                    f"{result['microseconds_per_refresh']}us per refresh over {result['refreshes']} refreshes"
+                )
+        finally:
+            clear_blacklist()
+            OutstandingToken.objects.filter(user__in=[account.user for account in accounts]).delete()
+            clear_bank()
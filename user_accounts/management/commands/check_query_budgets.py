@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand,CommandError
+from ...benchmarks.budgets import measure_endpoints
+
+#runs every read endpoint on seeded banks of growing size, fails when an endpoint goes over its query_budget or
+#when its query count changes with the size of the data, which is how an N+1 shows up
+class Command(BaseCommand):
+    help = "Checks the declared query budgets of the read endpoints on data of varying size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help="Numbers of accounts to seed")
+        parser.add_argument('--transactions-per-account', type=int, default=5)
+
+    def handle(self, *args, **options):
+        counts = {}
+        failures = []
+        for size in options['sizes']:
+            for result in measure_endpoints(size, options['transactions_per_account']):
+                self.stdout.write(
+                    f"{size:>6} accounts {result['endpoint']:>32}: {result['queries']} queries "
+                    f"(budget {result['budget']}, status {result['status']})"
+                )
+                counts.setdefault(result['endpoint'], set()).add(result['queries'])
+                if result['status'] != 200:
+                    failures.append(f"{result['endpoint']} answered {result['status']} with {size} accounts")
+                if result['budget'] is not None and result['queries'] > result['budget']:
+                    failures.append(f"{result['endpoint']} ran {result['queries']} queries with {size} accounts, budget {result['budget']}")
+        for endpoint, seen in counts.items():
+            if len(seen) > 1:
+                failures.append(f"{endpoint} query count changes with the data size: {sorted(seen)}")
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("Every endpoint stays within its query budget"))
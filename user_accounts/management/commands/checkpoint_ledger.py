@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand,CommandError
+from ...ledger import take_checkpoints
+
+#writes the periodic ledger checkpoints so a ledger balance only sums the entries since the last one, and reports
+#every account whose stored balance differs from its ledger balance. run it hourly or nightly
+class Command(BaseCommand):
+    help = "Checkpoints the ledger balance of every account and verifies it against Account.balance"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Accounts locked and checkpointed per transaction")
+        parser.add_argument('--check', action='store_true', help="Exit with an error when a balance differs from the ledger")
+
+    def handle(self, *args, **options):
+        written, mismatches = take_checkpoints(chunk_size=options['chunk_size'])
+        for pk, balance, ledger in mismatches:
+            self.stdout.write(self.style.WARNING(f"account {pk}: balance {balance}, ledger {ledger}"))
+        self.stdout.write(f"{written} checkpoints written, {len(mismatches)} mismatches")
+        if mismatches and options['check']:
+            raise CommandError("Account balances differ from the ledger")
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor,as_completed
+from datetime import date,timedelta
+import django
+from django.core.management.base import BaseCommand,CommandError
+from django.db import connections
+from django.utils import timezone
+from ...models import Account
+from ...statements import write_monthly_statements
+
+def month(value):
+    try:
+        return date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise CommandError("Give the month as YYYY-MM")
+
+#writes the monthly statement of every account across a pool of worker processes, each worker takes chunks of
+#account ids and opens its own database connection. run snapshot_balances first so the openings come from snapshots
+class Command(BaseCommand):
+    help = "Generates the monthly statement CSV of every account in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=month, help="Month to generate (YYYY-MM), defaults to the previous month")
+        parser.add_argument('--output-dir', default='statements')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--chunk-size', type=int, default=200, help="Accounts per task")
+
+    def handle(self, *args, **options):
+        statement_month = options['month'] or (timezone.localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+        output_dir = os.path.join(options['output_dir'], f"{statement_month:%Y-%m}")
+        os.makedirs(output_dir, exist_ok=True)
+        account_ids = list(Account.objects.order_by('pk').values_list('pk', flat=True))
+        chunks = [account_ids[i:i + options['chunk_size']] for i in range(0, len(account_ids), options['chunk_size'])]
+        #forked workers must not share the parent's database connection
+        connections.close_all()
+        written = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=django.setup) as pool:
+            futures = [pool.submit(write_monthly_statements, chunk, statement_month, output_dir) for chunk in chunks]
+            for future in as_completed(futures):
+                written += future.result()
+                self.stdout.write(f"{written}/{len(account_ids)} statements")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} statements to {output_dir}"))
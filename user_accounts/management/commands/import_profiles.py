@@ -0,0 +1,42 @@
+import csv
+import json
+import os
+import time
+from django.core.management.base import BaseCommand,CommandError
+from ...onboarding import import_profiles,read_rows,file_format
+
+#onboards the user profiles of a .csv or .json file in bulk, see user_accounts.onboarding. rejected rows are
+#reported and skipped, the valid rows are created with their accounts
+class Command(BaseCommand):
+    help = "Imports user profiles with their accounts from a CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='import_format', choices=['csv','json'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Profiles created per transaction")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Processes hashing the passwords")
+        parser.add_argument('--report', help="Write the rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        import_format = options['import_format'] or file_format(options['path'])
+        if import_format is None:
+            raise CommandError("Give the format with --format csv|json")
+        started = time.perf_counter()
+        with open(options['path'], encoding='utf-8-sig', newline='') as handle:
+            report = import_profiles(
+                read_rows(handle, import_format),
+                chunk_size=max(1, options['chunk_size']),
+                workers=options['workers'],
+            )
+        elapsed = time.perf_counter() - started
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"row {error['row']}: {json.dumps(error['errors'])}"))
+        if options['report']:
+            with open(options['report'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['row','errors'])
+                writer.writerows([error['row'], json.dumps(error['errors'])] for error in report['errors'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} of {report['rows']} profiles created, {report['failed']} rejected, "
+            f"{elapsed:.1f}s ({report['created'] / elapsed:,.0f} profiles/s)"
+        ))
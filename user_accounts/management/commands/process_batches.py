@@ -0,0 +1,62 @@
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError,connection
+from ...batches import settle_batch
+from ...jobs import claim_job,run_job
+from ...models import SettlementBatch,ProfileImport
+from ...onboarding import run_import
+
+logger = logging.getLogger(__name__)
+
+#runs the queued staff settlement batches and profile imports one at a time. jobs are claimed with SELECT ... FOR
+#UPDATE SKIP LOCKED and a lease, so several processes of this command share the queue and a job whose worker died
+#is taken over after the lease ran out and resumed after its last committed chunk
+class Command(BaseCommand):
+    help = "Runs queued settlement batches and profile imports"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help="Items settled or profiles created per transaction, defaults to the settings")
+        parser.add_argument('--idle', type=float, default=2.0, help="Seconds to sleep when no job is queued")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is queued")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        jobs = [
+            (SettlementBatch, lambda batch: settle_batch(batch, max(1, chunk_size or settings.SETTLEMENT_BATCH_CHUNK_SIZE)), self.batch_done),
+            (ProfileImport, lambda job: run_import(job, max(1, chunk_size or settings.ONBOARDING_CHUNK_SIZE)), self.import_done),
+        ]
+        try:
+            while True:
+                ran = False
+                for model, work, done in jobs:
+                    try:
+                        job = claim_job(model)
+                        if job is None:
+                            continue
+                        ran = True
+                        error = run_job(job, work)
+                    except DatabaseError:
+                        logger.exception("Job worker lost the database, retrying")
+                        connection.close()
+                        time.sleep(options['idle'])
+                        continue
+                    if error:
+                        self.stdout.write(self.style.ERROR(f"{model._meta.verbose_name} {job.pk} failed: {error}"))
+                    else:
+                        done(job)
+                if not ran:
+                    if options['once']:
+                        return
+                    time.sleep(options['idle'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+
+    def batch_done(self, batch):
+        self.stdout.write(f"batch {batch.pk}: {batch.settled} settled, {batch.failed} failed, {batch.rejected} rejected of {batch.items} items")
+
+    def import_done(self, job):
+        self.stdout.write(f"import {job.pk}: {job.created} of {job.rows} profiles created, {job.failed} rejected")
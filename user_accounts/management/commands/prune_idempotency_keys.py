@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...idempotency import prune_keys
+
+#deletes the stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL in batches
+class Command(BaseCommand):
+    help = "Deletes expired Idempotency-Key responses in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = prune_keys(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys"))
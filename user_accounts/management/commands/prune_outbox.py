@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...outbox import prune_outbox
+
+#deletes the sent and failed outbox emails older than OUTBOX_RETENTION in batches
+class Command(BaseCommand):
+    help = "Deletes old sent and failed outbox emails in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = prune_outbox(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} outbox emails"))
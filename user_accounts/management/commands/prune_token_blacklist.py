@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken,BlacklistedToken
+
+#deletes expired outstanding refresh tokens and their blacklist rows in batches, an expired token is rejected
+#by its exp claim already so its blacklist row only slows the lookups down. unlike flushexpiredtokens no batch
+#holds locks on more than batch-size rows
+class Command(BaseCommand):
+    help = "Deletes expired outstanding and blacklisted refresh tokens in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('pk')
+        deleted_outstanding = deleted_blacklisted = 0
+        while True:
+            batch = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            with db_transaction.atomic():
+                deleted_blacklisted += BlacklistedToken.objects.filter(token_id__in=batch).delete()[0]
+                deleted_outstanding += OutstandingToken.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted_outstanding} outstanding and {deleted_blacklisted} blacklisted tokens"
+        ))
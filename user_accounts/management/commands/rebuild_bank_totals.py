@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand,CommandError
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.conf import settings
+from ...models import Account,Profile,BankTotals
+
+#verifies the BankTotals shards against the full aggregate over every account and rewrites them when they drifted.
+#the shard rows are locked before the aggregate is taken, so a transaction that is settling meanwhile waits on
+#the shard it picked and adds its delta on top of the rebuilt totals once this command commits
+class Command(BaseCommand):
+    help = "Verifies the bank totals against the full aggregate and rebuilds them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only verify, exit with an error when the totals drifted")
+
+    def handle(self, *args, **options):
+        with db_transaction.atomic():
+            shards = list(BankTotals.objects.select_for_update().order_by('shard'))
+            stored_balance = sum((shard.balance for shard in shards), 0)
+            stored_users = sum(shard.users for shard in shards)
+            balance = Account.objects.aggregate(total=Sum('balance'))['total'] or 0
+            users = Profile.objects.filter(profile_type='user').count()
+            self.stdout.write(f"balance: stored {stored_balance}, actual {balance}")
+            self.stdout.write(f"users: stored {stored_users}, actual {users}")
+            if stored_balance == balance and stored_users == users:
+                self.stdout.write(self.style.SUCCESS("Bank totals are consistent"))
+                return
+            if options['check']:
+                raise CommandError("Bank totals drifted from the account aggregate")
+            existing = {shard.shard for shard in shards}
+            shards += [BankTotals(shard=shard) for shard in range(settings.BANK_TOTALS_SHARDS) if shard not in existing]
+            for shard in shards:
+                shard.balance = balance if shard.shard == 0 else 0
+                shard.users = users if shard.shard == 0 else 0
+            BankTotals.objects.bulk_update([shard for shard in shards if shard.pk], ['balance','users'])
+            BankTotals.objects.bulk_create([shard for shard in shards if not shard.pk])
+        self.stdout.write(self.style.SUCCESS("Bank totals rebuilt"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from ...models import Profile,ProfileSearch
+from ...search import index_profiles
+
+#rewrites the admin search rows of every profile, for rows written before the search table existed or bulk
+#created without the signals. the upsert keeps the search usable while it runs
+class Command(BaseCommand):
+    help = "Rebuilds the normalized profile search rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Profiles indexed per query")
+
+    def handle(self, *args, **options):
+        indexed = index_profiles(Profile.objects.all(), chunk_size=options['chunk_size'])
+        removed, _ = ProfileSearch.objects.exclude(profile__in=Profile.objects.all()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} profiles, removed {removed} stale rows"))
@@ -0,0 +1,58 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor,as_completed
+import django
+from django.core.management.base import BaseCommand,CommandError
+from django.db import connections
+from django.db.models import Min,Max,Count
+from ...models import Account
+from ...reconcile import pk_ranges,reconcile_range
+
+#checks every Account.balance against its net successful transactions (deposits and transfers in minus withdrawals
+#and transfers out). the accounts are split into primary key ranges checked in parallel worker processes, each
+#range is a single grouped aggregate and --workers 1 checks them in this process. balances funded outside
+#transactions (e.g. seeded) show up as mismatches
+class Command(BaseCommand):
+    help = "Reconciles every account balance against its successful transactions in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Primary keys per range")
+        parser.add_argument('--report', help="Write the mismatches to this CSV file")
+        parser.add_argument('--check', action='store_true', help="Exit with an error when an account does not reconcile")
+
+    def handle(self, *args, **options):
+        bounds = Account.objects.aggregate(first=Min('pk'), last=Max('pk'), total=Count('pk'))
+        if not bounds['total']:
+            self.stdout.write("No accounts to reconcile")
+            return
+        ranges = pk_ranges(bounds['first'], bounds['last'], max(1, options['chunk_size']))
+        mismatches = []
+        started = time.perf_counter()
+        #with one worker the ranges are checked inline
+        if options['workers'] <= 1:
+            for first, last in ranges:
+                mismatches.extend(reconcile_range(first, last))
+        else:
+            #forked workers must not share the parent's database connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                futures = [pool.submit(reconcile_range, first, last) for first, last in ranges]
+                for future in as_completed(futures):
+                    mismatches.extend(future.result())
+        elapsed = time.perf_counter() - started
+        mismatches.sort()
+        for pk, balance, net in mismatches:
+            self.stdout.write(self.style.WARNING(f"account {pk}: balance {balance}, transactions {net}, difference {balance - net}"))
+        if options['report']:
+            with open(options['report'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['account_id','balance','transactions','difference'])
+                writer.writerows([pk, balance, net, balance - net] for pk, balance, net in mismatches)
+        self.stdout.write(
+            f"{bounds['total']} accounts in {len(ranges)} ranges, {len(mismatches)} mismatches, "
+            f"{elapsed:.1f}s ({bounds['total'] / elapsed:,.0f} accounts/s)"
+        )
+        if mismatches and options['check']:
+            raise CommandError("Account balances do not reconcile with their transactions")
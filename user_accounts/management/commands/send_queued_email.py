@@ -0,0 +1,52 @@
+import threading
+import time
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import connection
+from ...outbox import claim_batch,send_batch
+
+#drains the OutboundEmail outbox. every sender thread keeps one mail connection open across batches,
+#the number of threads bounds how many SMTP sessions the worker holds at the same time
+class Command(BaseCommand):
+    help = "Delivers queued email from the outbox"
+    stopping = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=2, help="Number of sender threads and SMTP connections")
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--idle', type=float, default=2.0, help="Seconds to sleep when the outbox is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once the outbox has no due email")
+
+    def handle(self, *args, **options):
+        self.totals = {'sent':0, 'failed':0}
+        self.totals_lock = threading.Lock()
+        senders = [threading.Thread(target=self.sender, args=(options,)) for _ in range(max(1, options['concurrency']))]
+        for sender in senders:
+            sender.start()
+        try:
+            for sender in senders:
+                sender.join()
+        except KeyboardInterrupt:
+            self.stopping = True
+            for sender in senders:
+                sender.join()
+        self.stdout.write(f"sent {self.totals['sent']}, failed {self.totals['failed']}")
+
+    def sender(self, options):
+        mail_connection = get_connection()
+        try:
+            while not self.stopping:
+                batch = claim_batch(options['batch_size'], max_attempts=options['max_attempts'])
+                if not batch:
+                    if options['once']:
+                        return
+                    time.sleep(options['idle'])
+                    continue
+                sent, failed = send_batch(batch, mail_connection, max_attempts=options['max_attempts'])
+                with self.totals_lock:
+                    self.totals['sent'] += sent
+                    self.totals['failed'] += failed
+        finally:
+            mail_connection.close()
+            connection.close()
@@ -0,0 +1,57 @@
+import csv
+import json
+import time
+from django.core.management.base import BaseCommand,CommandError
+from ...batches import settle_batch
+from ...jobs import lease_end,run_job
+from ...models import Profile,SettlementBatch
+from ...onboarding import read_rows,file_format
+
+#settles a .csv or .json file of deposits and transfers as one staff batch in this process instead of through the
+#process_batches worker, see user_accounts.batches
+class Command(BaseCommand):
+    help = "Settles a file of deposits and transfers in chunked batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='batch_format', choices=['csv','json'], help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Items settled per transaction")
+        parser.add_argument('--staff', help="Email of the staff member the batch is recorded for")
+        parser.add_argument('--report', help="Write the status of every item to this CSV file")
+
+    def handle(self, *args, **options):
+        batch_format = options['batch_format'] or file_format(options['path'])
+        if batch_format is None:
+            raise CommandError("Give the format with --format csv|json")
+        created_by_id = None
+        if options['staff']:
+            created_by_id = Profile.objects.filter(email=options['staff'], profile_type__in=['staff','admin']).values_list('pk', flat=True).first()
+            if created_by_id is None:
+                raise CommandError(f"No staff member with the email {options['staff']}")
+        with open(options['path'], encoding='utf-8-sig', newline='') as handle:
+            try:
+                items = list(read_rows(handle, batch_format))
+            except (ValueError, csv.Error) as e:
+                raise CommandError(f"Could not read the file: {e}")
+        #created claimed so the process_batches worker leaves it to this command
+        batch = SettlementBatch.objects.create(created_by_id=created_by_id, payload=items, status='running', claimed_until=lease_end())
+        started = time.perf_counter()
+        error = run_job(batch, lambda batch: settle_batch(batch, max(1, options['chunk_size'])))
+        elapsed = time.perf_counter() - started
+        for rejected in batch.errors:
+            self.stdout.write(self.style.WARNING(f"item {rejected['item']}: {json.dumps(rejected['errors'])}"))
+        if options['report']:
+            with open(options['report'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['item','status','transaction','errors'])
+                writer.writerows(
+                    [result['item'], result['status'], result.get('transaction', ''), json.dumps(result.get('errors', {}))]
+                    for result in batch.results
+                )
+        if error:
+            raise CommandError(f"batch {batch.pk} failed after {batch.processed} items: {error}")
+        postings = batch.settled + batch.failed
+        self.stdout.write(self.style.SUCCESS(
+            f"batch {batch.pk}: {batch.settled} settled, {batch.failed} failed, {batch.rejected} rejected of {batch.items} items, "
+            f"{elapsed:.1f}s ({postings / elapsed:,.0f} postings/s)"
+        ))
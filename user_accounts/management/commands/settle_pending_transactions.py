@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError,connection
+from ...services import settle_pending
+
+logger = logging.getLogger(__name__)
+
+#settles the transactions queued as pending when ASYNC_SETTLEMENT is on. every worker thread claims batches with
+#SELECT ... FOR UPDATE SKIP LOCKED, so threads and separate processes of this command share the queue without
+#waiting on each other, and the settlement throughput grows with the number of workers. a batch that fails with a
+#database error is rolled back and stays pending, the thread logs it, reconnects and backs off before claiming again
+class Command(BaseCommand):
+    help = "Settles pending transactions in batches"
+    stopping = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=2, help="Number of worker threads")
+        parser.add_argument('--idle', type=float, default=0.2, help="Seconds to sleep when no transaction is pending")
+        parser.add_argument('--once', action='store_true', help="Exit once no transaction is pending")
+        parser.add_argument('--max-backoff', type=float, default=30.0, help="Longest pause in seconds after repeated database errors")
+
+    def handle(self, *args, **options):
+        self.totals = {'success':0, 'failed':0}
+        self.totals_lock = threading.Lock()
+        started = time.perf_counter()
+        workers = [threading.Thread(target=self.worker, args=(options,)) for _ in range(max(1, options['concurrency']))]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stopping = True
+            for worker in workers:
+                worker.join()
+        elapsed = time.perf_counter() - started
+        settled = self.totals['success'] + self.totals['failed']
+        self.stdout.write(
+            f"settled {self.totals['success']}, failed {self.totals['failed']} in {elapsed:.1f}s "
+            f"({settled / elapsed:,.0f} transactions/s)"
+        )
+
+    def worker(self, options):
+        failures = 0
+        try:
+            while not self.stopping:
+                try:
+                    batch = settle_pending(max(1, options['batch_size']))
+                except DatabaseError:
+                    failures += 1
+                    logger.exception("Settling a pending batch failed, retrying")
+                    connection.close()
+                    time.sleep(min(options['max_backoff'], options['idle'] * 2 ** failures))
+                    continue
+                failures = 0
+                if not batch:
+                    if options['once']:
+                        return
+                    time.sleep(options['idle'])
+                    continue
+                with self.totals_lock:
+                    for txn in batch:
+                        self.totals[txn.status] += 1
+        finally:
+            connection.close()
@@ -0,0 +1,29 @@
+from datetime import date,timedelta
+from django.core.management.base import BaseCommand,CommandError
+from django.utils import timezone
+from ...models import BalanceSnapshot
+from ...statements import take_snapshots
+
+#end of day job writing the BalanceSnapshot rows. without --date it catches up every day since the latest
+#snapshot up to yesterday, so a missed run is filled in by the next one. schedule it shortly after midnight
+class Command(BaseCommand):
+    help = "Writes the daily closing balance snapshot of every account"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Day to snapshot (YYYY-MM-DD), defaults to the missing days up to yesterday")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        if options['date']:
+            if options['date'] > yesterday:
+                raise CommandError("Only days that have already closed can be snapshotted")
+            days = [options['date']]
+        else:
+            latest = BalanceSnapshot.objects.order_by('-date').values_list('date', flat=True).first()
+            first_day = latest + timedelta(days=1) if latest else yesterday
+            days = [first_day + timedelta(days=offset) for offset in range((yesterday - first_day).days + 1)]
+        for day in days:
+            written = take_snapshots(day, chunk_size=options['chunk_size'])
+            self.stdout.write(f"{day}: {written} accounts")
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {len(days)} day(s)"))
@@ -0,0 +1,287 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction,markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse,HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+#name: (type, help, buckets) of every metric the registry exports
+METRICS = {
+    'http_request_duration_seconds':('histogram', 'Request latency by route', LATENCY_BUCKETS),
+    'http_request_db_queries':('histogram', 'SQL queries per request by route', QUERY_BUCKETS),
+    'http_request_db_seconds':('histogram', 'Time spent in SQL per request by route', LATENCY_BUCKETS),
+    'http_request_serializer_seconds':('histogram', 'Time spent serializing the response per request by route', LATENCY_BUCKETS),
+    'http_request_throttle_seconds':('histogram', 'Time spent in the throttles per request by route', LATENCY_BUCKETS),
+    'http_requests_total':('counter', 'Requests by route, method and status', None),
+    'cache_requests_total':('counter', 'Lookups of the in-process caches by cache and result', None),
+}
+
+#fixed bucket histogram, the counts are preallocated so an observation is one bisect and two additions
+class Histogram:
+    __slots__ = ('bounds','counts','sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+#per-process metrics, keyed by metric name and label values. observations happen under one lock per request
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.flush_lock = threading.Lock()
+        self.flushed_at = 0
+        self.file_name = None
+        self.file_pid = None
+
+    def histogram(self, name, labels):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms.setdefault(key, Histogram(METRICS[name][2]))
+        return histogram
+
+    def incr(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    #({key: (bucket counts, sum)}, {key: value}) copied under the lock
+    def snapshot(self):
+        with self.lock:
+            histograms = {key:(list(histogram.counts), histogram.sum) for key, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+        return histograms, counters
+
+    #prometheus text exposition format 0.0.4 of this process or of the given snapshot
+    def render(self, snapshot=None):
+        histograms, counters = snapshot or self.snapshot()
+        lines = []
+        for name, (kind, description, bounds) in METRICS.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{{{format_labels(labels)}}} {value}')
+                continue
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                label_text = format_labels(labels)
+                cumulative = 0
+                for bound, count in zip(bounds + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_text}}} {total}')
+                lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    return ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+
+registry = MetricsRegistry()
+
+#with METRICS_DIR set every worker process writes its snapshot to a file of its own there, at most every
+#METRICS_FLUSH_INTERVAL seconds, and a scrape on any worker adds up the files of all workers. the counters then
+#only grow whichever worker the scrape reaches, at worst a flush interval behind. files of exited workers are kept
+#so the totals never go back, the directory is emptied when the service is deployed
+def encode_snapshot(snapshot):
+    histograms, counters = snapshot
+    return {
+        'histograms':[[name, labels, counts, total] for (name, labels), (counts, total) in histograms.items()],
+        'counters':[[name, labels, value] for (name, labels), value in counters.items()],
+    }
+
+def decode_snapshot(data):
+    labels = lambda pairs: tuple(tuple(pair) for pair in pairs)
+    histograms = {(name, labels(pairs)):(counts, total) for name, pairs, counts, total in data['histograms']}
+    counters = {(name, labels(pairs)):value for name, pairs, value in data['counters']}
+    return histograms, counters
+
+def merge_snapshots(snapshots):
+    histograms, counters = {}, {}
+    for worker_histograms, worker_counters in snapshots:
+        for key, (counts, total) in worker_histograms.items():
+            merged = histograms.get(key)
+            histograms[key] = (counts, total) if merged is None else ([a + b for a, b in zip(merged[0], counts)], merged[1] + total)
+        for key, value in worker_counters.items():
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+#name of this process's file, a forked worker gets a new one. the random part keeps a reused pid from
+#overwriting the file of a worker that exited
+def metrics_file_name():
+    pid = os.getpid()
+    if registry.file_pid != pid:
+        registry.file_pid, registry.file_name = pid, f'metrics-{pid}-{uuid.uuid4().hex[:8]}.json'
+    return registry.file_name
+
+def flush_metrics(force=False):
+    directory = settings.METRICS_DIR
+    now = time.monotonic()
+    if not directory or (not force and now - registry.flushed_at < settings.METRICS_FLUSH_INTERVAL):
+        return
+    if not registry.flush_lock.acquire(blocking=False):
+        return
+    try:
+        registry.flushed_at = now
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as output:
+            json.dump(encode_snapshot(registry.snapshot()), output)
+        os.replace(temporary, os.path.join(directory, metrics_file_name()))
+    finally:
+        registry.flush_lock.release()
+
+#the live snapshot of this process added to the files of the other workers
+def collect_metrics():
+    directory = settings.METRICS_DIR
+    if not directory:
+        return registry.snapshot()
+    own = metrics_file_name()
+    snapshots = [registry.snapshot()]
+    for name in os.listdir(directory):
+        if not name.startswith('metrics-') or not name.endswith('.json') or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name)) as handle:
+                snapshots.append(decode_snapshot(json.load(handle)))
+        except (OSError, ValueError):
+            continue
+    return merge_snapshots(snapshots)
+
+#[queries, db seconds, serializer seconds, throttle seconds, serializer depth] of the request being served
+DB_QUERIES, DB_SECONDS, SERIALIZER_SECONDS, THROTTLE_SECONDS, SERIALIZER_DEPTH = range(5)
+_request_stats = ContextVar('request_stats', default=None)
+
+def record(phase, seconds):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[phase] += seconds
+
+#times the outermost serializer of the request only, nested serializers run inside it
+@contextmanager
+def serializer_timer():
+    stats = _request_stats.get()
+    if stats is None or stats[SERIALIZER_DEPTH]:
+        yield
+        return
+    stats[SERIALIZER_DEPTH] = 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats[SERIALIZER_SECONDS] += time.perf_counter() - started
+        stats[SERIALIZER_DEPTH] = 0
+
+def cache_lookup(cache, hit):
+    registry.incr('cache_requests_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+#times the top level .data of every DRF serializer, called once from UserAccountsConfig.ready
+def instrument_serializers():
+    from rest_framework.serializers import BaseSerializer
+    data = BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+    def timed_data(self):
+        with serializer_timer():
+            return data.fget(self)
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+#execute_wrapper counting the queries and their time into the request being served. it is installed once on
+#every connection as it opens, so queries run by the async ORM threads are counted too
+def record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[DB_QUERIES] += 1
+        stats[DB_SECONDS] += time.perf_counter() - started
+
+#connection_created receiver, connected from UserAccountsConfig.ready
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+#records per route latency, query count and time, serializer and throttle time plus the status of every request.
+#the route is the url pattern, e.g. api/profile/<int:pk>/, so the label values stay bounded
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = [0, 0.0, 0.0, 0.0, 0]
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = [0, 0.0, 0.0, 0.0, 0]
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        labels = (('route', match.route if match else 'unmatched'),)
+        with registry.lock:
+            registry.histogram('http_request_duration_seconds', labels).observe(elapsed)
+            registry.histogram('http_request_db_queries', labels).observe(stats[DB_QUERIES])
+            registry.histogram('http_request_db_seconds', labels).observe(stats[DB_SECONDS])
+            registry.histogram('http_request_serializer_seconds', labels).observe(stats[SERIALIZER_SECONDS])
+            registry.histogram('http_request_throttle_seconds', labels).observe(stats[THROTTLE_SECONDS])
+            key = ('http_requests_total', labels + (('method', request.method), ('status', response.status_code)))
+            registry.counters[key] = registry.counters.get(key, 0) + 1
+        flush_metrics()
+
+#prometheus scrape endpoint, of this worker or with METRICS_DIR of all workers on the host. with METRICS_TOKEN set
+#the scraper sends it as a bearer token, otherwise only the INTERNAL_IPS may scrape
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(collect_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
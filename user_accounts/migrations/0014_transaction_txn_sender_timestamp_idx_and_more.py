@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0013_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["sender", "-timestamp", "-id"], name="txn_sender_timestamp_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["receiver", "-timestamp", "-id"],
+                name="txn_receiver_timestamp_idx",
+            ),
+        ),
+    ]
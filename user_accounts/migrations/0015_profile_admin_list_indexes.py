@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0014_transaction_txn_sender_timestamp_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(
+                fields=["profile_type", "created_at", "id"],
+                name="profile_type_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(
+                fields=["profile_type", "first_name", "id"],
+                name="profile_type_first_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(
+                fields=["profile_type", "age", "id"], name="profile_type_age_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["timestamp", "id"], name="txn_timestamp_idx"),
+        ),
+    ]
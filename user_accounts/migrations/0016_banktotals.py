@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:40
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+BANK_TOTALS_SHARDS = 8
+
+
+def seed_bank_totals(apps, schema_editor):
+    BankTotals = apps.get_model("user_accounts", "BankTotals")
+    Account = apps.get_model("user_accounts", "Account")
+    Profile = apps.get_model("user_accounts", "Profile")
+    balance = Account.objects.aggregate(total=Sum("balance"))["total"] or 0
+    users = Profile.objects.filter(profile_type="user").count()
+    BankTotals.objects.bulk_create(
+        [BankTotals(shard=0, balance=balance, users=users)]
+        + [BankTotals(shard=shard) for shard in range(1, BANK_TOTALS_SHARDS)]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0015_profile_admin_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BankTotals",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField(unique=True)),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, default=0.0, max_digits=18),
+                ),
+                ("users", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_bank_totals, migrations.RunPython.noop),
+    ]
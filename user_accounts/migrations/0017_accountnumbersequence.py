@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+ACCOUNT_NUMBER_SEQUENCE = "user_accounts_account_number_seq"
+ACCOUNT_NUMBER_START = 100000
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+
+
+def create_account_number_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE SEQUENCE IF NOT EXISTS {ACCOUNT_NUMBER_SEQUENCE} "
+            f"START WITH {ACCOUNT_NUMBER_START} INCREMENT BY {ACCOUNT_NUMBER_BLOCK_SIZE}"
+        )
+        return
+    AccountNumberSequence = apps.get_model("user_accounts", "AccountNumberSequence")
+    AccountNumberSequence.objects.get_or_create(
+        name=ACCOUNT_NUMBER_SEQUENCE, defaults={"next_value": ACCOUNT_NUMBER_START}
+    )
+
+
+def drop_account_number_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {ACCOUNT_NUMBER_SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0016_banktotals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountNumberSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=64, unique=True)),
+                ("next_value", models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(
+            create_account_number_sequence, drop_account_number_sequence
+        ),
+    ]
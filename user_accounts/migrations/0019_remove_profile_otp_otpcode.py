@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0018_outboundemail"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="profile",
+            name="otp",
+        ),
+        migrations.RemoveField(
+            model_name="profile",
+            name="otp_created_time",
+        ),
+        migrations.CreateModel(
+            name="OTPCode",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="otp_code",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("expires_at", models.DateTimeField()),
+            ],
+        ),
+    ]
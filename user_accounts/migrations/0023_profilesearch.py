@@ -0,0 +1,91 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:05
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+SEARCH_COLUMNS = ("name", "email", "phone", "account_number")
+
+
+def normalize(value):
+    return " ".join(unicodedata.normalize("NFKC", str(value or "")).casefold().split())
+
+
+def backfill_profile_search(apps, schema_editor):
+    Profile = apps.get_model("user_accounts", "Profile")
+    ProfileSearch = apps.get_model("user_accounts", "ProfileSearch")
+    rows = Profile.objects.order_by("pk").values_list(
+        "pk", "first_name", "last_name", "email", "phonenumber", "account__account_number"
+    )
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:1000])
+        if not chunk:
+            return
+        ProfileSearch.objects.bulk_create(
+            ProfileSearch(
+                profile_id=pk,
+                name=normalize(f"{first_name} {last_name}"),
+                email=normalize(email),
+                phone=re.sub(r"\D+", "", str(phonenumber or "")),
+                account_number=normalize(account_number),
+            )
+            for pk, first_name, last_name, email, phonenumber, account_number in chunk
+        )
+        last_pk = chunk[-1][0]
+
+
+#trigram indexes serve the substring searches on postgres, other databases run the same queries without them
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS profile_search_{column}_trgm "
+            f"ON user_accounts_profilesearch USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS profile_search_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0022_ledgerentry_ledgercheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProfileSearch",
+            fields=[
+                (
+                    "profile",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("name", models.CharField(max_length=201)),
+                ("email", models.CharField(max_length=254)),
+                ("phone", models.CharField(max_length=20)),
+                (
+                    "account_number",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_profile_search, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
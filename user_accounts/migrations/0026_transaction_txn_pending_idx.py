@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user_accounts", "0025_settlementbatch_transaction_batch"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["id"],
+                name="txn_pending_idx",
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from cloudinary.models import CloudinaryField
 from phonenumber_field.modelfields import PhoneNumberField
@@ -44,11 +46,15 @@ class Profile(AbstractUser):
     profile_pic = CloudinaryField('image',null=True,blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    otp = models.CharField(max_length=128, blank=True, null=True)
-    otp_created_time = models.DateTimeField(blank=True, null=True)
     objects = CustomUserManager()
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['profile_type','created_at','id'],name='profile_type_created_idx'),
+            models.Index(fields=['profile_type','first_name','id'],name='profile_type_first_name_idx'),
+            models.Index(fields=['profile_type','age','id'],name='profile_type_age_idx'),
+        ]
     def __str__(self):
         return f"{self.id} - {self.email}"
 
@@ -78,4 +84,242 @@ class Transaction(models.Model):
     amount = models.DecimalField(decimal_places=2,max_digits=12,blank=False,null=False)
     status = models.CharField(max_length=12,choices=STATUS_CHOICE,default='pending')
     description = models.TextField(max_length=100,blank=True,null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    timestamp = models.DateTimeField(auto_now_add=True)
+    batch = models.ForeignKey('SettlementBatch',on_delete=models.SET_NULL,null=True,blank=True,related_name='transactions')
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender','-timestamp','-id'],name='txn_sender_timestamp_idx'),
+            models.Index(fields=['receiver','-timestamp','-id'],name='txn_receiver_timestamp_idx'),
+            models.Index(fields=['timestamp','id'],name='txn_timestamp_idx'),
+            models.Index(fields=['id'],condition=models.Q(status='pending'),name='txn_pending_idx'),
+        ]
+
+#response of a POST /api/profile/transaction/ sent with an Idempotency-Key, inserted in the same database transaction
+#as the settlement so every worker sees it as soon as the money moved. the fingerprint is a digest of the request body
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey('Profile',on_delete=models.CASCADE,related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True,blank=True)
+    response = models.JSONField(null=True,blank=True,encoder=DjangoJSONEncoder)
+    headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user','key'],name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'],name='idempotency_created_idx'),
+        ]
+    def __str__(self):
+        return f"{self.user_id} -- {self.key}"
+
+#bank wide totals kept as a few counter rows that are updated with the transactions and the account
+#signals, writers pick a random shard so they rarely wait on each other and the dashboard sums the shards
+class BankTotals(models.Model):
+    shard = models.PositiveSmallIntegerField(unique=True)
+    balance = models.DecimalField(default=0.00,decimal_places=2,max_digits=18)
+    users = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    def __str__(self):
+        return f"shard {self.shard} -- {self.balance} / {self.users} users"
+
+
+#block counter behind the account number allocator on databases without native sequences
+class AccountNumberSequence(models.Model):
+    name = models.CharField(max_length=64,unique=True)
+    next_value = models.BigIntegerField()
+    def __str__(self):
+        return f"{self.name} -- {self.next_value}"
+
+
+#durable queue of outgoing email, rows are inserted by the request and delivered by the send_queued_email worker
+class OutboundEmail(models.Model):
+    STATUS_CHOICE = [
+        ('pending','Pending'),
+        ('sending','Sending'),
+        ('sent','Sent'),
+        ('failed','Failed'),
+    ]
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=12,choices=STATUS_CHOICE,default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True,default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True,null=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['status','next_attempt_at'],name='outbox_due_idx'),
+        ]
+    def __str__(self):
+        return f"{self.id} - {self.subject} ({self.status})"
+
+
+#database fallback of the otp store used when the configured cache is local to the process
+class OTPCode(models.Model):
+    user = models.OneToOneField('Profile',on_delete=models.CASCADE,primary_key=True,related_name='otp_code')
+    digest = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    def __str__(self):
+        return f"{self.user_id} -- {self.expires_at}"
+
+
+#fixed window request counters of the throttles when the shared cache is the database cache
+class ThrottleCounter(models.Model):
+    key = models.CharField(max_length=255,primary_key=True)
+    count = models.BigIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+    def __str__(self):
+        return f"{self.key} -- {self.count}"
+
+
+#closing balance of every account at the end of a day in TIME_ZONE, written by the snapshot_balances end of day
+#job so that statements only replay the transactions after the nearest snapshot
+class BalanceSnapshot(models.Model):
+    account = models.ForeignKey('Account',on_delete=models.CASCADE,related_name='balance_snapshots')
+    date = models.DateField()
+    balance = models.DecimalField(decimal_places=2,max_digits=12)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account','date'],name='balance_snapshot_account_date_uniq'),
+        ]
+    def __str__(self):
+        return f"{self.account_id} -- {self.date} -- {self.balance}"
+
+
+#entries are neither updated nor deleted in bulk. purge() is the one way to delete them, it is only meant for
+#clear_bank removing the seeded benchmark bank
+class LedgerEntryQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise TypeError("Ledger entries are immutable")
+    def delete(self):
+        raise TypeError("Ledger entries are immutable")
+    def purge(self):
+        return super().delete()
+
+#append only double entry ledger, every settled transaction writes one debit and one credit of the same amount.
+#a null account is the bank's cash book, the other side of deposits and withdrawals. the account reference has
+#no database constraint so the entries of a deleted account stay behind with its id. the transaction reference is
+#protected: a settled transaction can not be deleted, it is reversed with a new one. pending and failed ones have
+#no entries and can be, deleting an account keeps its transactions with the account set to null
+class LedgerEntry(models.Model):
+    ENTRY_TYPE = [
+        ('debit','Debit'),
+        ('credit','Credit'),
+    ]
+    transaction = models.ForeignKey('Transaction',on_delete=models.PROTECT,related_name='ledger_entries')
+    account = models.ForeignKey('Account',on_delete=models.DO_NOTHING,db_constraint=False,null=True,related_name='ledger_entries')
+    entry_type = models.CharField(max_length=6,choices=ENTRY_TYPE)
+    amount = models.DecimalField(decimal_places=2,max_digits=12)
+    created_at = models.DateTimeField(auto_now_add=True)
+    objects = LedgerEntryQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['account','id'],name='ledger_account_id_idx'),
+        ]
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise TypeError("Ledger entries are immutable")
+        super().save(*args, **kwargs)
+    def delete(self, *args, **kwargs):
+        raise TypeError("Ledger entries are immutable")
+    def __str__(self):
+        return f"{self.transaction_id} -- {self.entry_type} {self.amount} -- {self.account_id or 'cash'}"
+
+#balance of an account as of a ledger entry id, the ledger balance is the latest checkpoint plus the entries after it
+class LedgerCheckpoint(models.Model):
+    account = models.ForeignKey('Account',on_delete=models.DO_NOTHING,db_constraint=False,related_name='ledger_checkpoints')
+    last_entry_id = models.BigIntegerField(default=0)
+    balance = models.DecimalField(decimal_places=2,max_digits=12)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['account','-id'],name='ledger_checkpoint_account_idx'),
+        ]
+    def __str__(self):
+        return f"{self.account_id} -- {self.balance} at entry {self.last_entry_id}"
+
+
+#normalized copy of the searchable profile fields kept current by the Profile and Account signals. the admin
+#search matches substrings of these columns, which have trigram indexes on postgres
+class ProfileSearch(models.Model):
+    profile = models.OneToOneField('Profile',on_delete=models.CASCADE,primary_key=True,related_name='search')
+    name = models.CharField(max_length=201)
+    email = models.CharField(max_length=254)
+    phone = models.CharField(max_length=20)
+    account_number = models.CharField(max_length=20,blank=True,default='')
+    def __str__(self):
+        return f"{self.profile_id} -- {self.name}"
+
+
+#a staff batch of deposits and transfers, queued by the request and settled in chunks by the process_batches
+#worker. every chunk commits together with the counters, the item results and processed, the number of the last
+#item it covered, so a batch picked up again after its worker died goes on after that item and never settles
+#an item twice. reference is the Idempotency-Key the batch was posted with
+class SettlementBatch(models.Model):
+    STATUS_CHOICE = [
+        ('queued','Queued'),
+        ('running','Running'),
+        ('done','Done'),
+        ('failed','Failed'),
+    ]
+    created_by = models.ForeignKey('Profile',on_delete=models.SET_NULL,null=True,blank=True,related_name='settlement_batches')
+    reference = models.CharField(max_length=255,null=True,blank=True)
+    status = models.CharField(max_length=12,choices=STATUS_CHOICE,default='queued')
+    payload = models.JSONField(default=list)
+    processed = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    settled = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    results = models.JSONField(default=list)
+    error = models.TextField(blank=True,default='')
+    claimed_until = models.DateTimeField(blank=True,null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True,null=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by','reference'],condition=models.Q(reference__isnull=False),name='settlement_batch_reference_uniq'),
+        ]
+    def __str__(self):
+        return f"{self.id} -- {self.settled}/{self.items} settled ({self.status})"
+
+
+#a profile import uploaded through the admin dashboard, queued by the request and run in chunks by the
+#process_batches worker. every chunk commits together with the counters, the rejected rows and processed, the number
+#of the last row it covered, so an import picked up again goes on after that row. the uploaded rows are cleared
+#once it finished, fingerprint is kept to answer a retried upload with the same Idempotency-Key
+class ProfileImport(models.Model):
+    STATUS_CHOICE = [
+        ('queued','Queued'),
+        ('running','Running'),
+        ('done','Done'),
+        ('failed','Failed'),
+    ]
+    created_by = models.ForeignKey('Profile',on_delete=models.SET_NULL,null=True,blank=True,related_name='profile_imports')
+    reference = models.CharField(max_length=255,null=True,blank=True)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=12,choices=STATUS_CHOICE,default='queued')
+    payload = models.JSONField(default=list)
+    processed = models.PositiveIntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    error = models.TextField(blank=True,default='')
+    claimed_until = models.DateTimeField(blank=True,null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True,null=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['created_by','reference'],condition=models.Q(reference__isnull=False),name='profile_import_reference_uniq'),
+        ]
+    def __str__(self):
+        return f"{self.id} -- {self.created}/{self.rows} created ({self.status})"
@@ -0,0 +1,228 @@
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError,connections,transaction as db_transaction
+from rest_framework import serializers
+from phonenumber_field.serializerfields import PhoneNumberField
+from .idempotency import request_fingerprint
+from .jobs import lease_end
+from .models import Profile,Account,OutboundEmail,ProfileImport
+from .search import index_profiles
+from .utils import account_number_allocator,update_bank_totals
+from .validators import validate_name,validate_age,validate_password1
+
+IMPORT_FORMATS = ('csv','json')
+INVITE_SUBJECT = "Your Village Bank account is ready"
+
+#one row of an onboarding file. a plain serializer so no field runs a per row uniqueness query, the file is
+#checked against the database once per chunk. rows without a password are invited to set one
+class OnboardingRowSerializer(serializers.Serializer):
+    first_name = serializers.CharField(max_length=100, validators=[validate_name])
+    last_name = serializers.CharField(max_length=100, validators=[validate_name])
+    age = serializers.IntegerField(validators=[validate_age])
+    email = serializers.EmailField(max_length=254)
+    phonenumber = PhoneNumberField(region=settings.PHONENUMBER_DEFAULT_REGION)
+    password = serializers.CharField(required=False, allow_blank=True, write_only=True, validators=[validate_password1])
+
+#rows of a csv file or of a json array of objects, read lazily from a text stream
+def read_rows(handle, file_format):
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format {file_format}, choose csv or json")
+    if file_format == 'csv':
+        yield from csv.DictReader(handle)
+        return
+    rows = json.load(handle)
+    if not isinstance(rows, list):
+        raise ValueError("A json import is an array of profile objects")
+    yield from rows
+
+#format of an uploaded or given file by its extension
+def file_format(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return extension if extension in IMPORT_FORMATS else None
+
+def text_stream(uploaded):
+    return io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline='')
+
+#numbers the rows from 1 and stops at the first row that can not be read or past max_rows, the row that
+#stopped it is handed to reject(number, errors)
+def numbered_rows(rows, reject, max_rows=None):
+    rows = iter(rows)
+    number = 0
+    while True:
+        number += 1
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except (ValueError, csv.Error) as e:
+            reject(number, {'non_field_errors':[f"Could not read the file: {e}"]})
+            return
+        if max_rows is not None and number > max_rows:
+            reject(number, {'non_field_errors':[f"Only the first {max_rows} rows are read at once"]})
+            return
+        yield number, row
+
+#hashes the initial passwords in worker processes, PBKDF2 is the bulk of the cost of creating a profile.
+#with one worker they are hashed inline
+@contextmanager
+def password_hasher(workers):
+    if workers <= 1:
+        yield lambda passwords: [make_password(password) for password in passwords]
+        return
+    #forked workers must not share the parent's database connection
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        yield lambda passwords: list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // workers)))
+
+def invite_email(profile, account_number):
+    message = (
+        f"Hello {profile.first_name}, your Village Bank account {account_number} is ready. "
+        f"Request an OTP with your email {profile.email} and set your password through forgot password to sign in."
+    )
+    return OutboundEmail(subject=INVITE_SUBJECT, message=message, from_email=settings.EMAIL_HOST_USER, recipients=[profile.email])
+
+#creates the profiles of one chunk with their accounts, search rows, bank totals and invites in one transaction.
+#a profile registered meanwhile fails the bulk insert, the chunk is then created row by row
+def create_chunk(chunk, hash_passwords, report):
+    emails = {data['email'] for _, data in chunk}
+    phones = {str(data['phonenumber']) for _, data in chunk}
+    taken_emails = set(Profile.objects.filter(email__in=emails).values_list('email', flat=True))
+    taken_phones = {str(phone) for phone in Profile.objects.filter(phonenumber__in=phones).values_list('phonenumber', flat=True)}
+    rows = []
+    for number, data in chunk:
+        errors = {}
+        if data['email'] in taken_emails:
+            errors['email'] = ["Email already exists"]
+        if str(data['phonenumber']) in taken_phones:
+            errors['phonenumber'] = ["PhoneNumber already exists!!!"]
+        if errors:
+            report['errors'].append({'row':number, 'errors':errors})
+        else:
+            rows.append((number, data))
+    if not rows:
+        return
+    passwords = [data.get('password') for _, data in rows]
+    hashed = iter(hash_passwords([password for password in passwords if password]))
+    profiles = []
+    for (number, data), password in zip(rows, passwords):
+        profiles.append(Profile(
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            age=data['age'],
+            email=data['email'],
+            phonenumber=data['phonenumber'],
+            profile_type='user',
+            password=next(hashed) if password else make_password(None),
+        ))
+    try:
+        with db_transaction.atomic():
+            Profile.objects.bulk_create(profiles)
+            accounts = Account.objects.bulk_create(
+                [Account(user=profile, account_number=account_number_allocator.allocate()) for profile in profiles]
+            )
+            update_bank_totals(users=len(profiles))
+            index_profiles(Profile.objects.filter(pk__in=[profile.pk for profile in profiles]))
+            OutboundEmail.objects.bulk_create([
+                invite_email(profile, account.account_number)
+                for profile, account, password in zip(profiles, accounts, passwords) if not password
+            ])
+    except IntegrityError:
+        for (number, _), profile, password in zip(rows, profiles, passwords):
+            create_one(number, profile, password, report)
+        return
+    report['created'] += len(profiles)
+
+#saves one profile through the signals, which open its account, count it and index it
+def create_one(number, profile, password, report):
+    profile.pk = None
+    profile._state.adding = True
+    try:
+        with db_transaction.atomic():
+            profile.save()
+            if not password:
+                invite_email(profile, profile.account.account_number).save()
+    except IntegrityError:
+        report['errors'].append({'row':number, 'errors':{'non_field_errors':["Email or phone number was registered during the import"]}})
+        return
+    report['created'] += 1
+
+#validates the rows in one streaming pass and creates the valid ones in chunks. rows are numbered from 1, every
+#rejected row is reported with its errors and the rest of the batch carries on. a file that stops parsing midway
+#keeps the rows created before it. rows up to start were imported by an earlier run, committed(number) is called
+#inside the transaction of every chunk with the number of its last row
+def import_profiles(rows, chunk_size=500, workers=1, max_rows=None, report=None, start=0, committed=None):
+    report = report if report is not None else {'rows':0, 'created':0, 'errors':[]}
+    seen_emails = set()
+    seen_phones = set()
+    chunk = []
+    reject = lambda number, errors: report['errors'].append({'row':number, 'errors':errors})
+    with password_hasher(workers) as hash_passwords:
+        def flush(chunk, number):
+            with db_transaction.atomic():
+                create_chunk(chunk, hash_passwords, report)
+                if committed is not None:
+                    committed(number)
+        number = start
+        for number, row in numbered_rows(rows, reject, max_rows):
+            if number <= start:
+                continue
+            report['rows'] += 1
+            serializer = OnboardingRowSerializer(data=row)
+            if not serializer.is_valid():
+                reject(number, serializer.errors)
+                continue
+            data = serializer.validated_data
+            errors = {}
+            if data['email'] in seen_emails:
+                errors['email'] = ["Email appears earlier in the file"]
+            if str(data['phonenumber']) in seen_phones:
+                errors['phonenumber'] = ["PhoneNumber appears earlier in the file"]
+            if errors:
+                reject(number, errors)
+                continue
+            seen_emails.add(data['email'])
+            seen_phones.add(str(data['phonenumber']))
+            chunk.append((number, data))
+            if len(chunk) >= chunk_size:
+                flush(chunk, number)
+                chunk = []
+        if chunk:
+            flush(chunk, number)
+    report['failed'] = len(report['errors'])
+    return report
+
+#queues the rows of an uploaded file as a ProfileImport for the process_batches worker. an upload posted again with
+#the same reference is not queued twice, the earlier import is returned with created False
+def queue_import(rows, created_by_id=None, reference=None):
+    if reference:
+        existing = ProfileImport.objects.filter(created_by_id=created_by_id, reference=reference).first()
+        if existing is not None:
+            return existing, False
+    try:
+        with db_transaction.atomic():
+            return ProfileImport.objects.create(
+                created_by_id=created_by_id, reference=reference, fingerprint=request_fingerprint(rows), payload=rows,
+            ), True
+    except IntegrityError:
+        return ProfileImport.objects.get(created_by_id=created_by_id, reference=reference), False
+
+#runs a claimed import through run_job. the passwords are hashed inline, uploads carry none and get invites. the
+#uploaded rows are cleared when the import is through them
+def run_import(job, chunk_size=500):
+    report = {'rows':job.rows, 'created':job.created, 'errors':job.errors}
+    def committed(number):
+        job.processed = number
+        job.rows, job.created, job.failed = report['rows'], report['created'], len(report['errors'])
+        job.claimed_until = lease_end()
+        job.save(update_fields=['processed','rows','created','failed','errors','claimed_until'])
+    import_profiles(job.payload, chunk_size=chunk_size, report=report, start=job.processed, committed=committed)
+    with db_transaction.atomic():
+        committed(max(job.processed, len(job.payload)))
+        job.payload = []
+        job.save(update_fields=['payload'])
@@ -0,0 +1,77 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import salted_hmac,constant_time_compare
+from .models import OTPCode
+
+class OTPError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+#keyed hmac of the code bound to the user, a 4 digit code gains nothing from a slow password hasher
+#as long as the attempts are capped, and the server side key keeps a leaked digest from being brute forced
+def otp_digest(user_pk, otp):
+    return salted_hmac('user_accounts.otp', f'{user_pk}:{otp}').hexdigest()
+
+#otp store on a shared cache, the code expires with the cache ttl and the attempts are an atomic counter
+class CacheOTPStore:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def issue(self, user, otp):
+        key = f'otp:{user.pk}'
+        self.cache.set_many({key:otp_digest(user.pk, otp), f'{key}:attempts':0}, timeout=settings.OTP_TTL)
+
+    def verify(self, user, otp):
+        key = f'otp:{user.pk}'
+        digest = self.cache.get(key)
+        if digest is None:
+            raise OTPError("No OTP was requested or it has expired.", "no_otp")
+        try:
+            attempts = self.cache.incr(f'{key}:attempts')
+        except ValueError:
+            raise OTPError("No OTP was requested or it has expired.", "no_otp")
+        if attempts > settings.OTP_MAX_ATTEMPTS:
+            self.cache.delete_many([key, f'{key}:attempts'])
+            raise OTPError("Too many attempts please request for another otp", "otp_attempts_exceeded")
+        if not constant_time_compare(digest, otp_digest(user.pk, otp)):
+            raise OTPError("Invalid Otp", "invalid_otp")
+        self.cache.delete_many([key, f'{key}:attempts'])
+
+#otp store on the OTPCode table for deployments whose cache has no atomic incr shared by the workers
+class DatabaseOTPStore:
+    def issue(self, user, otp):
+        OTPCode.objects.update_or_create(
+            user=user,
+            defaults={
+                'digest':otp_digest(user.pk, otp),
+                'attempts':0,
+                'expires_at':timezone.now() + timedelta(seconds=settings.OTP_TTL),
+            },
+        )
+
+    def verify(self, user, otp):
+        live = OTPCode.objects.filter(user=user, expires_at__gt=timezone.now())
+        if not live.update(attempts=F('attempts') + 1):
+            raise OTPError("No OTP was requested or it has expired.", "no_otp")
+        code = OTPCode.objects.get(user=user)
+        if code.attempts > settings.OTP_MAX_ATTEMPTS:
+            code.delete()
+            raise OTPError("Too many attempts please request for another otp", "otp_attempts_exceeded")
+        if not constant_time_compare(code.digest, otp_digest(user.pk, otp)):
+            raise OTPError("Invalid Otp", "invalid_otp")
+        code.delete()
+
+#the attempts counter needs an incr that is atomic across workers, which only redis and memcached have. a local
+#cache is not shared and the database cache reads and writes the counter in two statements, both use the table
+def get_otp_store():
+    cache = caches[settings.OTP_CACHE_ALIAS]
+    if isinstance(cache, (RedisCache, BaseMemcachedCache)) or type(cache).__module__.startswith('django_redis'):
+        return CacheOTPStore(cache)
+    return DatabaseOTPStore()
@@ -0,0 +1,82 @@
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction as db_transaction
+from django.db.models import F,Q
+from django.utils import timezone
+from .models import OutboundEmail
+
+#queues an email with a single insert, the send_queued_email worker delivers it
+def enqueue_email(subject, message, recipients, from_email=None):
+    return OutboundEmail.objects.create(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        recipients=[recipients] if isinstance(recipients, str) else list(recipients),
+    )
+
+#claims up to batch_size due emails for this worker. claimed rows are moved to 'sending' with a lease, if the
+#worker dies before finishing them they become due again once the lease runs out. other workers skip locked rows.
+#a due email that already used max_attempts, e.g. one that crashed the worker every time, is given up instead
+def claim_batch(batch_size, lease=timedelta(minutes=5), max_attempts=5):
+    now = timezone.now()
+    with db_transaction.atomic():
+        due = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='pending')|Q(status='sending'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        batch = [email for email in due if email.attempts < max_attempts]
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in due if email.attempts >= max_attempts]).update(
+            status='failed', message='', last_error=f"Gave up after {max_attempts} attempts",
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status='sending', next_attempt_at=now + lease, attempts=F('attempts') + 1,
+        )
+    for email in batch:
+        email.attempts += 1
+    return batch
+
+#backoff before the next attempt, doubles with every failed attempt and adds some jitter
+def retry_delay(attempts, base=30, cap=3600):
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+#sends one claimed batch over a mail connection that stays open between messages and records the outcome of every email.
+#a failed send closes the connection so that the next message starts from a fresh SMTP session. the body of a sent or
+#given up email is blanked, it may carry an OTP that must not stay readable in the database
+def send_batch(batch, mail_connection, max_attempts=5):
+    sent = []
+    failed = 0
+    for email in batch:
+        message = EmailMessage(email.subject, email.message, email.from_email, email.recipients, connection=mail_connection)
+        try:
+            mail_connection.open()
+            message.send(fail_silently=False)
+        except Exception as e:
+            failed += 1
+            mail_connection.close()
+            given_up = email.attempts >= max_attempts
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                status='failed' if given_up else 'pending',
+                next_attempt_at=timezone.now() + retry_delay(email.attempts),
+                last_error=str(e)[:1000],
+                **({'message':''} if given_up else {}),
+            )
+        else:
+            sent.append(email.pk)
+    if sent:
+        OutboundEmail.objects.filter(pk__in=sent).update(status='sent', sent_at=timezone.now(), last_error='', message='')
+    return len(sent), failed
+
+#deletes the sent and failed emails older than OUTBOX_RETENTION in batches, returns how many were deleted
+def prune_outbox(batch_size=10000):
+    expired_before = timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION)
+    expired = OutboundEmail.objects.filter(status__in=['sent','failed'], created_at__lt=expired_before).order_by('pk')
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += OutboundEmail.objects.filter(pk__in=batch).delete()[0]
@@ -0,0 +1,154 @@
+import json
+from collections import OrderedDict
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination,Cursor,_reverse_ordering
+
+#estimated number of rows of a queryset taken from the planner statistics on postgres,
+#other databases fall back to an exact count. returns the count and whether it is an estimate
+def estimate_count(queryset):
+    queryset = queryset.order_by()
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count(), False
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows']), True
+
+#keyset pagination ordered by the ordering field the view allows through OrderingFilter and the id as tie breaker.
+#the cursor holds both values of the item it continues from, so pages of a non unique field (first_name, age)
+#neither skip nor repeat rows and every page costs the same however deep the client scrolls, no OFFSET is run
+class KeysetCursorPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    #the first ordering field and the id in the same direction
+    def get_ordering(self, request, queryset, view):
+        field = tuple(super().get_ordering(request, queryset, view))[0]
+        if field.lstrip('-') in ('pk','id'):
+            return ('-id',) if field.startswith('-') else ('id',)
+        return (field, '-id' if field.startswith('-') else 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_branches([queryset], request, view)
+
+    #one page of the rows of several disjoint querysets in one ordering. every branch is ordered and limited to a page
+    #on its own, so each reads its rows in order from its own index instead of sorting the rows of an OR
+    def paginate_branches(self, branches, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, branches[0], view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        self.position = self.cursor_position(self.cursor)
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        limited = []
+        for queryset in branches:
+            queryset = queryset.order_by(*ordering)
+            if self.position is not None:
+                queryset = queryset.filter(self.after(self.position, reverse))
+            limited.append(queryset[:self.page_size + 1])
+        results = self.merge(limited, ordering)
+        self.page = results[:self.page_size]
+        has_more = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    #the first page_size + 1 rows of the limited branches. one UNION ALL query where the database can limit the
+    #parts of a compound query (postgres), otherwise one query per branch merged here
+    def merge(self, limited, ordering):
+        if len(limited) == 1:
+            return list(limited[0])
+        if connections[limited[0].db].features.supports_slicing_ordering_in_compound:
+            return list(limited[0].union(*limited[1:], all=True).order_by(*ordering)[:self.page_size + 1])
+        field = ordering[0].lstrip('-')
+        rows = sorted(
+            (row for queryset in limited for row in queryset),
+            key=lambda row: (getattr(row, field), row.pk),
+            reverse=ordering[0].startswith('-'),
+        )
+        return rows[:self.page_size + 1]
+
+    #rows strictly after (value, id) in the direction the page is read
+    def after(self, position, reverse):
+        value, pk = position
+        field = self.ordering[0].lstrip('-')
+        lookup = 'lt' if self.ordering[0].startswith('-') != reverse else 'gt'
+        if len(self.ordering) == 1:
+            return Q(**{f'id__{lookup}':pk})
+        return Q(**{f'{field}__{lookup}':value}) | Q(**{field:value, f'id__{lookup}':pk})
+
+    def cursor_position(self, cursor):
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            value, pk = json.loads(cursor.position)
+            return value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        field = ordering[0].lstrip('-')
+        if isinstance(instance, dict):
+            return json.dumps([str(instance[field]), instance['id']])
+        return json.dumps([str(getattr(instance, field)), instance.pk])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+#the sent and received history of an account, newest first. the view pages the sender and receiver querysets as
+#two branches so that each is read from its (account, -timestamp, -id) index
+class TransactionCursorPagination(KeysetCursorPagination):
+    page_size = 20
+    ordering = ('-timestamp','-id')
+
+#keyset pagination for the admin lists, admins pick the page size up to max_page_size and ask for the total only
+#when they need it with ?count=estimate (planner statistics) or ?count=exact (COUNT(*))
+class AdminCursorPagination(KeysetCursorPagination):
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        self.count_is_estimate = False
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count, self.count_is_estimate = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = OrderedDict([
+                ('count', self.count),
+                ('count_is_estimate', self.count_is_estimate),
+                *response.data.items(),
+            ])
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'] = {
+            'count': {'type': 'integer', 'nullable': True},
+            'count_is_estimate': {'type': 'boolean'},
+            **response_schema['properties'],
+        }
+        return response_schema
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from django.db import connections
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+#execute_wrapper that records the sql of every query run on the connection
+class QueryCounter:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def check(self, budget, label='block'):
+        if budget is not None and len(self.queries) > budget:
+            raise QueryBudgetExceeded(
+                f"{label} ran {len(self.queries)} queries, its budget is {budget}:\n" + "\n".join(self.queries)
+            )
+
+#test helper, fails when the block runs more queries than the budget
+#    with query_budget(3):
+#        client.get('/api/profile/')
+@contextmanager
+def query_budget(budget, using='default', label='block'):
+    counter = QueryCounter()
+    with connections[using].execute_wrapper(counter):
+        yield counter
+    counter.check(budget, label)
+
+#development middleware, counts the queries of every request into the X-Query-Count header and fails the request
+#when the view declares a query_budget and goes over it
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connections['default'].execute_wrapper(counter):
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(len(counter))
+        counter.check(getattr(request, 'query_budget', None), f"{request.method} {request.path}")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        request.query_budget = getattr(view_class, 'query_budget', None)
@@ -0,0 +1,40 @@
+from decimal import Decimal
+from django.db import connection
+from .models import Account,Transaction
+
+#one grouped aggregate over the successful transactions of a primary key range of accounts, joined to the
+#accounts so the balances and the flows come from the same statement snapshot. only the mismatches are returned.
+#each side of the union is a range scan of the sender / receiver index
+RECONCILE_SQL = """
+SELECT a.id, a.balance, COALESCE(f.net, 0)
+FROM {account} a
+LEFT JOIN (
+    SELECT account_id, SUM(amount) AS net FROM (
+        SELECT receiver_id AS account_id, amount FROM {transaction}
+        WHERE status = %s AND receiver_id BETWEEN %s AND %s
+        UNION ALL
+        SELECT sender_id AS account_id, -amount FROM {transaction}
+        WHERE status = %s AND sender_id BETWEEN %s AND %s
+    ) flows
+    GROUP BY account_id
+) f ON f.account_id = a.id
+WHERE a.id BETWEEN %s AND %s AND a.balance <> COALESCE(f.net, 0)
+ORDER BY a.id
+"""
+
+#splits first_pk..last_pk into inclusive ranges of size primary keys
+def pk_ranges(first_pk, last_pk, size):
+    return [(start, min(start + size - 1, last_pk)) for start in range(first_pk, last_pk + 1, size)]
+
+CENT = Decimal('0.01')
+
+#accounts of the range whose balance differs from their net successful flows, as (pk, balance, net) tuples.
+#runs inside the reconcile_balances worker processes, sqlite hands the sums back as floats or ints
+def reconcile_range(first_pk, last_pk):
+    sql = RECONCILE_SQL.format(
+        account=connection.ops.quote_name(Account._meta.db_table),
+        transaction=connection.ops.quote_name(Transaction._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ['success', first_pk, last_pk, 'success', first_pk, last_pk, first_pk, last_pk])
+        return [(pk, Decimal(str(balance)).quantize(CENT), Decimal(str(net)).quantize(CENT)) for pk, balance, net in cursor.fetchall()]
@@ -0,0 +1,51 @@
+import re
+import unicodedata
+from django.conf import settings
+from phonenumber_field.phonenumber import to_python
+from .models import Profile,ProfileSearch
+
+NON_DIGITS = re.compile(r'\D+')
+
+#casefolded, NFKC normalized text with the whitespace collapsed, applied to the stored columns and the queries alike
+def normalize(value):
+    return ' '.join(unicodedata.normalize('NFKC', str(value or '')).casefold().split())
+
+def phone_digits(value):
+    return NON_DIGITS.sub('', str(value or ''))
+
+#the query as a phone number when it is a complete valid one, for the exact match on Profile.phonenumber
+def full_phonenumber(value):
+    number = to_python(value, region=settings.PHONENUMBER_DEFAULT_REGION)
+    if number is None or not number.is_valid():
+        return None
+    return number
+
+#upserts the search rows of the given profiles in chunks, one query for the profiles and one for the rows per chunk
+def index_profiles(profiles, chunk_size=1000):
+    rows = profiles.order_by('pk').values_list('pk','first_name','last_name','email','phonenumber','account__account_number')
+    last_pk = 0
+    indexed = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return indexed
+        ProfileSearch.objects.bulk_create(
+            [
+                ProfileSearch(
+                    profile_id=pk,
+                    name=normalize(f'{first_name} {last_name}'),
+                    email=normalize(email),
+                    phone=phone_digits(phonenumber),
+                    account_number=normalize(account_number),
+                )
+                for pk, first_name, last_name, email, phonenumber, account_number in chunk
+            ],
+            update_conflicts=True,
+            unique_fields=['profile'],
+            update_fields=['name','email','phone','account_number'],
+        )
+        last_pk = chunk[-1][0]
+        indexed += len(chunk)
+
+def index_profile(profile_id):
+    index_profiles(Profile.objects.filter(pk=profile_id))
@@ -1,14 +1,17 @@
-from .models import Profile,Account,Transaction
-from rest_framework import serializers,status
+from .models import Profile,Account,Transaction,SettlementBatch,ProfileImport
+from rest_framework import serializers
 from rest_framework.exceptions import ErrorDetail
 from rest_framework.validators import ValidationError
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer,TokenRefreshSerializer
 from phonenumber_field.serializerfields import PhoneNumberField
-from rest_framework.response import Response
-from django.utils import timezone
 from .validators import validate_password1,validate_name,validate_amount
-from datetime import timedelta
-from django.contrib.auth.hashers import check_password
+from django.contrib.auth.hashers import make_password
+from .otp import get_otp_store,OTPError
+from .tokens import FilteredRefreshToken
+from .authentication import profile_cache
+from django.conf import settings
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 #For creating a user registration form
 class RegisterProfileSerializer(serializers.ModelSerializer):
     password1 = serializers.CharField(write_only=True, validators=[validate_password1])
@@ -57,6 +60,10 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['is_superuser'] = user.is_superuser
         return token
     
+#refresh checks the blacklist through the bloom filter of FilteredRefreshToken
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
 #serializer for changing the password
 class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(write_only=True)
@@ -71,11 +78,14 @@ class ChangePasswordSerializer(serializers.Serializer):
         if attrs['new_password'] != attrs['confirm_new_password']:
             raise ValidationError("Password doesnot match")
         return attrs
+    #request.user may be a cached copy of the profile, saving all of its fields could write back stale values.
+    #only the password column is written, and the update sends no post_save so the cached copy is dropped here
     def save(self, **kwargs):
         user = self.context['request'].user
         new_password = self.validated_data['new_password']
         user.set_password(new_password)
-        user.save()
+        Profile.objects.filter(pk=user.pk).update(password=user.password)
+        profile_cache.invalidate(user.pk)
         return user
     
 #class for sending otp to the email
@@ -101,35 +111,29 @@ class ForgetPasswordSerializer(serializers.Serializer):
         email = attrs.get('email')
         otp = attrs.get('otp')
         try:
-            user = Profile.objects.get(email=email)
+            user = Profile.objects.only('id').get(email=email)
         except Profile.DoesNotExist:
             raise ValidationError({
                 "Profile":ErrorDetail("Email doesnt exist in the database",code="Invalid_email")
             })
-        if not user.otp:
-            raise ValidationError({
-                "otp": ErrorDetail("No OTP was requested or it has expired.", code="no_otp")
-    })
-        if not check_password(otp, user.otp):
-            raise ValidationError({
-                "otp":ErrorDetail("Invalid Otp",code="invalid_otp")
-            })
-        now = timezone.now()
-        expiry_time = user.otp_created_time + timedelta(minutes=1)
-        if now > expiry_time:
-            raise ValidationError({
-            "otp":ErrorDetail("Otp expired please request for another otp",code="otp_expired")
-        })
+        #a mistyped confirmation must not use up the otp
         if attrs['new_password'] != attrs['confirm_new_password']:
            raise ValidationError("Password doesnot match")
+        try:
+            get_otp_store().verify(user, otp)
+        except OTPError as e:
+            raise ValidationError({
+                "otp":ErrorDetail(e.message,code=e.code)
+            })
+        attrs['user'] = user
         return attrs
     
     def save(self, **kwargs):
-        email = self.validated_data['email']
-        user = Profile.objects.get(email=email)
+        user = self.validated_data['user']
         new_password = self.validated_data.pop('new_password')
-        user.set_password(new_password)
-        user.save()
+        Profile.objects.filter(pk=user.pk).update(password=make_password(new_password))
+        #update() sends no post_save, the cached profile would keep the old password hash
+        profile_cache.invalidate(user.pk)
         return user
 
 #used for getting the full details of a particular user that is profile,account and the transaction for the view UserProfileView
@@ -137,12 +141,27 @@ class TransactionModelSerializer(serializers.ModelSerializer):
         class Meta:
             model = Transaction
             fields = ['id','transaction_type','sender','receiver','amount','status','description','timestamp']
+#only the latest PROFILE_RECENT_TRANSACTIONS of each side are nested, the full history is paginated by TransactionHistoryView.
+#the async views load them beforehand and pass them in the 'recent_transactions' context as {'sender':[...],'receiver':[...]}
 class AccountModelSerializer(serializers.ModelSerializer):
-        sender = TransactionModelSerializer(source='sender_transaction',many=True, read_only=True)
-        receiver = TransactionModelSerializer(source='receiver_transaction',many=True, read_only=True)
+        sender = serializers.SerializerMethodField()
+        receiver = serializers.SerializerMethodField()
         class Meta:
             model = Account
             fields = ['account_number','balance','created_at','sender','receiver']
+        @extend_schema_field(TransactionModelSerializer(many=True))
+        def get_sender(self, obj):
+            return self.recent_transactions(obj, 'sender')
+        @extend_schema_field(TransactionModelSerializer(many=True))
+        def get_receiver(self, obj):
+            return self.recent_transactions(obj, 'receiver')
+        def recent_transactions(self, obj, side):
+            loaded = self.context.get('recent_transactions')
+            if loaded is not None:
+                latest = loaded[side]
+            else:
+                latest = getattr(obj, f'{side}_transaction').order_by('-timestamp','-id')[:settings.PROFILE_RECENT_TRANSACTIONS]
+            return TransactionModelSerializer(latest, many=True).data
 class UserProfileSerializer(serializers.ModelSerializer):
     account = AccountModelSerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
@@ -221,7 +240,7 @@ class TransactionListForAdminSerializer(serializers.ModelSerializer):
 
 #for the transaction view for accpeting the details for the transaction and also the ouput as timestamp and the status of the payment
 class TransactionInputSerializer(serializers.Serializer):
-    account_number = serializers.CharField(max_length=6, required=True)
+    account_number = serializers.CharField(max_length=20, required=True)
     transaction_type = serializers.ChoiceField(required=True, choices=Transaction.TRANSACTION_TYPE)
     amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=True, validators=[validate_amount])
     description = serializers.CharField(default="",allow_blank=True)
@@ -239,13 +258,12 @@ class TransactionInputSerializer(serializers.Serializer):
                     "reciever_account_number":ErrorDetail("Reciever Account number doesnt exist.",code="invalid_account_number")
                 })
         try:
-            user = Profile.objects.get(email=request.user.email)
-            acc = user.account.account_number
-        except Profile.DoesNotExist:
-            return Response({'detail':'profile not found'},status=status.HTTP_400_BAD_REQUEST)
+            user_account = Account.objects.get(user_id=request.user.pk)
         except Account.DoesNotExist:
-            return Response({'detail':'account not found'},status=status.HTTP_400_BAD_REQUEST)
-        if acc == receiver:
+            raise ValidationError({
+                "account":ErrorDetail("Account not found",code="account_not_found")
+            })
+        if receiver is not None and receiver.pk == user_account.pk:
             raise ValidationError({
                "reciever_account_number":ErrorDetail("You cant self transfer",code="transfer mismatch")
             })
@@ -253,9 +271,66 @@ class TransactionInputSerializer(serializers.Serializer):
             raise ValidationError({
                 "reciever_account_number":ErrorDetail("Reciever account type when the transaction type is transfer",code='invalid_reciever_account')
             })
+        attrs['user_account'] = user_account
+        attrs['receiver'] = receiver
         return attrs
 class TransactionOutputSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['status','timestamp']
 
+#answer of a queued transaction and of its status endpoint, the timestamp becomes the settlement time once settled
+class TransactionStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Transaction
+        fields = ['id','status','transaction_type','amount','timestamp']
+
+
+#query of AccountStatementView, both days are inclusive and default to the current month so far
+class StatementQuerySerializer(serializers.Serializer):
+    from_date = serializers.DateField(required=False)
+    to_date = serializers.DateField(required=False)
+    def validate(self, attrs):
+        today = timezone.localdate()
+        to_date = attrs.get('to_date') or today
+        from_date = attrs.get('from_date') or to_date.replace(day=1)
+        if from_date > to_date:
+            raise ValidationError({"from_date":ErrorDetail("from_date is after to_date",code='invalid_range')})
+        if (to_date - from_date).days >= settings.STATEMENT_MAX_DAYS:
+            raise ValidationError({"to_date":ErrorDetail(f"A statement covers at most {settings.STATEMENT_MAX_DAYS} days",code='range_too_long')})
+        attrs['from_date'] = from_date
+        attrs['to_date'] = to_date
+        return attrs
+class StatementEntrySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    timestamp = serializers.DateTimeField()
+    transaction_type = serializers.CharField()
+    description = serializers.CharField(allow_null=True)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+class StatementSerializer(serializers.Serializer):
+    account_number = serializers.CharField()
+    first_day = serializers.DateField()
+    last_day = serializers.DateField()
+    opening_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    closing_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    transactions = StatementEntrySerializer(many=True)
+
+
+#progress of a staff settlement batch
+class SettlementBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SettlementBatch
+        fields = ['id','created_by','reference','status','processed','items','settled','failed','rejected','error','created_at','finished_at']
+
+#a settlement batch with the rejected items and the status of every settled item
+class SettlementBatchDetailedSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SettlementBatch
+        fields = SettlementBatchSerializer.Meta.fields + ['errors','results']
+
+#progress and rejected rows of a profile import
+class ProfileImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProfileImport
+        fields = ['id','created_by','reference','status','processed','rows','created','failed','errors','error','created_at','finished_at']
@@ -1,45 +1,142 @@
-from rest_framework.response import Response
-from .models import Transaction,Account
 from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Transaction,Account,LedgerEntry
+from .utils import update_bank_totals
+from .ledger import record_transaction,ledger_entries
 
-#full transaction logic of the withdraw,deposit and transfer of the amount
-def handle_transaction(*,user_account, receiver_account, tran_type, amt, desc=""):
+class InsufficientBalance(ValueError):
+    pass
+
+class AccountNotFound(ValueError):
+    pass
+
+#net balance change of every account touched by the transaction, keyed by account pk
+def _balance_changes(txn):
+    changes = {}
+    if txn.sender_id:
+        changes[txn.sender_id] = changes.get(txn.sender_id, 0) - txn.amount
+    if txn.receiver_id:
+        changes[txn.receiver_id] = changes.get(txn.receiver_id, 0) + txn.amount
+    return changes
+
+#applies the balance changes as conditional F() updates in primary key order so that two
+#opposite transfers always take the row locks in the same order and never deadlock.
+#a debit only matches the row when the funds allow, so no balance is read into python.
+#a row that matched nothing was short of funds only when it was debited and still exists
+def _apply_balance_changes(changes):
+    now = timezone.now()
+    for pk in sorted(changes):
+        delta = changes[pk]
+        if not delta:
+            continue
+        queryset = Account.objects.filter(pk=pk)
+        if delta < 0:
+            queryset = queryset.filter(balance__gte=-delta)
+        if not queryset.update(balance=F('balance') + delta, updated_at=now):
+            if delta < 0 and Account.objects.filter(pk=pk).exists():
+                raise InsufficientBalance("Insufficient Balance")
+            raise AccountNotFound("Account doesnt exist")
+
+#settles an unsaved or pending transaction, the balances, the success row and its ledger entries are committed
+#together and a failed row is still recorded when the sender does not have the funds. AccountNotFound leaves
+#nothing behind
+def settle_transaction(txn):
+    try:
+        with db_transaction.atomic():
+            changes = _balance_changes(txn)
+            _apply_balance_changes(changes)
+            update_bank_totals(balance=sum(changes.values()))
+            txn.status = 'success'
+            txn.save()
+            record_transaction(txn)
+    except InsufficientBalance:
+        txn.status = 'failed'
+        txn.save()
+        raise
+    return txn
+
+#settles many unsaved or pending transactions in one database transaction. every account they touch is locked once
+#in primary key order, the order settle_transaction takes its locks in, so they never deadlock with each other.
+#the balances move in python on the locked rows and are written back with one bulk update. a transaction the
+#sender can not fund, or whose account was deleted meanwhile, is failed. a pending transaction takes the time it
+#settled as its timestamp, so statements and balance snapshots see it on the day the balances moved
+def settle_transactions(transactions):
+    account_ids = {pk for txn in transactions for pk in (txn.sender_id, txn.receiver_id) if pk}
     with db_transaction.atomic():
-            txn = Transaction(
-                 transaction_type=tran_type,
-                 amount=amt,
-                 description=desc
-            )
-            if tran_type == 'withdraw':
-                 if user_account.balance < amt:
-                      txn.sender = user_account
-                      txn.status = 'failed'
-                      txn.save()
-                      raise ValueError("Insufficient Balance")
-                 user_account.balance-=amt
-                 txn.sender = user_account
-                 txn.status = 'success'
-                 user_account.save()
-            elif tran_type == 'deposit':
-                 user_account.balance+=amt
-                 txn.receiver = user_account
-                 txn.status = 'success'
-                 user_account.save()
-            elif tran_type == 'transfer':
-                 if not receiver_account:
-                      raise ValueError("Reciever account needed for amount transfer")
-                 txn.sender = user_account
-                 txn.receiver = receiver_account
-                 if user_account.balance < amt:
-                      txn.status = 'failed'
-                      txn.save()
-                      raise ValueError("Insufficient Balance")
-                 user_account.balance-=amt
-                 receiver_account.balance+=amt
-                 txn.status = 'success'
-                 user_account.save()
-                 receiver_account.save()
+        accounts = {
+            account.pk:account
+            for account in Account.objects.select_for_update().filter(pk__in=account_ids).only('id','balance').order_by('pk')
+        }
+        now = timezone.now()
+        touched = {}
+        cash = 0
+        for txn in transactions:
+            sender = accounts.get(txn.sender_id)
+            receiver = accounts.get(txn.receiver_id)
+            needs_sender = txn.transaction_type in ('withdraw','transfer')
+            needs_receiver = txn.transaction_type in ('deposit','transfer')
+            if (needs_sender and sender is None) or (needs_receiver and receiver is None):
+                txn.status = 'failed'
+            elif sender is not None and sender.balance < txn.amount:
+                txn.status = 'failed'
             else:
-                raise ValueError("Invalid transaction type")
-            txn.save()
-            return txn
\ No newline at end of file
+                if sender is not None:
+                    sender.balance -= txn.amount
+                    touched[sender.pk] = sender
+                    cash -= txn.amount
+                if receiver is not None:
+                    receiver.balance += txn.amount
+                    touched[receiver.pk] = receiver
+                    cash += txn.amount
+                txn.status = 'success'
+            if txn.pk is not None:
+                txn.timestamp = now
+        Transaction.objects.bulk_create([txn for txn in transactions if txn.pk is None])
+        Transaction.objects.bulk_update([txn for txn in transactions if txn.pk is not None], ['status','timestamp'])
+        LedgerEntry.objects.bulk_create([entry for txn in transactions if txn.status == 'success' for entry in ledger_entries(txn)])
+        for account in touched.values():
+            account.updated_at = now
+        Account.objects.bulk_update([touched[pk] for pk in sorted(touched)], ['balance','updated_at'])
+        update_bank_totals(balance=cash)
+    return transactions
+
+#claims up to batch_size pending transactions, oldest first, and settles them together. rows claimed by another
+#worker are skipped rather than waited on, so the workers split the queue between them
+def settle_pending(batch_size):
+    with db_transaction.atomic():
+        batch = list(Transaction.objects.select_for_update(skip_locked=True).filter(status='pending').order_by('id')[:batch_size])
+        if batch:
+            settle_transactions(batch)
+    return batch
+
+#the unsaved transaction of a withdraw, deposit or transfer
+def build_transaction(*,user_account, receiver_account, tran_type, amt, desc=""):
+    txn = Transaction(
+        transaction_type=tran_type,
+        amount=amt,
+        description=desc
+    )
+    if tran_type == 'withdraw':
+        txn.sender = user_account
+    elif tran_type == 'deposit':
+        txn.receiver = user_account
+    elif tran_type == 'transfer':
+        if not receiver_account:
+            raise ValueError("Reciever account needed for amount transfer")
+        txn.sender = user_account
+        txn.receiver = receiver_account
+    else:
+        raise ValueError("Invalid transaction type")
+    return txn
+
+#full transaction logic of the withdraw,deposit and transfer of the amount
+def handle_transaction(**kwargs):
+    return settle_transaction(build_transaction(**kwargs))
+
+#records the transaction as pending for the settle_pending_transactions workers, nothing is locked in the request
+def queue_transaction(**kwargs):
+    txn = build_transaction(**kwargs)
+    txn.status = 'pending'
+    txn.save()
+    return txn
@@ -1,13 +1,45 @@
 from .models import Profile,Account
-from .utils import generate_account_number
-from django.db.models.signals import post_save
+from .utils import account_number_allocator,update_bank_totals
+from .authentication import profile_cache,forget_profile_state
+from .search import index_profile
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_save,post_delete
 from django.dispatch import receiver
 
 #used to create the account for the Profile when the profile_type is user
 @receiver(post_save,sender=Profile)
 def create_account_for_new_user(sender, instance, created, **kwargs):
     if created and not hasattr(instance, 'account') and instance.profile_type == 'user':
-        Account.objects.create(
-            user = instance,
-            account_number = generate_account_number()
-        )
\ No newline at end of file
+        with db_transaction.atomic():
+            Account.objects.create(
+                user = instance,
+                account_number = account_number_allocator.allocate()
+            )
+            update_bank_totals(users=1)
+
+#keeps the bank totals in step when a user or an account is removed
+@receiver(post_delete,sender=Profile)
+def remove_user_from_bank_totals(sender, instance, **kwargs):
+    if instance.profile_type == 'user':
+        update_bank_totals(users=-1)
+
+@receiver(post_delete,sender=Account)
+def remove_balance_from_bank_totals(sender, instance, **kwargs):
+    update_bank_totals(balance=-instance.balance)
+
+
+#drops the copy ClaimsJWTAuthentication cached in this process and the shared active state whenever the profile changes
+@receiver(post_save,sender=Profile)
+@receiver(post_delete,sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    profile_cache.invalidate(instance.pk)
+    forget_profile_state(instance.pk)
+
+#keeps the admin search row of the profile current, the account number comes in when the account is saved
+@receiver(post_save,sender=Profile)
+def index_profile_for_search(sender, instance, **kwargs):
+    index_profile(instance.pk)
+
+@receiver(post_save,sender=Account)
+def index_account_for_search(sender, instance, **kwargs):
+    index_profile(instance.user_id)
@@ -0,0 +1,117 @@
+import csv
+import os
+from datetime import datetime,time,timedelta
+from decimal import Decimal
+from django.db.models import Case,When,F,Q,Sum,Value,Subquery,OuterRef,DecimalField,Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Account,Transaction,BalanceSnapshot
+
+AMOUNT = DecimalField(max_digits=12, decimal_places=2)
+STATEMENT_COLUMNS = ['id','timestamp','transaction_type','description','amount','balance']
+
+#start and end of a day in TIME_ZONE, the end being the start of the next day
+def day_bounds(day):
+    tz = timezone.get_default_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+
+def _total(field, start, end):
+    transactions = Transaction.objects.filter(status='success', timestamp__gte=start, **{field:OuterRef('pk')})
+    if end is not None:
+        transactions = transactions.filter(timestamp__lt=end)
+    total = transactions.order_by().values(field).annotate(total=Sum('amount')).values('total')
+    return Coalesce(Subquery(total), Value(Decimal(0)), output_field=AMOUNT)
+
+#net change of the balance of the outer Account between start and end (or now), to annotate Account querysets.
+#the balance and the net change come from the same statement so they are consistent with each other
+def net_change(start, end=None):
+    return _total('receiver', start, end) - _total('sender', start, end)
+
+#writes the closing balance of the day for every account that existed then. each closing balance is the live
+#balance minus what moved after the day closed, so a run only reads the transactions since that day and a
+#missed day or an edited balance never carries over into the next snapshots. reruns overwrite the day
+def take_snapshots(day, chunk_size=2000):
+    end = day_bounds(day)[1]
+    accounts = Account.objects.filter(created_at__lt=end).order_by('pk').annotate(closing=F('balance') - net_change(end))
+    last_pk = 0
+    written = 0
+    while True:
+        rows = list(accounts.filter(pk__gt=last_pk).values_list('pk','closing')[:chunk_size])
+        if not rows:
+            return written
+        BalanceSnapshot.objects.bulk_create(
+            [BalanceSnapshot(account_id=pk, date=day, balance=closing) for pk, closing in rows],
+            update_conflicts=True,
+            unique_fields=['account','date'],
+            update_fields=['balance','updated_at'],
+        )
+        last_pk = rows[-1][0]
+        written += len(rows)
+
+#balance at the start of the day, from the nearest earlier snapshot plus the transactions after it. without a
+#snapshot the transactions since the day started are taken back off the live balance
+def opening_balance(account_id, day):
+    snapshot = BalanceSnapshot.objects.filter(account_id=account_id, date__lt=day).order_by('-date').values_list('date','balance').first()
+    start = day_bounds(day)[0]
+    account = Account.objects.filter(pk=account_id)
+    if snapshot is None:
+        return account.annotate(opening=F('balance') - net_change(start)).values_list('opening', flat=True).get()
+    snapshot_date, balance = snapshot
+    if snapshot_date == day - timedelta(days=1):
+        return balance
+    return balance + account.annotate(net=net_change(day_bounds(snapshot_date)[1], start)).values_list('net', flat=True).get()
+
+#successful transactions of the account between the two days inclusive with the running balance after each one.
+#the running total is a window sum over the range only, so the range is never paginated or cut
+def statement(account_id, first_day, last_day):
+    start = day_bounds(first_day)[0]
+    end = day_bounds(last_day)[1]
+    opening = opening_balance(account_id, first_day)
+    signed = Case(When(receiver_id=account_id, then=F('amount')), default=-F('amount'), output_field=AMOUNT)
+    rows = (
+        Transaction.objects
+        .filter(Q(sender_id=account_id)|Q(receiver_id=account_id), status='success', timestamp__gte=start, timestamp__lt=end)
+        .annotate(
+            signed_amount=signed,
+            running=Window(Sum(signed), order_by=[F('timestamp').asc(), F('id').asc()], frame=RowRange(start=None, end=0)),
+        )
+        .order_by('timestamp','id')
+        .values_list('id','timestamp','transaction_type','description','signed_amount','running')
+    )
+    entries = [
+        {'id':pk, 'timestamp':timestamp, 'transaction_type':transaction_type, 'description':description,
+         'amount':amount, 'balance':opening + running}
+        for pk, timestamp, transaction_type, description, amount, running in rows
+    ]
+    return {
+        'first_day':first_day,
+        'last_day':last_day,
+        'opening_balance':opening,
+        'closing_balance':entries[-1]['balance'] if entries else opening,
+        'transactions':entries,
+    }
+
+def month_bounds(month):
+    first_day = month.replace(day=1)
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    return first_day, next_month - timedelta(days=1)
+
+#writes the statement of every given account for the month as <output_dir>/<account number>-<YYYY-MM>.csv.
+#runs inside the generate_statements worker processes, each call takes one chunk of account ids
+def write_monthly_statements(account_ids, month, output_dir):
+    first_day, last_day = month_bounds(month)
+    accounts = Account.objects.filter(pk__in=account_ids).order_by('pk').values_list('pk','account_number')
+    for account_id, account_number in accounts:
+        data = statement(account_id, first_day, last_day)
+        path = os.path.join(output_dir, f"{account_number or account_id}-{first_day:%Y-%m}.csv")
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['opening_balance', data['opening_balance']])
+            writer.writerow(STATEMENT_COLUMNS)
+            for entry in data['transactions']:
+                writer.writerow([entry['id'], entry['timestamp'].isoformat(), entry['transaction_type'],
+                                 entry['description'] or '', entry['amount'], entry['balance']])
+            writer.writerow(['closing_balance', data['closing_balance']])
+    return len(account_ids)
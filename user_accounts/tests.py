@@ -1,3 +1,841 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command,CommandError
+from django.test import TestCase,TransactionTestCase,override_settings,skipUnlessDBFeature
+from django.db import connection,OperationalError
+from django.db.models import Q,Sum
+from django.urls import reverse,path,include
+from django.utils import timezone
+from rest_framework.test import APIClient,APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken,OutstandingToken
+from .batches import queue_batch
+from .models import Profile,Account,Transaction,SettlementBatch,OutboundEmail,ProfileImport,LedgerEntry,BalanceSnapshot,BankTotals,AccountNumberSequence
+from .outbox import enqueue_email,claim_batch,send_batch,prune_outbox
+from .tokens import BlacklistFilter
+from .utils import is_full_account_number,get_bank_totals,luhn_check_digit,AccountNumberAllocator,ACCOUNT_NUMBER_SEQUENCE
+from .search import index_profile
+from .authentication import profile_cache
+from .otp import get_otp_store
+from .metrics import registry,flush_metrics,encode_snapshot
+from .querybudget import query_budget
+from .benchmarks.budgets import measure_endpoints
+from .views import TransactionView
+from .dbmetrics import connection_metrics
+from .async_views import AsyncUserProfileView,AsyncAccountProfileDetailedView,AsyncAdminDashboardView
+from .reconcile import pk_ranges,reconcile_range
+from .statements import take_snapshots,opening_balance,statement,day_bounds
+from .services import settle_pending,handle_transaction,queue_transaction,InsufficientBalance,AccountNotFound
+from .throttles import LoginThrottle,OTPThrottle,get_counter_backend
+from .serializers import CustomTokenObtainPairSerializer,UserForAdminSerializer,TransactionListForAdminSerializer
 
 # Create your tests here.
+PASSWORD = 'Secret123'
+
+def make_profile(n, profile_type='user', **extra):
+    return Profile.objects.create_user(
+        email=f'{profile_type}{n}@village.test',
+        password=PASSWORD,
+        first_name='Test',
+        last_name='User',
+        age=30,
+        phonenumber=f'+91900000{n:04d}',
+        profile_type=profile_type,
+        employee_id=f'EMP{n}' if profile_type != 'user' else None,
+        is_staff=profile_type != 'user',
+        **extra,
+    )
+
+def fund(account, amount):
+    Account.objects.filter(pk=account.pk).update(balance=Decimal(amount))
+    account.refresh_from_db()
+    return account
+
+def client_for(profile):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {CustomTokenObtainPairSerializer.get_token(profile).access_token}')
+    return client
+
+class BankTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+
+#the debit only matches while the funds allow, so two transfers that together overdraw the account settle one
+#and fail the other even when both were built from the same loaded balance
+class ConditionalDebitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.sender, self.receiver = make_profile(1), make_profile(2)
+        fund(self.sender.account, '100.00')
+
+    def transfer(self, sender_account, amount='70.00'):
+        try:
+            return handle_transaction(user_account=sender_account, receiver_account=self.receiver.account, tran_type='transfer', amt=Decimal(amount)).status
+        except InsufficientBalance:
+            return 'failed'
+
+    def assertOneSettled(self, statuses):
+        self.assertEqual(sorted(statuses), ['failed','success'])
+        self.assertEqual(Account.objects.get(pk=self.sender.account.pk).balance, Decimal('30.00'))
+        self.assertEqual(Account.objects.get(pk=self.receiver.account.pk).balance, Decimal('70.00'))
+        self.assertEqual(sorted(Transaction.objects.values_list('status', flat=True)), ['failed','success'])
+
+    def test_stale_balance_does_not_overdraw(self):
+        stale = Account.objects.get(pk=self.sender.account.pk)
+        self.assertOneSettled([self.transfer(self.sender.account), self.transfer(stale)])
+
+    #sqlite locks the whole table for the second writer instead of queueing it on the row
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_transfers_do_not_overdraw(self):
+        statuses = []
+        barrier = threading.Barrier(2)
+        def run():
+            barrier.wait()
+            try:
+                statuses.append(self.transfer(Account.objects.get(pk=self.sender.account.pk)))
+            finally:
+                connection.close()
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertOneSettled(statuses)
+
+    def test_credit_to_a_deleted_account_is_not_insufficient_balance(self):
+        receiver = self.receiver.account
+        Account.objects.filter(pk=receiver.pk).delete()
+        with self.assertRaises(AccountNotFound):
+            handle_transaction(user_account=self.sender.account, receiver_account=receiver, tran_type='transfer', amt=Decimal('10.00'))
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(Account.objects.get(pk=self.sender.account.pk).balance, Decimal('100.00'))
+
+#a retried transaction with the same Idempotency-Key settles once and gets the first response back
+class IdempotencyTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sender = make_profile(1)
+        self.receiver = make_profile(2)
+        fund(self.sender.account, '100.00')
+        self.client = client_for(self.sender)
+        self.body = {
+            'account_number':self.sender.account.account_number,
+            'transaction_type':'transfer',
+            'amount':'10.00',
+            'receiver_account_number':self.receiver.account.account_number,
+        }
+
+    def post(self, body, key='retry-1'):
+        return self.client.post(reverse('transaction'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.body)
+        second = self.post(self.body)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.sender.account.refresh_from_db()
+        self.assertEqual(self.sender.account.balance, Decimal('90.00'))
+
+    def test_reused_key_with_another_body_is_refused(self):
+        self.post(self.body)
+        response = self.post({**self.body, 'amount':'20.00'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_invalid_request_does_not_burn_the_key(self):
+        response = self.post({**self.body, 'receiver_account_number':'0000000'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post(self.body).status_code, 201)
+
+    def test_database_error_is_not_stored(self):
+        def fail_insert(execute, sql, params, many, context):
+            if sql.startswith('INSERT INTO "user_accounts_transaction"'):
+                raise OperationalError("server closed the connection unexpectedly")
+            return execute(sql, params, many, context)
+        self.client.raise_request_exception = False
+        with connection.execute_wrapper(fail_insert):
+            self.assertEqual(self.post(self.body).status_code, 500)
+        self.assertEqual(self.post(self.body).status_code, 201)
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.sender.account.refresh_from_db()
+        self.assertEqual(self.sender.account.balance, Decimal('90.00'))
+
+    def test_insufficient_balance_is_replayed(self):
+        body = {**self.body, 'amount':'500.00'}
+        self.assertEqual(self.post(body).status_code, 400)
+        fund(self.sender.account, '1000.00')
+        self.assertEqual(self.post(body).json(), {'error':'Insufficient Balance'})
+        self.assertEqual(list(Transaction.objects.values_list('status', flat=True)), ['failed'])
+
+#the history merges the sent and received branches page by page into the order of the whole OR query
+class TransactionHistoryTests(BankTestCase):
+    def test_pages_follow_the_merged_order(self):
+        users = [make_profile(n) for n in range(3)]
+        fund(users[0].account, '100.00')
+        fund(users[1].account, '100.00')
+        for n in range(6):
+            handle_transaction(user_account=users[n % 2].account, receiver_account=users[1 - n % 2].account, tran_type='transfer', amt=Decimal('1.00'))
+            handle_transaction(user_account=users[2].account, receiver_account=None, tran_type='deposit', amt=Decimal('1.00'))
+        handle_transaction(user_account=users[0].account, receiver_account=None, tran_type='deposit', amt=Decimal('1.00'))
+        client = client_for(users[0])
+        ids = []
+        response = client.get(reverse('transaction_history'), {'page_size':4})
+        while True:
+            ids += [item['id'] for item in response.json()['results']]
+            if not response.json()['next']:
+                break
+            response = client.get(response.json()['next'])
+        account = users[0].account
+        expected = Transaction.objects.filter(Q(sender=account)|Q(receiver=account)).order_by('-timestamp','-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+        previous = client.get(response.json()['previous']).json()['results']
+        self.assertEqual([item['id'] for item in previous], ids[-len(response.json()['results']) - 4:-len(response.json()['results'])])
+
+#the admin cursor continues from (ordering field, id), rows sharing a first_name or age are neither skipped nor repeated
+class AdminCursorPaginationTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [make_profile(n) for n in range(7)]
+        self.staff = make_profile(100, 'staff')
+        self.client = client_for(self.staff)
+
+    def walk(self, url, params, link):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.json()['results']]
+            if not response.json()[link]:
+                return ids, response
+            response = self.client.get(response.json()[link])
+
+    def test_pages_of_a_non_unique_ordering_cover_every_row_once(self):
+        url = reverse('admin_dashboard_profile')
+        expected = [user.pk for user in self.users]
+        for ordering in ('first_name','-age'):
+            ids, last = self.walk(url, {'ordering':ordering, 'page_size':2}, 'next')
+            self.assertEqual(sorted(ids), expected)
+            if ordering == 'first_name':
+                self.assertEqual(ids, expected)
+            back, _ = self.walk(last.json()['previous'], {}, 'previous')
+            self.assertEqual(sorted(back), sorted(ids[:-len(last.json()['results'])]))
+
+#the sharded totals follow every change of the balances and the users, rebuild_bank_totals repairs a drift
+class BankTotalsTests(BankTestCase):
+    def assertTotalsMatch(self):
+        expected = {
+            'balance':Account.objects.aggregate(total=Sum('balance'))['total'] or 0,
+            'users':Profile.objects.filter(profile_type='user').count(),
+        }
+        self.assertEqual(get_bank_totals(), expected)
+
+    def test_totals_follow_transactions_and_deletes(self):
+        users = [make_profile(n) for n in range(4)]
+        make_profile(100, 'staff')
+        self.assertTotalsMatch()
+        for user in users:
+            handle_transaction(user_account=user.account, receiver_account=None, tran_type='deposit', amt=Decimal('40.00'))
+        handle_transaction(user_account=users[0].account, receiver_account=None, tran_type='withdraw', amt=Decimal('15.00'))
+        handle_transaction(user_account=users[1].account, receiver_account=users[2].account, tran_type='transfer', amt=Decimal('25.00'))
+        with self.assertRaises(InsufficientBalance):
+            handle_transaction(user_account=users[3].account, receiver_account=None, tran_type='withdraw', amt=Decimal('500.00'))
+        queue_transaction(user_account=users[3].account, receiver_account=None, tran_type='withdraw', amt=Decimal('10.00'))
+        queue_transaction(user_account=users[3].account, receiver_account=None, tran_type='withdraw', amt=Decimal('500.00'))
+        settle_pending(10)
+        self.assertTotalsMatch()
+        self.assertEqual(get_bank_totals()['balance'], Decimal('135.00'))
+        users[2].delete()
+        Account.objects.get(pk=users[0].account.pk).delete()
+        self.assertTotalsMatch()
+        self.assertEqual(get_bank_totals(), {'balance':Decimal('45.00'), 'users':3})
+
+    def test_rebuild_repairs_a_drift(self):
+        user = make_profile(1)
+        handle_transaction(user_account=user.account, receiver_account=None, tran_type='deposit', amt=Decimal('10.00'))
+        call_command('rebuild_bank_totals', '--check', stdout=io.StringIO())
+        BankTotals.objects.update(balance=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_bank_totals', '--check', stdout=io.StringIO())
+        call_command('rebuild_bank_totals', stdout=io.StringIO())
+        self.assertTotalsMatch()
+        call_command('rebuild_bank_totals', '--check', stdout=io.StringIO())
+
+#account numbers come from blocks reserved on the AccountNumberSequence row, no two allocators share a block
+class AccountNumberAllocatorTests(BankTestCase):
+    def next_value(self):
+        return AccountNumberSequence.objects.get(name=ACCOUNT_NUMBER_SEQUENCE).next_value
+
+    def test_luhn_check_digit(self):
+        self.assertEqual(luhn_check_digit('7992739871'), '3')
+        self.assertTrue(is_full_account_number('79927398713'))
+        self.assertFalse(is_full_account_number('79927398710'))
+        self.assertFalse(is_full_account_number('12345'))
+
+    def test_one_reservation_per_block(self):
+        start = self.next_value()
+        allocator = AccountNumberAllocator(block_size=3)
+        numbers = [allocator.allocate() for _ in range(4)]
+        self.assertEqual([number[:-1] for number in numbers], [str(start + n) for n in range(4)])
+        self.assertTrue(all(is_full_account_number(number) for number in numbers))
+        self.assertEqual(self.next_value(), start + 6)
+
+    def test_allocators_never_hand_out_the_same_number(self):
+        allocators = [AccountNumberAllocator(block_size=3) for _ in range(3)]
+        numbers = [allocators[n % 3].allocate() for n in range(20)]
+        numbers += [make_profile(n).account.account_number for n in range(3)]
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+#a delivered email keeps no readable OTP and is deleted after the retention
+class OutboxTests(BankTestCase):
+    def test_sent_body_is_blanked_and_pruned(self):
+        email = enqueue_email("Otp verification", "You OTP is 1234", ['user@village.test'])
+        self.assertEqual(send_batch(claim_batch(10), mail.get_connection()), (1, 0))
+        self.assertEqual(mail.outbox[0].body, "You OTP is 1234")
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.message), ('sent', ''))
+        self.assertEqual(prune_outbox(), 0)
+        OutboundEmail.objects.filter(pk=email.pk).update(created_at=timezone.now() - timedelta(days=8))
+        self.assertEqual(prune_outbox(), 1)
+
+    def test_email_that_keeps_crashing_the_worker_is_given_up(self):
+        email = enqueue_email("Otp verification", "You OTP is 1234", ['user@village.test'])
+        for _ in range(3):
+            self.assertEqual([claimed.pk for claimed in claim_batch(10, max_attempts=3)], [email.pk])
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(claim_batch(10, max_attempts=3), [])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.message), ('failed', 3, ''))
+
+#a forgot password request with a mismatched confirmation keeps the otp, the new password is used right away
+class ForgotPasswordTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_profile(1)
+        get_otp_store().issue(self.user, '4321')
+        profile_cache.get(self.user.pk)
+
+    def post(self, confirm):
+        return APIClient().post(reverse('profile_login_forgot_password'), {
+            'email':self.user.email, 'otp':'4321', 'new_password':'NewSecret123', 'confirm_new_password':confirm,
+        }, format='json')
+
+    def test_mismatch_does_not_consume_the_otp(self):
+        self.assertEqual(self.post('Other123').status_code, 400)
+        self.assertEqual(self.post('NewSecret123').status_code, 200)
+        self.assertTrue(profile_cache.get(self.user.pk).check_password('NewSecret123'))
+
+#changing the password writes only the password column, a profile change made meanwhile is kept
+class ChangePasswordTests(BankTestCase):
+    def test_only_the_password_is_written(self):
+        user = make_profile(1)
+        client = client_for(user)
+        profile_cache.get(user.pk)
+        Profile.objects.filter(pk=user.pk).update(first_name='Renamed')
+        response = client.patch(reverse('profile_change_password'), {
+            'old_password':PASSWORD, 'new_password':'NewSecret123', 'confirm_new_password':'NewSecret123',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, 'Renamed')
+        self.assertTrue(user.check_password('NewSecret123'))
+        self.assertTrue(profile_cache.get(user.pk).check_password('NewSecret123'))
+
+#a token outlives its user: a deleted or deactivated profile is refused with 401, a password changed on another
+#worker is checked against the database and not against the cached copy
+class ClaimsAuthenticationTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_profile(1)
+        self.client = client_for(self.user)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+
+    def test_deleted_user_is_refused(self):
+        self.user.delete()
+        for name in ('profile','transaction_history'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 401, name)
+            self.assertEqual(response.json()['detail'], 'User not found')
+
+    def test_inactive_user_is_refused(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'User is inactive')
+
+    def test_password_is_checked_against_the_database(self):
+        profile_cache.get(self.user.pk)
+        Profile.objects.filter(pk=self.user.pk).update(password=make_password('Changed123'))
+        response = self.client.patch(reverse('profile_change_password'), {
+            'old_password':PASSWORD, 'new_password':'NewSecret123', 'confirm_new_password':'NewSecret123',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('old_password', response.json())
+
+#a blacklist row committed after a higher id was already read is still picked up by the next refresh
+class BlacklistFilterTests(BankTestCase):
+    def blacklist(self, row_id, jti):
+        user = make_profile(row_id)
+        token = OutstandingToken.objects.create(user=user, jti=jti, token=jti, expires_at=timezone.now())
+        BlacklistedToken.objects.create(id=row_id, token=token)
+
+    def test_rows_committed_out_of_order_are_not_skipped(self):
+        blacklist_filter = BlacklistFilter(refresh_interval=0)
+        self.blacklist(10, 'late-high')
+        self.assertTrue(blacklist_filter.might_contain('late-high'))
+        self.blacklist(5, 'early-low')
+        self.assertTrue(blacklist_filter.might_contain('early-low'))
+        self.assertNotIn(5, blacklist_filter._gaps)
+
+#only the allowed requests count against the window, retries while throttled do not keep the client locked out
+class SlidingWindowThrottleTests(BankTestCase):
+    def test_denied_requests_are_not_counted(self):
+        class TwoPerMinute(LoginThrottle):
+            rate = '2/min'
+        request = APIRequestFactory().post('/', REMOTE_ADDR='10.0.0.1')
+        allowed = [TwoPerMinute().allow_request(request, None) for _ in range(5)]
+        self.assertEqual(allowed, [True, True, False, False, False])
+        throttle = TwoPerMinute()
+        throttle.allow_request(request, None)
+        window = int(throttle.now // throttle.duration)
+        self.assertEqual(get_counter_backend().get(f'{throttle.key}:{window}'), 2)
+
+    def test_keys_carry_the_scope(self):
+        request = APIRequestFactory().post('/', REMOTE_ADDR='10.0.0.1')
+        request.user = AnonymousUser()
+        self.assertEqual(OTPThrottle().get_cache_key(request, None), 'throttle_otp_10.0.0.1')
+        self.assertEqual(LoginThrottle().get_cache_key(request, None), 'throttle_login_10.0.0.1')
+
+#the read endpoints stay within their declared query_budget and their query count does not grow with the data
+class QueryBudgetTests(BankTestCase):
+    def test_read_endpoints_stay_within_budget(self):
+        counts = {}
+        for size in (5, 25):
+            for result in measure_endpoints(size, 3):
+                self.assertEqual(result['status'], 200, result['endpoint'])
+                self.assertLessEqual(result['queries'], result['budget'], result['endpoint'])
+                counts.setdefault(result['endpoint'], set()).add(result['queries'])
+        for endpoint, seen in counts.items():
+            self.assertEqual(len(seen), 1, f"{endpoint} query count changes with the data size: {sorted(seen)}")
+
+    def test_transaction_stays_within_budget(self):
+        sender, receiver = make_profile(1), make_profile(2)
+        fund(sender.account, '100.00')
+        client = client_for(sender)
+        body = {'account_number':sender.account.account_number, 'transaction_type':'transfer', 'amount':'10.00',
+                'receiver_account_number':receiver.account.account_number}
+        with query_budget(TransactionView.query_budget, label='POST transaction'):
+            self.assertEqual(client.post(reverse('transaction'), body, format='json').status_code, 201)
+
+#a transaction moves the balances and writes one debit and one credit, an unfunded one is recorded as failed
+class SettlementTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sender = make_profile(1)
+        self.receiver = make_profile(2)
+        fund(self.sender.account, '100.00')
+        self.client = client_for(self.sender)
+
+    def post(self, transaction_type, amount, **extra):
+        body = {'account_number':self.sender.account.account_number, 'transaction_type':transaction_type, 'amount':amount, **extra}
+        return self.client.post(reverse('transaction'), body, format='json')
+
+    def balances(self):
+        return [Account.objects.get(pk=profile.account.pk).balance for profile in (self.sender, self.receiver)]
+
+    def test_deposit_withdraw_and_transfer(self):
+        self.assertEqual(self.post('deposit', '50.00').status_code, 201)
+        self.assertEqual(self.post('withdraw', '20.00').status_code, 201)
+        response = self.post('transfer', '30.00', receiver_account_number=self.receiver.account.account_number)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('30.00')])
+        self.assertEqual(set(Transaction.objects.values_list('status', flat=True)), {'success'})
+        for txn in Transaction.objects.all():
+            entries = txn.ledger_entries.order_by('entry_type')
+            self.assertEqual([entry.entry_type for entry in entries], ['credit','debit'])
+            self.assertEqual({entry.amount for entry in entries}, {txn.amount})
+
+    def test_unfunded_transfer_fails_without_moving_money(self):
+        self.post('transfer', '150.00', receiver_account_number=self.receiver.account.account_number)
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('0.00')])
+        self.assertFalse(Transaction.objects.filter(status='success').exists())
+        self.assertFalse(LedgerEntry.objects.exists())
+
+    @override_settings(ASYNC_SETTLEMENT=True)
+    def test_queued_transaction_is_settled_by_the_worker(self):
+        response = self.post('transfer', '40.00', receiver_account_number=self.receiver.account.account_number)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.balances(), [Decimal('100.00'), Decimal('0.00')])
+        self.assertEqual([txn.status for txn in settle_pending(10)], ['success'])
+        self.assertEqual(self.client.get(response['Location']).json()['status'], 'success')
+        self.assertEqual(self.balances(), [Decimal('60.00'), Decimal('40.00')])
+
+#the .values() list serializers must render exactly what the model serializers render
+class FastSerializerTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [make_profile(n) for n in range(3)]
+        self.staff = make_profile(100, 'staff')
+        accounts = [user.account for user in self.users]
+        fund(accounts[0], '100.00')
+        for n in range(3):
+            Transaction.objects.create(transaction_type='transfer', sender=accounts[0], receiver=accounts[1],
+                                       amount=Decimal('1.50'), status='success')
+
+    def test_admin_profile_list_matches_model_serializer(self):
+        response = client_for(self.staff).get(reverse('admin_dashboard_profile'), {'page_size':100})
+        self.assertEqual(response.status_code, 200)
+        expected = UserForAdminSerializer(Profile.objects.filter(profile_type='user').order_by('created_at','id'), many=True).data
+        self.assertEqual(response.json()['results'], [dict(item) for item in expected])
+
+    def test_admin_transaction_list_matches_model_serializer(self):
+        response = client_for(self.staff).get(reverse('admin_dashboard_transacation'), {'page_size':100})
+        self.assertEqual(response.status_code, 200)
+        expected = TransactionListForAdminSerializer(Transaction.objects.order_by('id'), many=True).data
+        self.assertEqual(response.json()['results'], [dict(item) for item in expected])
+
+#the export streams the filtered transactions in id order, after_id picks up where an interrupted download stopped
+class TransactionExportTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = make_profile(1), make_profile(2)
+        fund(self.user.account, '100.00')
+        self.transactions = [
+            handle_transaction(user_account=self.user.account, receiver_account=self.other.account, tran_type='transfer', amt=Decimal('10.00')),
+            handle_transaction(user_account=self.user.account, receiver_account=None, tran_type='deposit', amt=Decimal('5.00')),
+            handle_transaction(user_account=self.user.account, receiver_account=None, tran_type='withdraw', amt=Decimal('1.00')),
+        ]
+        Transaction.objects.filter(pk=self.transactions[0].pk).update(timestamp=timezone.now() - timedelta(days=3))
+        self.client = client_for(make_profile(100, 'staff'))
+
+    def export(self, **params):
+        response = self.client.get(reverse('admin_dashboard_transaction_export'), params)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        return response, gzip.decompress(content).decode() if params.get('gzip') else content.decode()
+
+    def test_csv(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([int(row['id']) for row in rows], [txn.pk for txn in self.transactions])
+        self.assertEqual((rows[0]['sender'], rows[0]['receiver'], rows[0]['amount']),
+                         (self.user.account.account_number, self.other.account.account_number, '10.00'))
+        self.assertEqual(rows[1]['sender'], '')
+
+    def test_ndjson_gzip(self):
+        response, content = self.export(output='ndjson', gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.ndjson.gz"')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [txn.pk for txn in self.transactions])
+        self.assertEqual((rows[1]['transaction_type'], rows[1]['receiver'], rows[1]['sender']),
+                         ('deposit', self.user.account.account_number, None))
+
+    def test_after_id_and_filters(self):
+        _, content = self.export(output='ndjson', after_id=self.transactions[0].pk)
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [txn.pk for txn in self.transactions[1:]])
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        _, content = self.export(output='ndjson', timestamp_after=since, transaction_type='deposit')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.transactions[1].pk])
+
+    def test_bad_parameters(self):
+        url = reverse('admin_dashboard_transaction_export')
+        for params, field in (({'output':'xml'}, 'output'), ({'after_id':'abc'}, 'after_id'), ({'timestamp_after':'soon'}, 'timestamp')):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(field, response.json())
+
+#statements start from the nearest snapshot and replay the days after it, every row carries the balance after it
+class StatementTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.other = make_profile(1), make_profile(2)
+        self.account = self.user.account
+        self.days = [timezone.localdate() - timedelta(days=10 - n) for n in range(4)]
+        Account.objects.update(created_at=day_bounds(self.days[0])[0])
+        self.add('deposit', None, self.account, '100.00', 0)
+        self.add('transfer', self.account, self.other.account, '30.00', 1)
+        self.add('deposit', None, self.account, '10.00', 2)
+        self.add('withdraw', self.account, None, '5.00', 3)
+        self.add('deposit', None, self.account, '99.00', 3, status='failed')
+        fund(self.account, '75.00')
+        fund(self.other.account, '30.00')
+
+    def add(self, transaction_type, sender, receiver, amount, day, status='success'):
+        txn = Transaction.objects.create(transaction_type=transaction_type, sender=sender, receiver=receiver, amount=Decimal(amount), status=status)
+        Transaction.objects.filter(pk=txn.pk).update(timestamp=day_bounds(self.days[day])[0] + timedelta(hours=12))
+
+    def test_opening_balance_without_a_snapshot(self):
+        self.assertEqual(opening_balance(self.account.pk, self.days[0]), Decimal('0.00'))
+        self.assertEqual(opening_balance(self.account.pk, self.days[2]), Decimal('70.00'))
+
+    def test_opening_balance_replays_the_days_after_the_snapshot(self):
+        self.assertEqual(take_snapshots(self.days[0]), 2)
+        self.assertEqual(BalanceSnapshot.objects.get(account=self.account).balance, Decimal('100.00'))
+        BalanceSnapshot.objects.filter(account=self.account).update(balance=Decimal('1000.00'))
+        self.assertEqual(opening_balance(self.account.pk, self.days[1]), Decimal('1000.00'))
+        self.assertEqual(opening_balance(self.account.pk, self.days[3]), Decimal('980.00'))
+        self.assertEqual(opening_balance(self.other.account.pk, self.days[3]), Decimal('30.00'))
+
+    def test_running_balance_of_every_row(self):
+        take_snapshots(self.days[0])
+        data = statement(self.account.pk, self.days[1], self.days[3])
+        self.assertEqual(data['opening_balance'], Decimal('100.00'))
+        self.assertEqual([entry['amount'] for entry in data['transactions']], [Decimal('-30.00'), Decimal('10.00'), Decimal('-5.00')])
+        self.assertEqual([entry['balance'] for entry in data['transactions']], [Decimal('70.00'), Decimal('80.00'), Decimal('75.00')])
+        self.assertEqual(data['closing_balance'], Decimal('75.00'))
+
+    def test_endpoint_validates_the_dates(self):
+        client = client_for(self.user)
+        url = reverse('account_statement')
+        response = client.get(url, {'from_date':self.days[3], 'to_date':self.days[0]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('from_date', response.json())
+        response = client.get(url, {'from_date':self.days[0] - timedelta(days=400), 'to_date':self.days[0]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('to_date', response.json())
+        self.assertEqual(client.get(url, {'from_date':'yesterday'}).status_code, 400)
+        response = client.get(url, {'from_date':self.days[2], 'to_date':self.days[3]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['opening_balance'], response.json()['closing_balance']), ('70.00', '75.00'))
+        self.assertEqual(response.json()['account_number'], self.account.account_number)
+
+#ledger entries can not be changed or deleted one by one or in bulk, only clear_bank purges them
+class LedgerImmutabilityTests(BankTestCase):
+    def test_entries_can_not_be_changed(self):
+        user = make_profile(1)
+        handle_transaction(user_account=user.account, receiver_account=None, tran_type='deposit', amt=Decimal('5.00'))
+        entries = LedgerEntry.objects.filter(account=user.account)
+        for change in (lambda: entries.delete(), lambda: entries.update(amount=1), lambda: entries.get().delete(), lambda: entries.get().save()):
+            with self.assertRaises(TypeError):
+                change()
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+        self.assertEqual(LedgerEntry.objects.all().purge()[0], 2)
+
+#the admin refuses to delete a settled transaction, its ledger entries protect it, an unsettled one can go
+class TransactionAdminTests(BankTestCase):
+    def test_settled_transaction_has_no_delete(self):
+        admin_user = make_profile(100, 'admin', is_superuser=True)
+        user = make_profile(1)
+        self.client.force_login(admin_user)
+        settled = handle_transaction(user_account=user.account, receiver_account=None, tran_type='deposit', amt=Decimal('5.00'))
+        pending = queue_transaction(user_account=user.account, receiver_account=None, tran_type='deposit', amt=Decimal('5.00'))
+        self.assertEqual(self.client.post(reverse('admin:user_accounts_transaction_delete', args=[settled.pk]), {'post':'yes'}).status_code, 403)
+        self.assertEqual(self.client.post(reverse('admin:user_accounts_transaction_delete', args=[pending.pk]), {'post':'yes'}).status_code, 302)
+        self.assertEqual(list(Transaction.objects.values_list('pk', flat=True)), [settled.pk])
+
+#a balance that drifted from its transactions is reported once, also when it sits on the edge of a range
+class ReconcileTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [make_profile(n) for n in range(5)]
+        self.pks = [user.account.pk for user in self.users]
+        for user in self.users:
+            handle_transaction(user_account=user.account, receiver_account=None, tran_type='deposit', amt=Decimal('20.00'))
+        handle_transaction(user_account=self.users[0].account, receiver_account=self.users[4].account, tran_type='transfer', amt=Decimal('5.00'))
+
+    def mismatches(self, size):
+        return [row for first, last in pk_ranges(self.pks[0], self.pks[-1], size) for row in reconcile_range(first, last)]
+
+    def test_drift_is_reported_at_range_boundaries(self):
+        self.assertEqual(self.mismatches(2), [])
+        Account.objects.filter(pk__in=self.pks[1:3]).update(balance=Decimal('21.00'))
+        self.assertEqual(self.mismatches(2), [(self.pks[1], Decimal('21.00'), Decimal('20.00')), (self.pks[2], Decimal('21.00'), Decimal('20.00'))])
+        self.assertEqual([pk for pk, _, _ in self.mismatches(1)], self.pks[1:3])
+
+    def test_command_fails_the_check(self):
+        output = io.StringIO()
+        call_command('reconcile_balances', '--workers', '1', '--chunk-size', '2', '--check', stdout=output)
+        self.assertIn('0 mismatches', output.getvalue())
+        Account.objects.filter(pk=self.pks[4]).update(balance=Decimal('1.00'))
+        output = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_balances', '--workers', '1', '--chunk-size', '2', '--check', stdout=output)
+        self.assertIn(f"account {self.pks[4]}: balance 1.00, transactions 25.00, difference -24.00", output.getvalue())
+
+#urls of the async read views for AsyncReadViewTests next to the project urls, which only route to them with
+#ASYNC_VIEWS on
+urlpatterns = [
+    path('', include('village_banking.urls')),
+    path('async/profile/', AsyncUserProfileView.as_view(), name='async_profile'),
+    path('async/profile/<int:pk>/', AsyncAccountProfileDetailedView.as_view(), name='async_profile_detailed'),
+    path('async/admin/dashboard/', AsyncAdminDashboardView.as_view(), name='async_admin_dashboard'),
+]
+
+#the async views answer like their sync counterparts: 200 with the same payload, 401 without a valid user, 403
+#for the wrong role and 404 for a missing account
+@override_settings(ROOT_URLCONF='user_accounts.tests')
+class AsyncReadViewTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_profile(1)
+        self.staff = make_profile(100, 'staff')
+        self.account = self.user.account
+        self.tokens = {profile.pk:str(CustomTokenObtainPairSerializer.get_token(profile).access_token) for profile in (self.user, self.staff)}
+        self.sync_profile = self.client.get(reverse('profile'), headers=self.headers(self.user)).json()
+
+    def headers(self, profile):
+        return {'authorization':f'Bearer {self.tokens[profile.pk]}'}
+
+    async def test_user_views(self):
+        response = await self.async_client.get(reverse('async_profile'), headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.sync_profile)
+        self.assertEqual(response.json()['account']['account_number'], self.account.account_number)
+        response = await self.async_client.get(reverse('async_profile_detailed', args=[self.account.pk]), headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(reverse('async_profile_detailed', args=[0]), headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_admin_dashboard(self):
+        response = await self.async_client.get(reverse('async_admin_dashboard'), headers=self.headers(self.staff))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['current_user']['email'], response.json()['no_of_user']), (self.staff.email, 1))
+        response = await self.async_client.get(reverse('async_admin_dashboard'), headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 403)
+
+    async def test_unauthenticated(self):
+        response = await self.async_client.get(reverse('async_profile'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response.headers)
+        response = await self.async_client.get(reverse('async_profile'), headers={'authorization':'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        headers = self.headers(self.user)
+        await Profile.objects.filter(pk=self.user.pk).adelete()
+        response = await self.async_client.get(reverse('async_profile'), headers=headers)
+        self.assertEqual(response.status_code, 401)
+
+#without a pool the endpoint reports only what the signals can count: the connections created and the errors
+class DatabasePoolTests(BankTestCase):
+    def test_persistent_connection_metrics(self):
+        client = client_for(make_profile(100, 'staff'))
+        response = client.get(reverse('admin_dashboard_db_pool'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['connections_created'], connection_metrics.connections_created)
+        self.assertNotIn('checkouts', response.json())
+        self.assertNotIn('waits', response.json())
+
+#with METRICS_DIR a scrape adds up the snapshots every worker wrote to the shared directory
+class SharedMetricsTests(BankTestCase):
+    def test_scrape_reports_every_worker(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory, INTERNAL_IPS=['127.0.0.1']):
+            key = ('cache_requests_total', (('cache','other_worker'), ('result','hit')))
+            with open(os.path.join(directory, 'metrics-1-worker.json'), 'w') as handle:
+                json.dump(encode_snapshot(({}, {key:7})), handle)
+            registry.incr(*key[:2], amount=3)
+            flush_metrics(force=True)
+            self.assertEqual(len(os.listdir(directory)), 2)
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertIn('cache_requests_total{cache="other_worker",result="hit"} 10', response.content.decode())
+
+#a digit run that passes the check digit but is no account number is still searched as a substring
+class AccountNumberFilterTests(BankTestCase):
+    def test_luhn_valid_substring_falls_back_to_search(self):
+        staff = make_profile(100, 'staff')
+        user = make_profile(1)
+        Account.objects.filter(pk=user.account.pk).update(account_number='9123456740')
+        index_profile(user.pk)
+        self.assertTrue(is_full_account_number('12345674'))
+        client = client_for(staff)
+        for value in ('9123456740', '12345674'):
+            response = client.get(reverse('admin_dashboard_profile'), {'account_number':value})
+            self.assertEqual([item['id'] for item in response.json()['results']], [user.pk], value)
+
+#an uploaded file is queued as an import and the worker creates the invited profiles
+class ProfileImportTests(BankTestCase):
+    HEADER = "first_name,last_name,age,email,phonenumber"
+
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(make_profile(100, 'staff'))
+
+    def upload(self, lines, key='import-1'):
+        uploaded = SimpleUploadedFile('village.csv', "\n".join([self.HEADER, *lines]).encode(), content_type='text/csv')
+        return self.client.post(reverse('admin_dashboard_profile_import'), {'file':uploaded}, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_import_runs_in_the_worker(self):
+        lines = ["Asha,Rao,31,asha@village.test,+919811100001", "Ravi,Rao,17,ravi@village.test,+919811100002"]
+        response = self.upload(lines)
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Profile.objects.filter(email='asha@village.test').exists())
+        self.assertEqual(self.upload(lines).json()['id'], response.json()['id'])
+        call_command('process_batches', '--once', stdout=io.StringIO())
+        job = self.client.get(response['Location']).json()
+        self.assertEqual((job['status'], job['created'], job['failed']), ('done', 1, 1))
+        self.assertEqual(job['errors'][0]['row'], 2)
+        self.assertTrue(Profile.objects.get(email='asha@village.test').account.account_number)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+        self.assertEqual(ProfileImport.objects.get().payload, [])
+
+    def test_passwords_are_not_uploaded(self):
+        uploaded = SimpleUploadedFile('village.csv', f"{self.HEADER},password\nAsha,Rao,31,a@village.test,+919811100001,Secret123".encode())
+        response = self.client.post(reverse('admin_dashboard_profile_import'), {'file':uploaded})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProfileImport.objects.exists())
+
+#a posted batch is queued, settled by the process_batches worker and never queued twice for one Idempotency-Key
+class SettlementBatchTests(BankTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = make_profile(100, 'staff')
+        self.users = [make_profile(n) for n in range(2)]
+        fund(self.users[0].account, '50.00')
+        self.client = client_for(self.staff)
+        self.items = [
+            {'account_number':self.users[1].account.account_number, 'transaction_type':'deposit', 'amount':'25.00'},
+            {'account_number':self.users[0].account.account_number, 'transaction_type':'transfer', 'amount':'30.00',
+             'receiver_account_number':self.users[1].account.account_number},
+            {'account_number':self.users[0].account.account_number, 'transaction_type':'transfer', 'amount':'30.00',
+             'receiver_account_number':self.users[1].account.account_number},
+            {'account_number':'0000000', 'transaction_type':'deposit', 'amount':'5.00'},
+        ]
+
+    def post(self, items, key='batch-1'):
+        return self.client.post(reverse('admin_dashboard_batch'), {'items':items}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_queued_batch_is_settled_by_the_worker(self):
+        response = self.post(self.items)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'queued')
+        self.assertEqual(Transaction.objects.count(), 0)
+        call_command('process_batches', '--once', '--chunk-size', '2', stdout=io.StringIO())
+        batch = self.client.get(response['Location']).json()
+        self.assertEqual(batch['status'], 'done')
+        self.assertEqual((batch['settled'], batch['failed'], batch['rejected']), (2, 1, 1))
+        self.assertEqual([result['status'] for result in batch['results']], ['success','success','failed','rejected'])
+        balances = [Account.objects.get(pk=user.account.pk).balance for user in self.users]
+        self.assertEqual(balances, [Decimal('20.00'), Decimal('55.00')])
+
+    def test_reposted_batch_is_not_settled_twice(self):
+        first = self.post(self.items)
+        second = self.post(self.items)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(self.post(self.items[:1]).status_code, 422)
+        call_command('process_batches', '--once', stdout=io.StringIO())
+        self.assertEqual(SettlementBatch.objects.count(), 1)
+        self.assertEqual(Transaction.objects.filter(batch__isnull=False).count(), 3)
+
+    def test_worker_resumes_after_the_last_committed_chunk(self):
+        batch, _ = queue_batch(self.items[:2])
+        SettlementBatch.objects.filter(pk=batch.pk).update(status='running', processed=1, claimed_until=timezone.now())
+        call_command('process_batches', '--once', stdout=io.StringIO())
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'done')
+        self.assertEqual(Transaction.objects.filter(batch=batch).count(), 1)
+        self.assertEqual(batch.results[0]['item'], 2)
@@ -1,16 +1,139 @@
+import random
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import IntegrityError,transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework.throttling import SimpleRateThrottle
+from .models import ThrottleCounter
+from .metrics import record,THROTTLE_SECONDS
 
-class OTPThrottle(SimpleRateThrottle):
+#counters on a cache whose incr is atomic (redis and redis compatible servers, memcached, locmem)
+class CacheCounterBackend:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def incr(self, key, ttl):
+        self.cache.add(key, 0, ttl)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, ttl)
+            return 1
+
+    def decr(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+    def get(self, key):
+        return self.cache.get(key) or 0
+
+#counters on the ThrottleCounter table, increments are single UPDATE ... SET count = count + 1 statements.
+#used for the database cache as its incr is a read followed by a write
+class DatabaseCounterBackend:
+    def incr(self, key, ttl):
+        counter = ThrottleCounter.objects.filter(key=key)
+        if not counter.update(count=F('count') + 1):
+            try:
+                with db_transaction.atomic():
+                    ThrottleCounter.objects.create(key=key, count=1, expires_at=timezone.now() + timedelta(seconds=ttl))
+                if random.random() < 0.001:
+                    ThrottleCounter.objects.filter(expires_at__lte=timezone.now()).delete()
+                return 1
+            except IntegrityError:
+                counter.update(count=F('count') + 1)
+        return counter.values_list('count', flat=True).first() or 1
+
+    def decr(self, key):
+        ThrottleCounter.objects.filter(key=key, count__gt=0).update(count=F('count') - 1)
+
+    def get(self, key):
+        return ThrottleCounter.objects.filter(key=key).values_list('count', flat=True).first() or 0
+
+def get_counter_backend():
+    cache = caches[settings.THROTTLE_CACHE_ALIAS]
+    if isinstance(cache, DatabaseCache):
+        return DatabaseCounterBackend()
+    return CacheCounterBackend(cache)
+
+#sliding window counter throttle. every request is one atomic increment of the counter of the current fixed window
+#plus a read of the previous one, the previous count is weighted by how much of it still overlaps the sliding
+#window. unlike SimpleRateThrottle nothing grows with the rate and the counts are shared by all the workers when
+#THROTTLE_CACHE_ALIAS is a shared cache, the default per-process cache counts every worker on its own.
+#a denied request takes its increment back, so a client that keeps retrying while throttled is let through again
+#as soon as its allowed requests slide out of the window
+class SlidingWindowThrottle(SimpleRateThrottle):
+    def allow_request(self, request, view):
+        started = time.perf_counter()
+        try:
+            return self.check_window(request, view)
+        finally:
+            record(THROTTLE_SECONDS, time.perf_counter() - started)
+
+    def check_window(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        backend = get_counter_backend()
+        self.now = time.time()
+        window = int(self.now // self.duration)
+        elapsed = self.now - window * self.duration
+        self.previous = backend.get(f'{self.key}:{window - 1}')
+        self.current = backend.incr(f'{self.key}:{window}', self.duration * 2)
+        self.remaining_previous_weight = 1 - elapsed / self.duration
+        if self.previous * self.remaining_previous_weight + self.current <= self.num_requests:
+            return True
+        backend.decr(f'{self.key}:{window}')
+        return False
+
+    def wait(self):
+        elapsed = self.duration * (1 - self.remaining_previous_weight)
+        if self.current >= self.num_requests or not self.previous:
+            return self.duration - elapsed
+        return max(0, self.duration * (1 - (self.num_requests - self.current) / self.previous) - elapsed)
+
+class UserThrottle(SlidingWindowThrottle):
+    scope = 'user'
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope':self.scope, 'ident':ident}
+
+class AnonThrottle(SlidingWindowThrottle):
+    scope = 'anon'
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope':self.scope, 'ident':self.get_ident(request)}
+
+class OTPThrottle(SlidingWindowThrottle):
     scope = 'otp'
 
     def get_cache_key(self, request, view):
-        if request.user.is_authenticated:
-            return f'otp_throttle_user_{request.user.pk}'
-        return self.get_ident(request)
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope':self.scope, 'ident':ident}
 
-class TransactionThrottle(SimpleRateThrottle):
+class TransactionThrottle(SlidingWindowThrottle):
     scope = 'transaction'
     def get_cache_key(self, request, view):
         if request.user and request.user.is_authenticated:
-            return f'transaction_throttle_user_{request.user.pk}'
-        return None
\ No newline at end of file
+            return self.cache_format % {'scope':self.scope, 'ident':request.user.pk}
+        return None
+
+#login attempts are limited per client address, whatever email they try
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope':self.scope, 'ident':self.get_ident(request)}
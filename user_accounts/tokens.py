@@ -0,0 +1,154 @@
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .metrics import cache_lookup
+
+#plain bloom filter over a bytearray, the k bit positions come from double hashing one blake2b digest
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+#per-process bloom filter of the blacklisted refresh token jtis. new blacklist rows are pulled in by id every
+#refresh_interval seconds and the filter is rebuilt from scratch every rebuild_interval seconds so that pruned
+#tokens drop out of it. a jti the filter has never seen is definitely not blacklisted and needs no query, a token
+#blacklisted by another worker is caught at the latest refresh_interval seconds later.
+#ids commit out of order, so an id skipped below the highest one seen is kept as a gap and asked for again on
+#every refresh until its row shows up or gap_timeout seconds passed (the insert was rolled back). the rebuild runs
+#in a background thread while requests keep using the current filter, only the first build blocks
+class BlacklistFilter:
+    #ids further below a new row than this are not tracked as gaps
+    max_gap = 10000
+
+    def __init__(self, refresh_interval=5, rebuild_interval=3600, false_positive_rate=0.001, gap_timeout=60):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.false_positive_rate = false_positive_rate
+        self.gap_timeout = gap_timeout
+        self._bloom = None
+        self._last_id = 0
+        self._gaps = {}
+        self._refreshed_at = 0
+        self._built_at = 0
+        self._rebuilding = None
+        self._lock = threading.Lock()
+
+    #reads rows into bloom, advancing last_id and tracking the ids skipped below it. returns the new last_id
+    def _read(self, bloom, rows, last_id, gaps, now):
+        for row_id, jti in rows.iterator(chunk_size=10000):
+            bloom.add(jti)
+            if gaps.pop(row_id, None) is not None or row_id <= last_id:
+                continue
+            for missing in range(max(last_id + 1, row_id - self.max_gap), row_id):
+                gaps[missing] = now
+            last_id = row_id
+        return last_id
+
+    def _build(self, now):
+        rows = BlacklistedToken.objects.order_by('id').values_list('id','token__jti')
+        bloom = BloomFilter(max(rows.count() * 2, 10000), self.false_positive_rate)
+        gaps = {}
+        last_id = self._read(bloom, rows, 0, gaps, now)
+        return bloom, last_id, gaps
+
+    def _rebuild(self, now):
+        self._bloom, self._last_id, self._gaps = self._build(now)
+        self._built_at = self._refreshed_at = now
+
+    #builds the new filter on its own thread and connection and swaps it in. jtis added meanwhile are carried over,
+    #rows committed after the build read are pulled in by the next refresh from its last_id and gaps
+    def _rebuild_in_background(self, now):
+        added = self._rebuilding = []
+        def build():
+            try:
+                bloom, last_id, gaps = self._build(now)
+                with self._lock:
+                    for jti in added:
+                        bloom.add(jti)
+                    self._bloom, self._last_id, self._gaps = bloom, last_id, gaps
+                    self._built_at = self._refreshed_at = now
+            finally:
+                with self._lock:
+                    self._rebuilding = None
+                    if self._built_at != now:
+                        #a failed rebuild is tried again after the next refresh interval
+                        self._built_at = now - self.rebuild_interval + self.refresh_interval
+                connection.close()
+        threading.Thread(target=build, daemon=True).start()
+
+    def _refresh(self, now):
+        rows = (
+            BlacklistedToken.objects.filter(Q(id__gt=self._last_id)|Q(id__in=list(self._gaps)))
+            .order_by('id').values_list('id','token__jti')
+        )
+        self._last_id = self._read(self._bloom, rows, self._last_id, self._gaps, now)
+        self._gaps = {row_id:seen for row_id, seen in self._gaps.items() if now - seen < self.gap_timeout}
+        self._refreshed_at = now
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._bloom is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._bloom is None:
+                self._rebuild(now)
+                return
+            if now - self._refreshed_at >= self.refresh_interval:
+                self._refresh(now)
+            due = now - self._built_at >= self.rebuild_interval or self._bloom.count > self._bloom.capacity
+            if due and self._rebuilding is None:
+                self._rebuild_in_background(now)
+
+    def might_contain(self, jti):
+        self._sync()
+        return jti in self._bloom
+
+    def add(self, jti):
+        self._sync()
+        with self._lock:
+            self._bloom.add(jti)
+            if self._rebuilding is not None:
+                self._rebuilding.append(jti)
+
+blacklist_filter = BlacklistFilter(
+    refresh_interval=getattr(settings, 'TOKEN_BLACKLIST_FILTER_REFRESH', 5),
+    rebuild_interval=getattr(settings, 'TOKEN_BLACKLIST_FILTER_REBUILD', 3600),
+)
+
+#refresh token whose blacklist check only reaches the database when the bloom filter reports a possible hit
+class FilteredRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        might_contain = blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM])
+        cache_lookup('token_blacklist_filter', not might_contain)
+        if might_contain:
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
@@ -1,11 +1,16 @@
+from django.conf import settings
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
-from .views import RegisterProfileView,CustomTokenObtainPairView,ProfileLogoutView,UpdatePasswordView,ForgotPasswordView,UserProfileView,AdminDashboardView,TransactionView,AccountProfileDetailedView,AdminDashboardUserView,AdminDashboardUserDetailedView,AdminDashboardTransactionView,AdminDashboardTransactionDetailedView,SendOtpView
+from .views import RegisterProfileView,CustomTokenObtainPairView,CustomTokenRefreshView,ProfileLogoutView,UpdatePasswordView,ForgotPasswordView,UserProfileView,AdminDashboardView,TransactionView,AccountProfileDetailedView,AdminDashboardUserView,AdminDashboardUserDetailedView,AdminDashboardTransactionView,AdminDashboardTransactionDetailedView,SendOtpView,TransactionHistoryView,AdminDashboardTransactionExportView,AccountStatementView,DatabasePoolView,AdminDashboardProfileImportView,AdminDashboardProfileImportDetailedView,AdminDashboardBatchView,AdminDashboardBatchDetailedView,TransactionStatusView
+from .async_views import AsyncUserProfileView,AsyncAccountProfileDetailedView,AsyncAdminDashboardView
+
+#under an ASGI server the read heavy views are served by their async counterparts
+if settings.ASYNC_VIEWS:
+    UserProfileView,AccountProfileDetailedView,AdminDashboardView = AsyncUserProfileView,AsyncAccountProfileDetailedView,AsyncAdminDashboardView
 
 urlpatterns = [
     path("profile/register/", RegisterProfileView.as_view(),name='profile_register'),
     path('profile/login/',CustomTokenObtainPairView.as_view(),name='profile_login'),
-    path('profile/login/refresh/',TokenRefreshView.as_view(),name='profile_login_refresh'),
+    path('profile/login/refresh/',CustomTokenRefreshView.as_view(),name='profile_login_refresh'),
     path('profile/logout/',ProfileLogoutView.as_view(),name='profile_logout'),
     path('profile/change-password/',UpdatePasswordView.as_view(),name='profile_change_password'),
     path('profile/login/forgot-password/',ForgotPasswordView.as_view(),name='profile_login_forgot_password'),
@@ -13,9 +18,18 @@ urlpatterns = [
     path('profile/',UserProfileView.as_view(),name='profile'),
     path('profile/<int:pk>/',AccountProfileDetailedView.as_view(),name='profile_detailed'),
     path('admin/dashboard/',AdminDashboardView.as_view(),name='admin_dashboard'),
+    path('admin/dashboard/db-pool/',DatabasePoolView.as_view(),name='admin_dashboard_db_pool'),
     path('admin/dashboard/profile/',AdminDashboardUserView.as_view(),name='admin_dashboard_profile'),
     path('admin/dashboard/transaction/',AdminDashboardTransactionView.as_view(),name='admin_dashboard_transacation'),
+    path('admin/dashboard/transaction/export/',AdminDashboardTransactionExportView.as_view(),name='admin_dashboard_transaction_export'),
+    path('admin/dashboard/profile/import/',AdminDashboardProfileImportView.as_view(),name='admin_dashboard_profile_import'),
+    path('admin/dashboard/profile/import/<int:pk>/',AdminDashboardProfileImportDetailedView.as_view(),name='admin_dashboard_profile_import_id'),
     path('admin/dashboard/profile/<int:pk>/',AdminDashboardUserDetailedView.as_view(),name='admin_dashboard_profile_id'),
      path('admin/dashboard/transaction/<int:pk>/',AdminDashboardTransactionDetailedView.as_view(),name='admin_dashboard_transaction_id'),
+    path('admin/dashboard/batch/',AdminDashboardBatchView.as_view(),name='admin_dashboard_batch'),
+    path('admin/dashboard/batch/<int:pk>/',AdminDashboardBatchDetailedView.as_view(),name='admin_dashboard_batch_id'),
     path('profile/transaction/',TransactionView.as_view(),name='transaction'),
+    path('profile/transaction/<int:pk>/',TransactionStatusView.as_view(),name='transaction_status'),
+    path('profile/transactions/',TransactionHistoryView.as_view(),name='transaction_history'),
+    path('profile/statement/',AccountStatementView.as_view(),name='account_statement'),
 ]
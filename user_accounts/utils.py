@@ -1,48 +1,97 @@
 import random 
-from .models import Account
-from django.db.models import Sum
-from django.core.mail import send_mail
+from .models import Account,BankTotals,AccountNumberSequence
+from django.db import connection,transaction as db_transaction
+from django.db.models import Sum,F
 from django.utils import timezone
 from django.conf import settings
 import threading
-from django.contrib.auth.hashers import make_password
-
-def generate_account_number():
-    while True:
-        acc_number = str(random.randint(1000, 999999))
-        if not Account.objects.filter(account_number=acc_number).exists():
-            return acc_number
-        
+from .otp import get_otp_store
+from .outbox import enqueue_email
+
+#the postgres sequence is created with INCREMENT BY this value, change both together in a migration
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+ACCOUNT_NUMBER_SEQUENCE = 'user_accounts_account_number_seq'
+
+#luhn check digit so that a mistyped account number is rejected before any lookup
+def luhn_check_digit(number):
+    total = 0
+    for position, digit in enumerate(reversed(str(number))):
+        digit = int(digit)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str((10 - total % 10) % 10)
+
+#account numbers handed out by the allocator, at least 7 digits ending in their check digit
+def is_full_account_number(value):
+    return len(value) >= 7 and value.isdigit() and luhn_check_digit(value[:-1]) == value[-1]
+
+#hands out unique account numbers from blocks reserved per worker process. on postgres a block is one nextval()
+#on a sequence that steps by the block size, sequences never roll back so a block can not be handed out twice.
+#other databases reserve the block from the AccountNumberSequence row, which is meant for development and tests.
+#the numbers start at 100000 with a check digit appended, so they never clash with the older random 4-6 digit numbers
+class AccountNumberAllocator:
+    def __init__(self, block_size=ACCOUNT_NUMBER_BLOCK_SIZE):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s)", [ACCOUNT_NUMBER_SEQUENCE])
+                start = cursor.fetchone()[0]
+        else:
+            with db_transaction.atomic():
+                sequence = AccountNumberSequence.objects.select_for_update().get(name=ACCOUNT_NUMBER_SEQUENCE)
+                start = sequence.next_value
+                sequence.next_value = start + self.block_size
+                sequence.save(update_fields=['next_value'])
+        return start, start + self.block_size
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve_block()
+            value = self._next
+            self._next += 1
+        return f'{value}{luhn_check_digit(value)}'
+
+account_number_allocator = AccountNumberAllocator()
+
+
 def get_account_balance():
     result = Account.objects.aggregate(total=Sum('balance'))
     return result['total'] or 0.00
 
+#adds the deltas to one random shard of the bank totals, call it inside the transaction that changed the balances
+def update_bank_totals(*, balance=0, users=0):
+    if not balance and not users:
+        return
+    shard = random.randrange(settings.BANK_TOTALS_SHARDS)
+    changes = {'balance':F('balance') + balance, 'users':F('users') + users, 'updated_at':timezone.now()}
+    if not BankTotals.objects.filter(shard=shard).update(**changes):
+        BankTotals.objects.get_or_create(shard=shard)
+        BankTotals.objects.filter(shard=shard).update(**changes)
+
+#total balance and number of users of the bank read from the shards, the cost does not grow with the accounts
+def get_bank_totals():
+    result = BankTotals.objects.aggregate(balance=Sum('balance'), users=Sum('users'))
+    return {'balance':result['balance'] or 0.00, 'users':result['users'] or 0}
+
+async def aget_bank_totals():
+    result = await BankTotals.objects.aaggregate(balance=Sum('balance'), users=Sum('users'))
+    return {'balance':result['balance'] or 0.00, 'users':result['users'] or 0}
+
 def generate_otp():
     return str(random.randint(1000,9999))
 
-class EmailThread(threading.Thread):
-    def __init__(self, subject, message, from_email, reciptent_list):
-        self.subject = subject
-        self.message = message
-        self.from_email = from_email
-        self.reciptent_list = reciptent_list
-        threading.Thread.__init__(self)
-    def run(self):
-        send_mail(
-            self.subject,
-            self.message, 
-            self.from_email, 
-            [self.reciptent_list] if isinstance(self.reciptent_list, str) else self.reciptent_list,
-            fail_silently=False
-            )
-    
-
 def send_otp_email(user, action_description):
     otp = generate_otp()
-    otp_created = timezone.now()
-    user.otp = make_password(otp)
-    user.otp_created_time = otp_created
-    user.save()
+    get_otp_store().issue(user, otp)
     subject = f"Otp verification for {action_description}"
     message = f"You OTP is {otp} Please Use the otp before 5min. it will expire in 5 minutes"
-    EmailThread(subject, message, settings.EMAIL_HOST_USER, [user.email]).start()
+    enqueue_email(subject, message, [user.email])
@@ -4,19 +4,32 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.generics import CreateAPIView,RetrieveAPIView,ListAPIView
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Profile,Account,Transaction
+from rest_framework_simplejwt.views import TokenObtainPairView,TokenRefreshView
+from .tokens import FilteredRefreshToken
+from .models import Profile,Account,Transaction,SettlementBatch,ProfileImport
 from .permission import IsUser,IsAdmin
-from .services import handle_transaction
-from .utils import get_account_balance
-from .serializers import RegisterProfileSerializer,CustomTokenObtainPairSerializer,ChangePasswordSerializer,ForgetPasswordSerializer,UserProfileSerializer,AdminDashboardSerializer,TransactionInputSerializer,TransactionOutputSerializer,AccountDetailedModelSerializer,UserForAdminSerializer,TransactionListForAdminSerializer,TransactionModelSerializerForAdmin,SentOtpSerializer
+from .services import handle_transaction,queue_transaction,InsufficientBalance
+from django.urls import reverse
+from .utils import get_bank_totals
+from .serializers import RegisterProfileSerializer,CustomTokenObtainPairSerializer,ChangePasswordSerializer,ForgetPasswordSerializer,UserProfileSerializer,AdminDashboardSerializer,TransactionInputSerializer,TransactionOutputSerializer,AccountDetailedModelSerializer,UserForAdminSerializer,TransactionListForAdminSerializer,TransactionModelSerializerForAdmin,SentOtpSerializer,TransactionModelSerializer,CustomTokenRefreshSerializer,StatementQuerySerializer,StatementSerializer,SettlementBatchSerializer,SettlementBatchDetailedSerializer,ProfileImportSerializer,TransactionStatusSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import TransactionFilter,ProfileFilter
 from rest_framework import filters
 from .utils import send_otp_email
-from .throttles import OTPThrottle
-from rest_framework.throttling import UserRateThrottle,AnonRateThrottle
+from .throttles import OTPThrottle,TransactionThrottle,LoginThrottle,UserThrottle,AnonThrottle
+from .idempotency import run_once,request_fingerprint
+from .pagination import TransactionCursorPagination,AdminCursorPagination
+from .fastserializers import ValuesListMixin,FastUserForAdminSerializer,FastTransactionListForAdminSerializer
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from .exports import export_transactions
+from .statements import statement
+from .dbmetrics import pool_metrics
+from .onboarding import queue_import,read_rows,file_format,text_stream
+from rest_framework.parsers import MultiPartParser,JSONParser
+from .batches import queue_batch
+from django.conf import settings
+import csv
 # Create your views here.
 #For registering any type of users
 class RegisterProfileView(CreateAPIView):
@@ -24,17 +37,22 @@ class RegisterProfileView(CreateAPIView):
 
 #Used for obtaining the access token and the refresh toekn
 class CustomTokenObtainPairView(TokenObtainPairView):
+    throttle_classes = [LoginThrottle, AnonThrottle]
     serializer_class = CustomTokenObtainPairSerializer
 
+#refreshes the access token, blacklisted refresh tokens are filtered before the database is asked
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
 #used to logout any users
 class ProfileLogoutView(APIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     permission_classes = [IsAuthenticated]
     serializer_class = ForgetPasswordSerializer
     def patch(self, request):
         try:
             refresh_token = request.data['refresh']
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return Response({'messages':'Succesfully logout'},status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -42,7 +60,7 @@ class ProfileLogoutView(APIView):
 
 #used to update the password of the logined user
 class UpdatePasswordView(APIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     permission_classes=[IsAuthenticated]
     serializer_class = ChangePasswordSerializer
     def patch(self, request):
@@ -65,7 +83,7 @@ class SendOtpView(APIView):
 
 #used to change the password is password is forgotten can be used when not logged in 
 class ForgotPasswordView(APIView):
-    throttle_classes = [AnonRateThrottle]
+    throttle_classes = [AnonThrottle]
     serializer_class = ForgetPasswordSerializer
     def post(self, request):
         serializer = ForgetPasswordSerializer(data=request.data)
@@ -76,105 +94,305 @@ class ForgotPasswordView(APIView):
 
 #full details of the user profile,transaction,account
 class UserProfileView(RetrieveAPIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     permission_classes = [IsUser, IsAuthenticated]
     serializer_class = UserProfileSerializer
+    query_budget = 4
+    def get_object(self):
+        return Profile.objects.select_related('account').get(pk=self.request.user.pk)
+
+#full transaction history of the logged in user as one sent and received stream, newest first with cursor pagination.
+#an OR of sender and receiver can follow neither index in order, so the page is read as the sent and the received
+#transactions, each limited to a page from its own index, and merged
+class TransactionHistoryView(ListAPIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsUser, IsAuthenticated]
+    serializer_class = TransactionModelSerializer
+    pagination_class = TransactionCursorPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = TransactionFilter
     ordering_fields = ['id','timestamp']
-    ordering = ['id']
-    def get_object(self):
-        return self.request.user
+    ordering = ['-timestamp','-id']
+    queryset = Transaction.objects.all()
+    #the active check, the account and one UNION ALL on postgres, the branches are two queries on sqlite
+    query_budget = 4
+    def list(self, request, *args, **kwargs):
+        account_id = Account.objects.values_list('id', flat=True).get(user_id=request.user.pk)
+        transactions = self.filter_queryset(self.get_queryset())
+        page = self.paginator.paginate_branches(
+            [transactions.filter(sender_id=account_id), transactions.filter(receiver_id=account_id)], request, self,
+        )
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
     
+#statement of the logged in user between ?from_date= and ?to_date= with the running balance after every transaction,
+#the opening balance starts from the nearest daily snapshot so only the transactions after it are replayed
+class AccountStatementView(APIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsUser, IsAuthenticated]
+    query_budget = 5
+    def get(self, request):
+        query = StatementQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors,status=status.HTTP_400_BAD_REQUEST)
+        account_id, account_number = Account.objects.values_list('id','account_number').get(user_id=request.user.pk)
+        data = statement(account_id, query.validated_data['from_date'], query.validated_data['to_date'])
+        return Response(StatementSerializer({'account_number':account_number, **data}).data,status=status.HTTP_200_OK)
+
 #Detailed view of an account using the id will get the profile and account
 class AccountProfileDetailedView(RetrieveAPIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     permission_classes = [IsAuthenticated]
     serializer_class = AccountDetailedModelSerializer
-    queryset = Account.objects.all()
+    queryset = Account.objects.select_related('user')
+    query_budget = 2
 
 #Detailed view of the admin will get the total users,balance and the admin details
 class AdminDashboardView(APIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     serializer_class = AdminDashboardSerializer
     permission_classes = [IsAdmin, IsAuthenticated]
+    query_budget = 5
     def get(self, request):
-        current_user_data = AdminDashboardSerializer(request.user).data
-        user_profiles = Profile.objects.filter(profile_type='users')
-        no_of_user = user_profiles.count()
-        bank_balance = get_account_balance()
+        profile = Profile.objects.prefetch_related('groups','user_permissions').get(pk=request.user.pk)
+        current_user_data = AdminDashboardSerializer(profile).data
+        totals = get_bank_totals()
         return Response(
             {'current_user':current_user_data,
-            'no_of_user':no_of_user,
-            'bank_balance':bank_balance
+            'no_of_user':totals['users'],
+            'bank_balance':totals['balance']
             },
             status=status.HTTP_200_OK
         )
     
+#database connection statistics of the worker that serves the request, each worker keeps its own connections
+class DatabasePoolView(APIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsAdmin, IsAuthenticated]
+    query_budget = 1
+    def get(self, request):
+        return Response(pool_metrics(),status=status.HTTP_200_OK)
+
 #for getting the list of user for admin
-class AdminDashboardUserView(ListAPIView):
-    throttle_classes = [UserRateThrottle]
+class AdminDashboardUserView(ValuesListMixin, ListAPIView):
+    throttle_classes = [UserThrottle]
     permission_classes = [IsAdmin, IsAuthenticated]
     serializer_class = UserForAdminSerializer
+    fast_serializer_class = FastUserForAdminSerializer
+    pagination_class = AdminCursorPagination
     queryset = Profile.objects.filter(profile_type='user').order_by('created_at')
+    query_budget = 3
     filter_backends = [DjangoFilterBackend,filters.OrderingFilter]
     filterset_class = ProfileFilter
     ordering_fields = ['first_name','age','created_at']
     ordering = ['created_at']
 
+#onboards a whole village from an uploaded .csv or .json file of first_name, last_name, age, email and phonenumber.
+#the rows are queued as an import for the process_batches worker, which creates the profiles and emails every one an
+#invite to set the password. answers 202 with the queued import and its Location, where the created profiles and the
+#errors of every rejected row can be followed. a file with passwords is imported with the import_profiles command,
+#hashing them belongs in a worker process and not in a web request. the same Idempotency-Key answers with the
+#import queued first, a different file under a used key is refused with 422
+class AdminDashboardProfileImportView(APIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsAdmin, IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    def post(self, request):
+        uploaded = request.FILES.get('file')
+        if uploaded is None:
+            return Response({'file':'Upload the profiles as file'},status=status.HTTP_400_BAD_REQUEST)
+        import_format = file_format(uploaded.name)
+        if import_format is None:
+            return Response({'file':'Upload a .csv or .json file'},status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rows = list(read_rows(text_stream(uploaded), import_format))
+        except (ValueError, csv.Error) as e:
+            return Response({'file':f"Could not read the file: {e}"},status=status.HTTP_400_BAD_REQUEST)
+        if not rows:
+            return Response({'file':'The file has no rows'},status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > settings.ONBOARDING_MAX_ROWS:
+            return Response({'file':f"Only {settings.ONBOARDING_MAX_ROWS} rows are imported at once"},status=status.HTTP_400_BAD_REQUEST)
+        if any(isinstance(row, dict) and row.get('password') for row in rows):
+            return Response({'file':'Import passwords with the import_profiles command, uploaded profiles are invited to set one'},status=status.HTTP_400_BAD_REQUEST)
+        job, created = queue_import(rows, created_by_id=request.user.pk, reference=request.headers.get('Idempotency-Key') or None)
+        if not created and job.fingerprint != request_fingerprint(rows):
+            return Response({'error':"Idempotency-Key was already used with a different file"},status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(
+            ProfileImportSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+            headers={'Location':reverse('admin_dashboard_profile_import_id', args=[job.pk])},
+        )
+
+#progress and rejected rows of one profile import
+class AdminDashboardProfileImportDetailedView(RetrieveAPIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsAdmin, IsAuthenticated]
+    serializer_class = ProfileImportSerializer
+    queryset = ProfileImport.objects.all()
+    query_budget = 2
+
 #for getting the detailed view of the user for admin
 class AdminDashboardUserDetailedView(RetrieveAPIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     permission_classes = [IsAdmin, IsAuthenticated]
     serializer_class = UserProfileSerializer
-    queryset = Profile.objects.filter(profile_type='user')
+    queryset = Profile.objects.filter(profile_type='user').select_related('account')
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['id','timestamp']
     ordering = ['id']
+    query_budget = 4
 
 #for getting the list of transaction for admin
-class AdminDashboardTransactionView(ListAPIView):
-    throttle_classes = [UserRateThrottle]
+class AdminDashboardTransactionView(ValuesListMixin, ListAPIView):
+    throttle_classes = [UserThrottle]
     permission_classes = [IsAdmin, IsAuthenticated]
     serializer_class = TransactionListForAdminSerializer
+    fast_serializer_class = FastTransactionListForAdminSerializer
+    pagination_class = AdminCursorPagination
     queryset = Transaction.objects.all().order_by('timestamp')
+    query_budget = 3
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = TransactionFilter
     ordering_fields = ['id','timestamp']
     ordering = ['id']
 
+#streams the filtered transactions as csv or ndjson for auditors, read through a server side cursor so memory stays flat.
+#?output=csv|ndjson, ?gzip=true compresses on the fly and ?after_id=<last id received> resumes an interrupted export
+class AdminDashboardTransactionExportView(APIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsAdmin, IsAuthenticated]
+    CONTENT_TYPES = {'csv':'text/csv', 'ndjson':'application/x-ndjson'}
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in self.CONTENT_TYPES:
+            return Response({'output':'Choose csv or ndjson'},status=status.HTTP_400_BAD_REQUEST)
+        after_id = request.query_params.get('after_id')
+        if after_id is not None and not after_id.isdigit():
+            return Response({'after_id':'Must be a transaction id'},status=status.HTTP_400_BAD_REQUEST)
+        filterset = TransactionFilter(request.query_params, queryset=Transaction.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors,status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip') in ('1','true')
+        response = StreamingHttpResponse(
+            export_transactions(filterset.qs, output, compress, int(after_id) if after_id else None),
+            content_type='application/gzip' if compress else self.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="transactions.{output}{".gz" if compress else ""}"'
+        return response
+
+#staff cash-in and disbursement days: queues a batch of deposits and transfers posted as {"items": [...]} or as an
+#uploaded .csv or .json file with the fields of /api/profile/transaction/. the process_batches worker settles it in
+#chunks that commit on their own, the answer is 202 with the queued batch and its Location, where the counters and
+#finally the status of every item can be followed: success, failed (insufficient balance) or rejected with its
+#errors. a batch posted again with the same Idempotency-Key is answered with the batch queued first and never
+#settled twice, a different batch under a used key is refused with 422
+class AdminDashboardBatchView(ListAPIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsAdmin, IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser]
+    serializer_class = SettlementBatchSerializer
+    pagination_class = AdminCursorPagination
+    queryset = SettlementBatch.objects.all()
+    query_budget = 2
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
+    def post(self, request):
+        uploaded = request.FILES.get('file')
+        if uploaded is not None:
+            batch_format = file_format(uploaded.name)
+            if batch_format is None:
+                return Response({'file':'Upload a .csv or .json file'},status=status.HTTP_400_BAD_REQUEST)
+            try:
+                items = list(read_rows(text_stream(uploaded), batch_format))
+            except (ValueError, csv.Error) as e:
+                return Response({'file':f"Could not read the file: {e}"},status=status.HTTP_400_BAD_REQUEST)
+        else:
+            items = request.data.get('items') if hasattr(request.data, 'get') else None
+            if not isinstance(items, list):
+                return Response({'items':'Post the items as a list or upload them as file'},status=status.HTTP_400_BAD_REQUEST)
+        if not items:
+            return Response({'items':'The batch has no items'},status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.SETTLEMENT_BATCH_MAX_ITEMS:
+            return Response({'items':f"Only {settings.SETTLEMENT_BATCH_MAX_ITEMS} items are settled in one batch"},status=status.HTTP_400_BAD_REQUEST)
+        batch, created = queue_batch(items, created_by_id=request.user.pk, reference=request.headers.get('Idempotency-Key') or None)
+        if not created and batch.payload != items:
+            return Response({'error':"Idempotency-Key was already used with a different batch"},status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(
+            SettlementBatchSerializer(batch).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+            headers={'Location':reverse('admin_dashboard_batch_id', args=[batch.pk])},
+        )
+
+#progress and item results of one settlement batch, its transactions are listed with ?batch=<id> on the admin transactions
+class AdminDashboardBatchDetailedView(RetrieveAPIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsAdmin, IsAuthenticated]
+    serializer_class = SettlementBatchDetailedSerializer
+    queryset = SettlementBatch.objects.all()
+    query_budget = 2
+
 #for getting the detailed view of the transaction for admin
 class AdminDashboardTransactionDetailedView(RetrieveAPIView):
-    throttle_classes = [UserRateThrottle]
+    throttle_classes = [UserThrottle]
     permission_classes = [IsAdmin, IsAuthenticated]
     serializer_class = TransactionModelSerializerForAdmin
-    queryset = Transaction.objects.all()
+    queryset = Transaction.objects.select_related('sender__user','receiver__user')
+    query_budget = 2
+
+#status of a transaction of the logged in user, polled after a queued transaction was answered with 202
+class TransactionStatusView(RetrieveAPIView):
+    throttle_classes = [UserThrottle]
+    permission_classes = [IsUser, IsAuthenticated]
+    serializer_class = TransactionStatusSerializer
+    query_budget = 2
+    def get_queryset(self):
+        user_id = self.request.user.pk
+        return Transaction.objects.filter(Q(sender__user_id=user_id)|Q(receiver__user_id=user_id))
 
 #Full Transaction logic of withdraw, transfer and deposit the amount to the account 
+#a retried request carrying the same Idempotency-Key gets the stored response back without settling again, from
+#any worker. reusing a key with a different body is refused. only a settled outcome is stored under the key, an
+#unexpected error (e.g. a lost database connection) propagates and rolls the key back so the retry settles.
+#with ASYNC_SETTLEMENT on it only validates, records the transaction as pending and answers 202 with its status url,
+#the settle_pending_transactions workers settle it
 class TransactionView(APIView):
+    throttle_classes = [TransactionThrottle, UserThrottle]
     permission_classes = [IsUser]
     serializer_class = TransactionInputSerializer
+    query_budget = 9
     def post(self, request):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            response, settled = self.create_transaction(request)
+            return response
+        return run_once(request.user.pk, idempotency_key, request.data, lambda: self.create_transaction(request))
+
+    def create_transaction(self, request):
         serializer = TransactionInputSerializer(data=request.data, context={'request':request})
         if serializer.is_valid():
-            receiver_account_number = serializer.validated_data['receiver_account_number'] or None
             description = serializer.validated_data['description']
             transaction_type = serializer.validated_data['transaction_type']
             amount = serializer.validated_data['amount']
-            receiver = None
-            if receiver_account_number:
-                receiver = Account.objects.get(account_number=receiver_account_number)
+            transaction = {
+                'user_account':serializer.validated_data['user_account'],
+                'receiver_account':serializer.validated_data['receiver'],
+                'tran_type':transaction_type,
+                'amt':amount,
+                'desc':description,
+            }
             try:
-                txn = handle_transaction(
-                    user_account=request.user.account,
-                    receiver_account=receiver,
-                    tran_type=transaction_type,
-                    amt=amount,
-                    desc=description,
-                )
-                print(type(txn))
-                output = TransactionOutputSerializer(txn)
-                return Response(output.data, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                return Response({'error':str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                if settings.ASYNC_SETTLEMENT:
+                    txn = queue_transaction(**transaction)
+                    output = TransactionStatusSerializer(txn)
+                    location = reverse('transaction_status', kwargs={'pk':txn.pk})
+                    response = Response(dict(output.data), status=status.HTTP_202_ACCEPTED, headers={'Location':location})
+                else:
+                    txn = handle_transaction(**transaction)
+                    output = TransactionOutputSerializer(txn)
+                    response = Response(dict(output.data), status=status.HTTP_201_CREATED)
+            except InsufficientBalance as e:
+                return Response({'error':str(e)}, status=status.HTTP_400_BAD_REQUEST), True
+            except ValueError as e:
+                return Response({'error':str(e)}, status=status.HTTP_400_BAD_REQUEST), False
+            return response, True
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST), False
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "village_banking.settings")
+# persistent connections leak under ASGI, the settings turn CONN_MAX_AGE off when this is set
+os.environ["SERVING_ASGI"] = "True"
 
 application = get_asgi_application()
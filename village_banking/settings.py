@@ -85,6 +85,28 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
+#per route latency, query, serializer, throttle and cache metrics scraped from /metrics. each worker keeps its own,
+#with METRICS_DIR (a directory shared by the workers of a host) every scrape adds up all of them. the scraper
+#authenticates with METRICS_TOKEN or has to come from INTERNAL_IPS
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_DIR = env('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5
+INTERNAL_IPS = env.list('INTERNAL_IPS', default=['127.0.0.1'])
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'user_accounts.metrics.MetricsMiddleware')
+
+#serve the read heavy views with their async versions, turn it on when deploying under an ASGI worker
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+#POST /api/profile/transaction/ records the transaction as pending and answers 202, the balances are moved by the
+#settle_pending_transactions workers. run at least one worker when turning it on
+ASYNC_SETTLEMENT = env.bool('ASYNC_SETTLEMENT', default=False)
+
+#development only, fails requests that run more queries than the query_budget their view declares
+if env.bool('QUERY_BUDGETS', default=False):
+    MIDDLEWARE.append('user_accounts.querybudget.QueryBudgetMiddleware')
+
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = [
     "https://village-bank-htl8jdj04-abjith-b-ks-projects.vercel.app",
@@ -94,7 +116,7 @@ CORS_ALLOWED_ORIGINS = [
 ]
 ALLOWED_HOSTS = ['village-banking-app.onrender.com']
 CORS_ALLOW_CREDENTIALS = False
-CORS_ALLOW_HEADERS = list(default_headers)
+CORS_ALLOW_HEADERS = list(default_headers) + ['idempotency-key']
 AUTH_USER_MODEL = 'user_accounts.CustomUser'
 PHONENUMBER_DEFAULT_REGION = 'IN'
 
@@ -137,6 +159,29 @@ else:
         }
     }
 
+#connections are kept open across requests for DB_CONN_MAX_AGE seconds and checked before reuse. with DB_POOL=True
+#every worker keeps a psycopg 3 pool of DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections instead, a request
+#waits up to DB_POOL_TIMEOUT seconds for a free one. django does not allow both, the pool turns CONN_MAX_AGE off.
+#under ASGI the sync ORM calls run on executor threads that each would keep a persistent connection open, so
+#asgi.py sets SERVING_ASGI and CONN_MAX_AGE is forced to 0 there, use DB_POOL to reuse connections under ASGI
+SERVING_ASGI = env.bool('SERVING_ASGI', default=False)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+if env.bool('DB_POOL', default=False):
+    from psycopg_pool import ConnectionPool
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size':env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size':env.int('DB_POOL_MAX_SIZE', default=10),
+        'timeout':env.float('DB_POOL_TIMEOUT', default=10.0),
+        'check':ConnectionPool.check_connection,
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = 0 if SERVING_ASGI else env.int('DB_CONN_MAX_AGE', default=60)
+
+#shared cache of the workers, e.g. CACHE_URL=dbcache://django_cache (after manage.py createcachetable) or rediscache://localhost:6379/0
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -184,7 +229,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'user_accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
@@ -194,13 +239,15 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',  # for unauthenticated users
-        'rest_framework.throttling.UserRateThrottle',  # for authenticated users
+        'user_accounts.throttles.AnonThrottle',  # for unauthenticated users
+        'user_accounts.throttles.UserThrottle',  # for authenticated users
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '5000/minute',     # adjust as needed
         'user': '10000/minute',    # logged-in users
-        'otp': '1/minute',      # custom class, we'll define this next
+        'otp': '1/minute',
+        'transaction': '30/minute',
+        'login': '10/minute',
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DATETIME_FORMAT': "%Y-%m-%d %H:%M:%S",
@@ -217,6 +264,50 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+#number of latest sent and received transactions nested in the /api/profile/ payload
+PROFILE_RECENT_TRANSACTIONS = 10
+
+#one time passwords for the forgot password flow, kept in this cache or in the OTPCode table when the cache is local to the process
+OTP_CACHE_ALIAS = 'default'
+OTP_TTL = 5 * 60
+OTP_MAX_ATTEMPTS = 5
+
+#cache holding the throttle counters, it has to be shared by the workers for the rates to hold across them. with
+#the default per-process cache (no CACHE_URL) every worker counts on its own and a client gets the rate once per
+#worker. the database cache is served by the ThrottleCounter table because its incr is not atomic
+THROTTLE_CACHE_ALIAS = 'default'
+
+#recently loaded profiles kept per worker by ClaimsJWTAuthentication, entries and seconds. the cache holding whether
+#a profile is still active, it has to be shared by the workers for a deactivation to be seen by all of them
+AUTH_PROFILE_CACHE_SIZE = 1024
+AUTH_PROFILE_CACHE_TTL = 30
+AUTH_CACHE_ALIAS = 'default'
+
+#seconds between pulling newly blacklisted refresh tokens into the per-worker bloom filter and between full rebuilds
+TOKEN_BLACKLIST_FILTER_REFRESH = 5
+TOKEN_BLACKLIST_FILTER_REBUILD = 60 * 60
+
+#longest range in days /api/profile/statement/ returns at once
+STATEMENT_MAX_DAYS = 366
+
+#bulk onboarding through /api/admin/dashboard/profile/import/: rows per upload and profiles created per transaction
+#by the process_batches worker
+ONBOARDING_MAX_ROWS = 5000
+ONBOARDING_CHUNK_SIZE = 500
+
+#staff settlement batches through /api/admin/dashboard/batch/: items per batch and items settled per transaction
+SETTLEMENT_BATCH_MAX_ITEMS = 10000
+SETTLEMENT_BATCH_CHUNK_SIZE = 500
+
+#number of BankTotals counter rows the transactions spread their updates over
+BANK_TOTALS_SHARDS = 8
+
+#seconds a POST /api/profile/transaction/ Idempotency-Key is kept, prune_idempotency_keys deletes the older ones
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+#seconds sent and failed outbox emails are kept for support, prune_outbox deletes the older ones
+OUTBOX_RETENTION = 7 * 24 * 60 * 60
+
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
 SIMPLE_JWT = {
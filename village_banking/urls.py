@@ -18,6 +18,7 @@ Including another URLconf
 from django.contrib import admin
 from django.http import JsonResponse
 from django.urls import path,include
+from user_accounts.metrics import metrics_view
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
@@ -28,6 +29,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path('api/',include("user_accounts.urls")),
     path("ping/", lambda request: JsonResponse({"status": "ok"})),
+    path("metrics", metrics_view, name="metrics"),
     path('schema/',SpectacularAPIView.as_view(),name='schema'),
     path('schema/swagger/',SpectacularSwaggerView.as_view(url_name='schema'),name='swagger-ui'),
     path('schema/redoc/',SpectacularRedocView.as_view(url_name='schema'),name='redoc'),